@@ -0,0 +1,120 @@
+#    Copyright 2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Benchmarks for every DataFrame getter, on synthetic traces
+
+The traces are generated by :mod:`benchmarks.tracegen` and parsed once, in
+``setup_cache``, filling TRAPpy's cache. Each getter is then timed on a fresh :class:`TraceAnalyzer`
+with the result cache disabled, so the time includes computing everything the
+getter depends on.
+
+Run with ``asv run`` from the repository root, or directly as a script to print
+the time taken by each getter on a single trace size, e.g.::
+
+    python -m benchmarks.bench_getters 1000000
+"""
+
+from __future__ import print_function
+
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+from trappy import FTrace
+
+from millhouse import GetterSpec, TraceAnalyzer
+
+from .tracegen import FTRACE_KWARGS, generate_trace, make_domains
+
+EVENT_COUNTS = [10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7]
+N_CPUS = 8
+N_DOMAINS = 2
+
+DOMAINS = make_domains(N_CPUS, N_DOMAINS)
+
+# Arguments for the getters that need them
+GETTER_ARGS = {
+    'cpufreq.stats.frequency_residency': (DOMAINS,),
+    'cpuidle.signal.cluster_active': (DOMAINS[0],),
+}
+
+def getter_names():
+    """
+    Find the names of all the DataFrame getters, e.g.
+    ``"cpufreq.signal.cpu_frequency"``
+    """
+    names = []
+    for module_name, module_cls in TraceAnalyzer._MODULES:
+        for attr in sorted(dir(module_cls)):
+            if attr.startswith('_dfg_'):
+                kind, name = attr[len('_dfg_'):].split('_', 1)
+                names.append('{}.{}.{}'.format(module_name, kind, name))
+    return names
+
+def make_analyzer(ftrace):
+    return TraceAnalyzer(ftrace, cpufreq_domains=DOMAINS, cache_size=0)
+
+def make_spec(getter):
+    return GetterSpec(getter, *GETTER_ARGS.get(getter, ()))
+
+class TimeGetters(object):
+    params = [getter_names(), EVENT_COUNTS]
+    param_names = ['getter', 'events']
+    timeout = 3600
+
+    def setup_cache(self):
+        # Parsing the text traces is far slower than the analyses. Parsing them
+        # once here fills TRAPpy's on-disk cache, from which they are loaded
+        # quickly in setup().
+        paths = {}
+        for n_events in EVENT_COUNTS:
+            paths[n_events] = os.path.abspath('trace_{}.txt'.format(n_events))
+            generate_trace(paths[n_events], n_events, n_cpus=N_CPUS,
+                           n_domains=N_DOMAINS)
+            FTrace(paths[n_events], **FTRACE_KWARGS)
+        return paths
+
+    def setup(self, paths, getter, n_events):
+        ftrace = FTrace(paths[n_events], **FTRACE_KWARGS)
+        self.analyzer = make_analyzer(ftrace)
+        self.spec = make_spec(getter)
+
+    def time_getter(self, paths, getter, n_events):
+        self.spec(self.analyzer)
+
+    def peakmem_getter(self, paths, getter, n_events):
+        self.spec(self.analyzer)
+
+if __name__ == '__main__':
+    n_events = int(float(sys.argv[1])) if len(sys.argv) > 1 else 10 ** 5
+    tmp_dir = tempfile.mkdtemp()
+    trace_path = os.path.join(tmp_dir, 'trace.txt')
+    generate_trace(trace_path, n_events, n_cpus=N_CPUS, n_domains=N_DOMAINS)
+
+    try:
+        for getter in getter_names():
+            spec = make_spec(getter)
+            # Each analyzer gets its own FTrace, as the analyzer may modify it
+            # (to inject devlib's events). All but the first are loaded from
+            # TRAPpy's cache.
+            analyzer = make_analyzer(FTrace(trace_path, **FTRACE_KWARGS))
+            elapsed = min(timeit.repeat(lambda: spec(analyzer),
+                                        number=1, repeat=3))
+            print('{:<45} {:8.3f}s'.format(str(spec), elapsed))
+    finally:
+        shutil.rmtree(tmp_dir)
@@ -0,0 +1,99 @@
+#    Copyright 2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Benchmarks for building CPU signals from trace events
+
+Signals are built by :meth:`StepSignal.from_events`, which replaced a
+``pivot_table`` with a Python ``aggfunc``. Run with ``asv run`` from the
+repository root, or directly as a script to print a quick comparison against
+the ``pivot_table`` implementation.
+"""
+
+from __future__ import print_function
+
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from millhouse.step_signal import StepSignal
+
+def make_events(n_events, n_cpus=8, seed=0):
+    """
+    Make a DataFrame that looks like TRAPpy's cpu_idle DataFrame
+
+    Around a quarter of the events share a timestamp with the previous event,
+    as happens when several CPUs change state together.
+    """
+    rng = np.random.RandomState(seed)
+    steps = rng.exponential(1e-4, n_events)
+    steps[rng.random_sample(n_events) < 0.25] = 0
+    df = pd.DataFrame({
+        '__line': np.arange(n_events),
+        'cpu_id': rng.randint(0, n_cpus, n_events),
+        'state': rng.randint(-1, 3, n_events),
+    }, index=pd.Index(100 + np.cumsum(steps), name='Time'))
+    return df
+
+def build_signal(df, columns, values):
+    """Build the wide signal DataFrame through a StepSignal"""
+    return StepSignal.from_events(df, columns, values).to_frame()
+
+def legacy_pivot(df, columns, values):
+    """The pivot_table-based implementation StepSignal replaced"""
+    return df.pivot_table(columns=columns, index='Time',
+                          aggfunc=lambda x: x.iloc[-1])[values].ffill()
+
+class TimePivot(object):
+    params = [10 ** 5, 10 ** 6, 10 ** 7]
+    param_names = ['events']
+    timeout = 300
+
+    def setup(self, n_events):
+        self.df = make_events(n_events)
+
+    def time_step_signal(self, n_events):
+        build_signal(self.df, 'cpu_id', 'state')
+
+    def peakmem_step_signal(self, n_events):
+        build_signal(self.df, 'cpu_id', 'state')
+
+class TimeLegacyPivot(object):
+    # The legacy implementation is too slow to be worth running on 1e7 events
+    params = [10 ** 5, 10 ** 6]
+    param_names = ['events']
+    timeout = 600
+
+    def setup(self, n_events):
+        self.df = make_events(n_events)
+
+    def time_pivot_table(self, n_events):
+        legacy_pivot(self.df, 'cpu_id', 'state')
+
+if __name__ == '__main__':
+    for n_events in TimeLegacyPivot.params:
+        df = make_events(n_events)
+        pd.testing.assert_frame_equal(
+            build_signal(df, 'cpu_id', 'state').astype(float),
+            legacy_pivot(df, 'cpu_id', 'state').astype(float),
+            check_names=False)
+
+        new = min(timeit.repeat(lambda: build_signal(df, 'cpu_id', 'state'),
+                                number=1, repeat=3))
+        old = min(timeit.repeat(lambda: legacy_pivot(df, 'cpu_id', 'state'),
+                                number=1, repeat=1))
+        print('{:>10} events: pivot_table {:8.3f}s, StepSignal {:8.3f}s '
+              '({:.0f}x)'.format(n_events, old, new, old / new))
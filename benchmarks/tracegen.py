@@ -0,0 +1,167 @@
+#    Copyright 2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Generator of synthetic ftrace text traces for benchmarking
+
+The traces contain cpu_idle, cpu_frequency, cpu_frequency_devlib and
+thermal_temperature events in the format TRAPpy parses. Run as a script to write
+a trace file, e.g.::
+
+    python benchmarks/tracegen.py trace.txt --events 1000000 --cpus 8
+"""
+
+from __future__ import division, print_function
+
+import argparse
+
+import numpy as np
+
+# Keyword arguments for trappy.FTrace to parse the generated traces
+FTRACE_KWARGS = dict(scope='custom',
+                     events=['cpu_idle', 'cpu_frequency', 'cpu_frequency_devlib',
+                             'thermal_temperature'],
+                     normalize_time=False)
+
+FREQUENCIES = [500000, 1000000, 1500000, 2000000]
+IDLE_STATES = [0, 1, 2]
+
+def make_domains(n_cpus, n_domains):
+    """Split CPU IDs ``0..n_cpus-1`` into ``n_domains`` contiguous groups"""
+    return [d.tolist() for d in np.array_split(np.arange(n_cpus), n_domains)]
+
+class TraceGenerator(object):
+    """
+    Generate a random trace
+
+    :param n_events: Approximate total number of events in the trace
+    :param n_cpus: Number of CPUs
+    :param n_domains: Number of frequency domains. CPUs are split evenly between
+                      them, and the frequency events for a domain are always
+                      coherent.
+    :param n_zones: Number of thermal zones
+    :param idle_rate: cpu_idle events per second, per CPU
+    :param freq_rate: Frequency changes per second, per domain (each change
+                      produces one cpu_frequency event per CPU in the domain)
+    :param thermal_rate: thermal_temperature events per second, per zone
+    :param start: Timestamp of the beginning of the trace
+    :param seed: Random seed
+    """
+
+    def __init__(self, n_events, n_cpus=8, n_domains=2, n_zones=2,
+                 idle_rate=1000., freq_rate=50., thermal_rate=10.,
+                 start=100., seed=0):
+        self.n_cpus = n_cpus
+        self.domains = make_domains(n_cpus, n_domains)
+        self.n_zones = n_zones
+        self.start = start
+
+        rate = n_cpus * idle_rate + n_cpus * freq_rate + n_zones * thermal_rate
+        self.duration = n_events / rate
+        self.rng = np.random.RandomState(seed)
+
+        self.n_idle = int(n_cpus * idle_rate * self.duration)
+        self.n_freq = [int(freq_rate * self.duration) for _ in self.domains]
+        self.n_thermal = int(n_zones * thermal_rate * self.duration)
+
+    def _times(self, n):
+        return np.sort(self.start + self.rng.uniform(0, self.duration, n))
+
+    def events(self):
+        """
+        Generate the events, as a tuple of arrays ``(times, lines)``, where
+        ``lines`` are the trace lines without the timestamp
+        """
+        times = []
+        lines = []
+
+        def add(t, line_fmt, *columns):
+            times.append(t)
+            lines.append([line_fmt.format(*row) for row in zip(*columns)])
+
+        # Half of the idle events are wakeups, the rest enter a random state
+        t = self._times(self.n_idle)
+        cpus = self.rng.randint(0, self.n_cpus, self.n_idle)
+        states = np.where(self.rng.random_sample(self.n_idle) < 0.5, 4294967295,
+                          self.rng.choice(IDLE_STATES, self.n_idle))
+        add(t, '<idle>-0     [{0:03d}] {{}}: cpu_idle: state={1} cpu_id={0}',
+            cpus, states)
+
+        for domain, n in zip(self.domains, self.n_freq):
+            t = np.repeat(self._times(n), len(domain))
+            cpus = np.tile(domain, n)
+            freqs = np.repeat(self.rng.choice(FREQUENCIES, n), len(domain))
+            add(t, 'sugov:{0}-1000 [{0:03d}] {{}}: cpu_frequency: '
+                'state={1} cpu_id={0}', cpus, freqs)
+
+        # devlib reports every CPU's frequency at the beginning and end
+        for t in [self.start, self.start + self.duration]:
+            cpus = np.arange(self.n_cpus)
+            freqs = np.repeat(self.rng.choice(FREQUENCIES, len(self.domains)),
+                              [len(d) for d in self.domains])
+            add(np.full(self.n_cpus, t), 'sh-1 [{0:03d}] {{}}: '
+                'cpu_frequency_devlib: state={1} cpu_id={0}', cpus, freqs)
+
+        t = self._times(self.n_thermal)
+        zones = self.rng.randint(0, self.n_zones, self.n_thermal)
+        temps = self.rng.randint(30000, 90000, self.n_thermal)
+        add(t, 'kworker/0:1-28 [000] {{}}: thermal_temperature: '
+            'thermal_zone=zone{0} id={0} temp_prev={1} temp={1}', zones, temps)
+
+        times = np.concatenate(times)
+        lines = np.concatenate([np.array(l, dtype=object) for l in lines])
+        order = np.argsort(times, kind='mergesort')
+        return times[order], lines[order]
+
+    def write(self, path, chunk_size=100000):
+        """Write the trace to a text file"""
+        times, lines = self.events()
+        with open(path, 'w') as f:
+            for i in range(0, len(times), chunk_size):
+                f.write(''.join(
+                    line.format('{:.6f}'.format(t)) + '\n' for t, line in
+                    zip(times[i:i + chunk_size], lines[i:i + chunk_size])))
+
+def generate_trace(path, n_events, **kwargs):
+    """
+    Write a random trace to ``path``
+
+    :param n_events: Approximate total number of events in the trace
+    :param kwargs: Passed to :class:`TraceGenerator`
+
+    :returns: The :class:`TraceGenerator`, whose attributes describe the trace
+    """
+    gen = TraceGenerator(n_events, **kwargs)
+    gen.write(path)
+    return gen
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('path')
+    parser.add_argument('--events', type=float, default=1e5)
+    parser.add_argument('--cpus', type=int, default=8)
+    parser.add_argument('--domains', type=int, default=2)
+    parser.add_argument('--zones', type=int, default=2)
+    parser.add_argument('--idle-rate', type=float, default=1000.)
+    parser.add_argument('--freq-rate', type=float, default=50.)
+    parser.add_argument('--thermal-rate', type=float, default=10.)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    gen = generate_trace(args.path, int(args.events), n_cpus=args.cpus,
+                         n_domains=args.domains, n_zones=args.zones,
+                         idle_rate=args.idle_rate, freq_rate=args.freq_rate,
+                         thermal_rate=args.thermal_rate, seed=args.seed)
+    print('Wrote {:.1f}s of trace to {}'.format(gen.duration, args.path))
@@ -13,6 +13,10 @@
 # limitations under the License.
 #
 
+from millhouse.version import __version__
+
 from millhouse.trace_analyzer import TraceAnalyzer
+from millhouse.batch import analyze_traces, GetterSpec
+from millhouse.tracedat import TraceDat
 
 from millhouse.exception import MissingTraceEventsError
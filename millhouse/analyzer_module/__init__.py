@@ -13,8 +13,8 @@
 # limitations under the License.
 #
 
-import numpy as np
-import pandas as pd
+import copy
+from functools import wraps
 
 from wrapt import decorator
 
@@ -44,7 +44,29 @@ def requires_events(events=None):
             raise MissingTraceEventsError(missing_events)
 
         return wrapped(*args, **kwargs)
-    return wrapper
+
+    def decorate(method):
+        method = wrapper(method)
+        # Let TraceAnalyzer.from_path find the events without an instance
+        method._dfg_required_events = events
+        return method
+    return decorate
+
+def depends_on(*getters):
+    """
+    Declare the other DataFrame getters that a _dfg method calls
+
+    This lets :meth:`TraceAnalyzer.compute` compute shared results once, before
+    the getters that need them, and run independent getters in parallel. Only
+    getters that take no arguments can be declared.
+
+    :param getters: Names of the getters, relative to the
+                    :class:`TraceAnalyzer`, e.g. ``"cpuidle.signal.cpu_active"``
+    """
+    def decorate(method):
+        method._dfg_depends_on = getters
+        return method
+    return decorate
 
 class _DfgRegister(object):
     """Helper class for AnalyzerModule"""
@@ -73,23 +95,41 @@ class AnalyzerModule(object):
     """
     Base class for encapsulating a group of analyses that can be done on a trace.
 
+    Subclasses must set :attr:`name` to the name of the :class:`TraceAnalyzer`
+    attribute they are accessed through.
+
+    Subclasses should declare the trace events they need in
+    :attr:`required_events`, and events they use when present (but can do
+    without) in :attr:`optional_events`, so that
+    :meth:`TraceAnalyzer.from_path` parses them.
+
+    Subclasses should declare the trace event columns they use in
+    :attr:`event_columns`, a dict mapping event names to lists of ``(column,
+    dtype)`` tuples, and read them with :meth:`TraceAnalyzer.get_event_table`.
+    Use the most compact dtype that can hold the column's values.
+
     :param analyzer: :class:`TraceAnalyzer` this module is attached to
     :param window: Processed ``(start_time, end_time)`` tuple based on
                    ``analyzer.ftrace`` and ``analyzer``'s ``window``
                    param. Neither value should be ``None``.
     """
 
+    name = None
+    required_events = []
+    optional_events = []
+    event_columns = {}
+
     def __init__(self, analyzer, window):
         self.analyzer = analyzer
         self.ftrace = self.analyzer.ftrace
-        self.cpus = analyzer.cpus
         self.window = window
+        self._init_registers()
 
+    def _init_registers(self):
         self.event = _DfgRegister('{}.event'.format(self.__class__.__name__))
         self.signal = _DfgRegister('{}.signal'.format(self.__class__.__name__))
         self.stats = _DfgRegister('{}.stats'.format(self.__class__.__name__))
-
-        self.available_events = self.analyzer.available_events
+        self.steps = _DfgRegister('{}.steps'.format(self.__class__.__name__))
 
         # Set up registers to provide nice accessor code. E.g.
         # You can access `self._dfg_signal_cpu_idle_state` as
@@ -101,7 +141,8 @@ class AnalyzerModule(object):
             registers = {
                 '_dfg_signal_': self.signal,
                 '_dfg_event_': self.event,
-                '_dfg_stats_': self.stats
+                '_dfg_stats_': self.stats,
+                '_dfg_steps_': self.steps
             }
             for prefix, _register in registers.iteritems():
                 if attr.startswith(prefix):
@@ -112,68 +153,83 @@ class AnalyzerModule(object):
                                  .format(attr, self.__class__, registers.keys()))
 
             name = attr[len(prefix):]
-            register.add_getter(name, getattr(self, attr))
+            register.add_getter(name, self._cached_getter(
+                register, name, getattr(self, attr)))
 
-    def _do_pivot(self, df, columns):
+    def _for_analyzer(self, analyzer):
         """
-        Perform a DataFrame pivot, dealing with duplicate indices as necessary
-
-        If there are two rows in the DataFrame with the same index and the same
-        value in the column indicated by 'columns', Pandas raises 'ValueError:
-        Index contains duplicate entries, cannot reshape' due to the ambiguity
-        as to which value to take. This solves the issue by taking the *latest*
-        value (i.e. the one with the higher value in the ``__line`` column -
-        this is implemented by assuming that ``__line`` always increases with
-        iloc).
+        Get a copy of this module attached to another analyzer of the same
+        trace, using that analyzer's window
 
-        See Pandas documentation for more detail.
+        Unlike constructing a new module, this doesn't repeat any work done on
+        construction, such as sanitizing trace events.
         """
-        return df.pivot_table(columns=columns, index='Time',
-                              aggfunc=lambda x: x.iloc[-1])
+        module = copy.copy(self)
+        module.analyzer = analyzer
+        module.window = analyzer.window
+        module._init_registers()
+        return module
 
+    @property
+    def cpus(self):
+        return self.analyzer.cpus
 
-    def _add_cpu_columns(self, df):
+    @property
+    def available_events(self):
+        return self.analyzer.available_events
+
+    def _cached_getter(self, register, name, getter):
         """
-        Add any missing columns, filled with NA, to a CPU signal DataFrame
+        Wrap a _dfg method so that its results are memoized in the analyzer's
+        :class:`millhouse.cache.DfgCache`
         """
-        for cpu in self.cpus:
-            if cpu not in df.columns:
-                df[cpu] = np.nan
-        return df.sort_index(axis=1) # Sort column labels
-
-    def _extrude_signal(self, df):
+        full_name = '{}.{}'.format(register.name, name)
+
+        kind = register.name.split('.')[-1]
+
+        @wraps(getter)
+        def wrapper(*args, **kwargs):
+            cache = self.analyzer.cache
+            # StepSignals describe the whole trace, whatever the window
+            window = None if register is self.steps else self.window
+            key = cache.make_key(full_name, args, kwargs, window)
+
+            profiler = self.analyzer.profiler
+            if profiler is None:
+                return cache.get_or_compute(key, lambda: getter(*args, **kwargs))
+
+            span = profiler.start_span('{}.{}.{}'.format(self.name, kind, name),
+                                       args + tuple(sorted(kwargs.items())),
+                                       window)
+            def compute():
+                span.cache_hit = False
+                return getter(*args, **kwargs)
+
+            result = None
+            try:
+                result = cache.get_or_compute(key, compute)
+            finally:
+                profiler.end_span(span, result)
+            return result
+
+        wrapper.depends_on = getattr(getter, '_dfg_depends_on', ())
+        return wrapper
+
+    def _stored_steps(self, name, build, params=None):
         """
-        Extend signal so there is an event at the beginning and end of window
-
-        Where you have a DataFrame that represents a signal, and the last event
-        is not at the end of the trace (e.g. because your CPU frequency did not
-        change in the last 500ms of the trace), this can be used to 'extrude'
-        that signal up to the end of the trace so that it can be usefully
-        integrated. Where the 'window' parameter excludes an event at the
-        beginning of the trace (e.g. because the CPU frequency did not change
-        during the region of interest), it duplicates that event at the beginning
-        of the window.
-
-        I.e. this converts from::
-
-             x--------------y-----------------------
-                    ^               ^
-                window[0]       window[1]
-
-        to::
+        Get a StepSignal from the analyzer's on-disk store, building and storing
+        it if necessary. If the analyzer has no store, just build it.
 
-             -------x-------y-------y
-                    ^               ^
-                window[0]       window[1]
+        :param name: Name of the signal in the store
+        :param build: Callable returning the :class:`StepSignal`
+        :param params: Analyzer configuration that the signal depends on
         """
-        start, end = self.window
-        index = df[start:end].index.tolist()
-        if index:
-            if start < index[0]:
-                index = [start] + index
-            if end > index[-1]:
-                index.append(end)
-        else:
-            index = [start, end]
-
-        return df.reindex(index, method='ffill')
+        store = self.analyzer.signal_store
+        if store is None:
+            return build()
+
+        steps = store.load(name, params)
+        if steps is None:
+            steps = build()
+            store.save(name, steps, params)
+        return steps
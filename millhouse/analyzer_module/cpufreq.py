@@ -13,54 +13,68 @@
 # limitations under the License.
 #
 
+import numpy as np
 import pandas as pd
 
 from trappy.utils import listify
 
-from millhouse.analyzer_module import requires_events, AnalyzerModule
-from millhouse.utils import integrate_square_wave
+from millhouse.analyzer_module import (requires_events, depends_on,
+                                       AnalyzerModule)
+from millhouse.step_signal import StepSignal
+from millhouse.utils import integrate_step_signal
 
 class CpufreqAnalyzerModule(AnalyzerModule):
+    name = 'cpufreq'
     required_events = ['cpu_frequency']
+    optional_events = ['cpu_frequency_devlib']
+    event_columns = {
+        'cpu_frequency': [('cpu', 'int16'), ('frequency', 'uint32')],
+    }
 
     def __init__(self, *args, **kwargs):
         super(CpufreqAnalyzerModule, self).__init__(*args, **kwargs)
 
         self.domains = self.analyzer.cpufreq_domains
-        self.frequencies_coherent = None
+        self._frequencies_coherent = None
         self.sanitize_trace_events()
 
     def sanitize_trace_events(self):
         """
-        Verify that all reported frequency domains are frequency coherent
+        Inject devlib's frequency events and, unless the analyzer was asked to
+        defer it, verify that all reported frequency domains are frequency
+        coherent.
         """
         if 'cpu_frequency_devlib' in self.available_events:
             self._inject_devlib_events()
 
-        # Frequency Coherency Check
-        if self.domains:
-            df = self.analyzer.get_trace_event('cpu_frequency')
-            self.frequencies_coherent = True
-            for cpus in self.domains:
-                domain_df = df[df.cpu.isin(cpus)]
-                for chunk in self._chunker(domain_df, len(cpus)):
-                    f = chunk.iloc[0].frequency
-                    if any(chunk.frequency != f):
-                        self.frequencies_coherent = False
-
+        if not self.analyzer.defer_coherency_check:
+            self.check_frequency_coherency()
 
-    def _chunker(self, seq, size):
+    def check_frequency_coherency(self):
         """
-        Given a data frame or a series, generate a sequence of chunks of the
-        given size.
+        Verify that all reported frequency domains are frequency coherent
+
+        See :attr:`event.frequency_incoherency` for details of where the
+        coherency was broken.
 
-        :param seq: data to be split into chunks
-        :type seq: :mod:`pandas.Series` or :mod:`pandas.DataFrame`
+        :returns: ``None`` if the frequency domains are not known, otherwise
+                  whether the frequencies were coherent.
+        """
+        if self.domains and 'cpu_frequency' in self.available_events:
+            df = self.event.frequency_incoherency()
+            self._frequencies_coherent = df.empty
+        return self._frequencies_coherent
 
-        :param size: size of each chunk
-        :type size: int
+    @property
+    def frequencies_coherent(self):
+        """
+        Whether the frequency domains are frequency coherent, or ``None`` if
+        they are not known. Checked on first access if the analyzer was asked to
+        defer the check.
         """
-        return (seq.iloc[pos:pos + size] for pos in range(0, len(seq), size))
+        if self._frequencies_coherent is None:
+            return self.check_frequency_coherency()
+        return self._frequencies_coherent
 
     def _inject_devlib_events(self):
         # TODO: We can only do this if we know the frequency domains.
@@ -68,8 +82,8 @@ class CpufreqAnalyzerModule(AnalyzerModule):
             return None
 
         devlib_freq = self.analyzer.get_trace_event('cpu_frequency_devlib')
-        devlib_freq.rename(columns={'cpu_id':'cpu'}, inplace=True)
-        devlib_freq.rename(columns={'state':'frequency'}, inplace=True)
+        devlib_freq = devlib_freq.rename(columns={'cpu_id': 'cpu',
+                                                  'state': 'frequency'})
 
         df = self.analyzer.get_trace_event('cpu_frequency')
 
@@ -78,102 +92,165 @@ class CpufreqAnalyzerModule(AnalyzerModule):
         # frequency events to report
         if len(df) == 0:
             # Register devlib injected events as 'cpu_frequency' events
-            setattr(self.ftrace.cpu_frequency, 'data_frame', devlib_freq)
-            df = devlib_freq
+            self.analyzer.replace_trace_event('cpu_frequency', devlib_freq)
             self.available_events.append('cpu_frequency')
+            return
 
         # make sure fake cpu_frequency events are never interleaved with
         # OS generated events
-        else:
-            if len(devlib_freq) > 0:
-
-                # Frequencies injection is done on a per-domain basis.
-                # This is based on the assumption that domains are
-                # frequency choerent.
-                # For each domain we inject devlib events only if
-                # these events do not overlaps with OS-generated ones.
-
-                # Inject "initial" devlib frequencies
-                os_df = df
-                dl_df = devlib_freq.iloc[:len(self.cpus)]
-                for c in self.domains:
-                    dl_freqs = dl_df[dl_df.cpu.isin(c)]
-                    os_freqs = os_df[os_df.cpu.isin(c)]
-                    # All devlib events "before" os-generated events
-                    if os_freqs.empty or \
-                    os_freqs.index.min() > dl_freqs.index.max():
-                        df = pd.concat([dl_freqs, df])
-
-                # Inject "final" devlib frequencies
-                os_df = df
-                dl_df = devlib_freq.iloc[len(self.cpus):]
-                for c in self.domains:
-                    dl_freqs = dl_df[dl_df.cpu.isin(c)]
-                    os_freqs = os_df[os_df.cpu.isin(c)]
-                    # All devlib events "after" os-generated events
-                    if os_freqs.empty or \
-                    os_freqs.index.max() < dl_freqs.index.min():
-                        df = pd.concat([df, dl_freqs])
-
-                df.sort_index(inplace=True)
-
-            setattr(self.ftrace.cpu_frequency, 'data_frame', df)
+        if len(devlib_freq) == 0:
+            return
+
+        # Frequencies injection is done on a per-domain basis. This is based on
+        # the assumption that domains are frequency choerent. For each domain
+        # we inject devlib events only if these events do not overlap with
+        # OS-generated ones.
+        domain_of = np.full(max(max(self.cpus), max(max(d) for d in self.domains),
+                                devlib_freq['cpu'].max(), df['cpu'].max()) + 1,
+                            -1)
+        for i, domain in enumerate(self.domains):
+            domain_of[domain] = i
+
+        os_times = pd.Series(df.index.values, index=domain_of[df['cpu'].values])
+        os_times = os_times[os_times.index >= 0].groupby(level=0)
+        os_first = os_times.min().reindex(range(len(self.domains))).values
+        os_last = os_times.max().reindex(range(len(self.domains))).values
+
+        dl_domains = domain_of[devlib_freq['cpu'].values]
+        dl_times = pd.Series(devlib_freq.index.values, index=dl_domains)
+        initial = np.arange(len(devlib_freq)) < len(self.cpus)
+
+        # All devlib events "before" os-generated events
+        dl_last = dl_times[initial].groupby(level=0).max()
+        dl_last = dl_last.reindex(range(len(self.domains))).values
+        # Domains without OS or devlib events have NaN times, which compare
+        # False, so their devlib events are kept
+        with np.errstate(invalid='ignore'):
+            keep_initial = ~(os_first <= dl_last)
+
+        # All devlib events "after" os-generated events, including the injected
+        # initial ones
+        os_last = np.fmax(os_last, np.where(keep_initial, dl_last, np.nan))
+        dl_first = dl_times[~initial].groupby(level=0).min()
+        dl_first = dl_first.reindex(range(len(self.domains))).values
+        with np.errstate(invalid='ignore'):
+            keep_final = ~(os_last >= dl_first)
+
+        known = dl_domains >= 0
+        keep = np.zeros(len(devlib_freq), dtype=bool)
+        keep[known] = np.where(initial, keep_initial[dl_domains],
+                               keep_final[dl_domains])[known]
+
+        # Each part is sorted, and a stable sort keeps the initial devlib events
+        # before OS events at the same time, and the final ones after them.
+        merged = pd.concat([devlib_freq[keep & initial], df,
+                            devlib_freq[keep & ~initial]])
+        merged = merged.sort_index(kind='mergesort')
+        self.analyzer.replace_trace_event('cpu_frequency', merged)
 
     @requires_events()
-    def _dfg_signal_cpu_frequency(self):
+    def _dfg_event_frequency_incoherency(self):
+        # Looking for a docstring? See the .rst file(s) in doc/ for all the _dfg
+        # methods' documentation.
+
+        df = self.analyzer.get_event_table('cpu_frequency')
+
+        # When the frequency of a domain changes, there should be a group of
+        # cpu_frequency events, one for each CPU in the domain, all reporting
+        # the same frequency. Reshape each domain's frequencies into one row per
+        # group and compare every column with the first.
+        dfs = []
+        for i, cpus in enumerate(self.domains or []):
+            domain_df = df[df.cpu.isin(cpus)]
+            size = len(cpus)
+            n_groups = (len(domain_df) + size - 1) // size
+
+            freqs = np.full(n_groups * size, np.nan)
+            freqs[:len(domain_df)] = domain_df['frequency'].values
+            freqs = freqs.reshape(n_groups, size)
+            expected = freqs[:, :1]
+
+            mismatch = (freqs != expected) & ~np.isnan(freqs)
+            pos = np.flatnonzero(mismatch)
+            rows = domain_df.iloc[pos]
+            dfs.append(pd.DataFrame({
+                'domain': i,
+                'cpu': rows['cpu'].values,
+                'frequency': rows['frequency'].values,
+                'expected_frequency': np.broadcast_to(
+                    expected, freqs.shape).ravel()[pos],
+            }, index=rows.index, columns=['domain', 'cpu', 'frequency',
+                                          'expected_frequency']))
+
+        if not dfs:
+            return pd.DataFrame(columns=['domain', 'cpu', 'frequency',
+                                         'expected_frequency'],
+                                index=pd.Index([], name='Time'))
+        return pd.concat(dfs).sort_index(kind='mergesort')
+
+    @requires_events()
+    def _dfg_steps_cpu_frequency(self):
         # Looking for a docstring? See the .rst file(s) in doc/ for all the _dfg
         # methods' documentation.
 
-        df = self._do_pivot(self.ftrace.cpu_frequency.data_frame,
-                            'cpu')['frequency'].ffill()
+        # The injection of devlib events depends on the frequency domains
+        return self._stored_steps('cpu_frequency', lambda: StepSignal.from_events(
+            self.analyzer.get_event_table('cpu_frequency'), 'cpu', 'frequency'),
+                                  params=self.domains)
 
-        return self._add_cpu_columns(self._extrude_signal(df))
+    @depends_on('cpufreq.steps.cpu_frequency')
+    @requires_events()
+    def _dfg_signal_cpu_frequency(self):
+        return self.steps.cpu_frequency().to_frame(self.window, self.cpus)
 
+    @depends_on('cpufreq.steps.cpu_frequency', 'cpuidle.signal.cpu_active')
     @requires_events(['cpu_idle', 'cpu_frequency'])
     def _dfg_stats_frequency_residency(self, core_group):
-        _group = listify(core_group)
+        groups = listify(core_group)
+        multiple = isinstance(groups[0], (list, tuple))
+        if not multiple:
+            groups = [groups]
 
-        if len(_group) > 1 and not self.frequencies_coherent:
-            raise ValueError('Frequency is NOT domain-coherent, '
-                             'cannot compute residency!')
+        for group in groups:
+            if len(group) > 1 and not self.frequencies_coherent:
+                raise ValueError('Frequency is NOT domain-coherent, '
+                                 'cannot compute residency!')
 
-        freq_df = self.ftrace.cpu_frequency.data_frame
-        group_freqs = freq_df[freq_df.cpu == _group[0]]
+        freq_steps = self.steps.cpu_frequency()
 
-        group_active = self.analyzer.cpuidle.signal.cluster_active(_group)
-
-        # In order to compute the active time spent at each frequency we
-        # multiply 2 square waves:
-        #
-        # - cluster_active, a square wave of the form:
-        #     cluster_active[t] == 1 if at least one CPU is reported to be
-        #                            non-idle by CPUFreq at time t
-        #     cluster_active[t] == 0 otherwise
-        # - freq_active, square wave of the form:
-        #     freq_active[t] == 1 if at time t the frequency is f
-        #     freq_active[t] == 0 otherwise
+        # Join the frequency and idle signals once, for all the groups. Each
+        # interval between consecutive timestamps has a constant frequency and
+        # active state for every group.
         #
-        # For the total time, we just treat the active signal as always-1
-
-        available_freqs = sorted(group_freqs.frequency.unique())
-        group_freqs = group_freqs.join(
-            group_active, how='outer')
-        group_freqs.fillna(method='ffill', inplace=True)
-        total_time = []
-        nonidle_time = []
-        for f in available_freqs:
-            freq_active = group_freqs['frequency'] == f
-            active_t = group_freqs.active * freq_active
-
-            # There will be a region where we don't know the active/idle state
-            # of some CPUs - just drop that part.
-            active_t = active_t.dropna()
-
-            # Compute total time by integrating the square wave
-            nonidle_time.append(integrate_square_wave(active_t))
-            total_time.append(integrate_square_wave(freq_active))
-
-        df = pd.DataFrame({'total': total_time, 'active': nonidle_time},
-                          index=[f for f in available_freqs])
-        df.index.name = 'frequency'
-        return df
+        # The active signal is 1 if at least one CPU in the group is non-idle.
+        # There will be a region where we don't know the active/idle state of
+        # the CPUs - that is ignored for the 'active' column.
+        active = self.analyzer.cpuidle.signal.clusters_active(groups)
+        times = np.union1d(freq_steps.window_times(self.window),
+                           active.index.values)
+        active = active.reindex(times, method='ffill').values
+
+        # Integrate all the groups at once, split by frequency
+        freqs = freq_steps.sample(times, [group[0] for group in groups])
+        total = integrate_step_signal(np.ones_like(freqs), times, by=freqs)
+        nonidle = integrate_step_signal(active, times, by=freqs)
+
+        dfs = []
+        for i, group in enumerate(groups):
+            # Report all the frequencies the group was ever set to, even if
+            # they weren't used within the window
+            cpu = group[0]
+            if cpu in freq_steps:
+                available_freqs = np.unique(freq_steps.get(cpu)[1])
+            else:
+                available_freqs = np.array([], dtype=np.int64)
+
+            df = pd.DataFrame({'total': total[i], 'active': nonidle[i]})
+            df = df.reindex(available_freqs, fill_value=0.)
+            df.index = available_freqs.astype(np.int64)
+            df.index.name = 'frequency'
+            dfs.append(df)
+
+        if not multiple:
+            return dfs[0]
+        return pd.concat(dfs, keys=range(len(groups)), names=['core_group'])
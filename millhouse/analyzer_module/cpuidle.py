@@ -13,54 +13,183 @@
 # limitations under the License.
 #
 
+import numpy as np
 import pandas as pd
 
-from millhouse.analyzer_module import requires_events, AnalyzerModule
-from millhouse.utils import (drop_consecutive_duplicates as drop_dupes,
-                             integrate_square_wave)
+from trappy.utils import listify
+
+from millhouse.analyzer_module import (requires_events, depends_on,
+                                       AnalyzerModule)
+from millhouse.step_signal import StepSignal
+from millhouse.utils import integrate_step_signal
 
 class IdleAnalyzerModule(AnalyzerModule):
+    name = 'cpuidle'
     required_events = ['cpu_idle']
+    event_columns = {
+        'cpu_idle': [('cpu_id', 'int16'), ('state', 'int8')],
+    }
 
     def __init__(self, *args, **kwargs):
         super(IdleAnalyzerModule, self).__init__(*args, **kwargs)
 
     @requires_events()
-    def _dfg_signal_cpu_idle_state(self):
+    def _dfg_steps_cpu_idle_state(self):
         # Looking for a docstring? See the .rst file(s) in doc/ for all the _dfg
         # methods' documentation.
 
-        df = self._do_pivot(
-            self.ftrace.cpu_idle.data_frame, 'cpu_id')['state'].ffill()
+        return self._stored_steps('cpu_idle_state', lambda: StepSignal.from_events(
+            self.analyzer.get_event_table('cpu_idle'), 'cpu_id', 'state'))
 
-        return self._add_cpu_columns(self._extrude_signal(df))
+    @depends_on('cpuidle.steps.cpu_idle_state')
+    @requires_events()
+    def _dfg_signal_cpu_idle_state(self):
+        return self.steps.cpu_idle_state().to_frame(self.window, self.cpus)
 
+    @depends_on('cpuidle.signal.cpu_idle_state')
     def _dfg_signal_cpu_active(self):
         df = self.signal.cpu_idle_state()
         df[~df.isnull()] = (df == -1)
         return df
 
+    @depends_on('cpuidle.signal.cpu_active')
     def _dfg_signal_cluster_active(self, cluster):
-        df = self.signal.cpu_active()[cluster]
+        df = self.signal.clusters_active([cluster])
+        return pd.DataFrame({'active': df[0]})
+
+    @depends_on('cpuidle.signal.cpu_active')
+    def _dfg_signal_clusters_active(self, clusters=None):
+        if clusters is None:
+            clusters = self.clusters
+        df = self.signal.cpu_active()
+        active = df.values.astype(np.float64)
+        known = ~np.isnan(active)
+
+        # A cluster is active when any of its CPUs is active. Count the active
+        # and the known CPUs of every cluster with a single matrix product with
+        # a CPU-to-cluster membership matrix.
+        columns = {cpu: i for i, cpu in enumerate(df.columns)}
+        members = np.zeros((len(columns), len(clusters)))
+        for i, cluster in enumerate(clusters):
+            members[[columns[cpu] for cpu in listify(cluster)], i] = 1
 
-        # Cluster active is the OR between the actives on each CPU
-        # belonging to that specific cluster
-        df = df.sum(axis=1)
-        df[~df.isnull()] = df.astype(bool)
+        n_active = np.dot(np.where(known, active, 0), members)
+        n_known = np.dot(known, members)
 
-        return pd.DataFrame({'active': df})
+        # Where none of a cluster's CPUs' states are known yet, its state is
+        # unknown too
+        values = np.where(n_known > 0, (n_active > 0).astype(np.float64), np.nan)
+        return pd.DataFrame(values, index=df.index,
+                            columns=pd.RangeIndex(len(clusters), name='cluster'))
 
+    @property
+    def clusters(self):
+        """
+        List of lists of CPU IDs: the clusters of the analyzer's ``topology``
+        followed by its ``cpufreq_domains`` (without duplicates). These are the
+        columns of :attr:`signal.clusters_active` by default.
+        """
+        clusters = []
+        topology = self.analyzer.topology
+        if topology is not None and topology.has_level('cluster'):
+            clusters += [list(c) for c in topology.get_level('cluster')]
+        for domain in self.analyzer.cpufreq_domains or []:
+            if list(domain) not in clusters:
+                clusters.append(list(domain))
+        return clusters
+
+    @depends_on('cpuidle.steps.cpu_idle_state')
     @requires_events()
     def _dfg_event_cpu_wakeup(self):
-        sr = pd.Series()
-        state_df = self.signal.cpu_idle_state()
-        for cpu in self.cpus:
-            cpu_sr = drop_dupes(state_df[cpu].dropna())
-            cpu_sr = cpu_sr[cpu_sr == -1].replace(-1, cpu)
-            sr = sr.append(cpu_sr)
-        return pd.DataFrame({'cpu': sr}).sort_index()
+        steps = self.steps.cpu_idle_state()
+        states = steps.values
+        times = steps.times
+        n = len(states)
+
+        # The StepSignal holds each CPU's events in time order, one CPU after
+        # the other, so shifting by one gives each event's predecessor for the
+        # same CPU, except at the first event of each CPU.
+        first = np.zeros(n, dtype=bool)
+        first[steps.offsets[:-1]] = True
+        prev = np.empty(n, dtype=np.float64)
+        prev[1:] = states[:-1]
+        prev[first] = np.nan
+
+        active = states == -1
+        wakeup = active & (prev != -1)
+        # Where a CPU entered idle (possibly moving between idle states before
+        # waking up)
+        idle_entry = ~active & (first | (prev == -1))
+        entry_pos = np.maximum.accumulate(
+            np.where(idle_entry, np.arange(n), 0))
+
+        start, end = self.window
+        wakeup &= (times >= start) & (times <= end)
+        pos = np.flatnonzero(wakeup)
+        idle_duration = times[pos] - times[entry_pos[pos]]
+        idle_duration[first[pos]] = np.nan
+
+        cpus = np.repeat(steps.keys, np.diff(steps.offsets))[pos]
+        order = np.lexsort((cpus, times[pos]))
+        pos = pos[order]
+        df = pd.DataFrame({'cpu': cpus[order],
+                           'idle_state': prev[pos],
+                           'idle_duration': idle_duration[order]},
+                          index=pd.Index(times[pos], name='Time'),
+                          columns=['cpu', 'idle_state', 'idle_duration'])
+        return df
 
+    @depends_on('cpuidle.signal.cpu_active')
     def _dfg_stats_cpu_time(self):
-        df = self._dfg_signal_cpu_active()
-        return pd.DataFrame({'active_time': [integrate_square_wave(df[s].dropna())
-                                             for s in df]})
+        active_time = integrate_step_signal(self.signal.cpu_active())
+        return pd.DataFrame({'active_time': active_time.values})
+
+    @depends_on('cpuidle.steps.cpu_idle_state')
+    @requires_events()
+    def _dfg_stats_idle_state_residency(self):
+        steps = self.steps.cpu_idle_state()
+        durations = steps.durations(self.window)
+        states, state_codes = np.unique(steps.values, return_inverse=True)
+
+        # Sum the durations for each (CPU, state) pair in one pass, using the
+        # position of the CPU in self.cpus and of the state in states.
+        cpus = np.sort(self.cpus)
+        event_cpus = np.repeat(steps.keys, np.diff(steps.offsets))
+        keep = np.in1d(event_cpus, cpus)
+        cpu_codes = np.searchsorted(cpus, event_cpus[keep])
+        codes = cpu_codes * len(states) + state_codes[keep]
+        residency = np.bincount(codes, weights=durations[keep],
+                                minlength=len(cpus) * len(states))
+
+        df = pd.DataFrame(residency.reshape(len(cpus), len(states)),
+                          index=pd.Index(cpus, name='cpu'),
+                          columns=pd.Index(states.astype(np.int64),
+                                           name='idle_state'))
+        return df
+
+    @depends_on('cpuidle.steps.cpu_idle_state')
+    @requires_events()
+    def _dfg_stats_idle_state_transitions(self, cpus=None):
+        steps = self.steps.cpu_idle_state()
+        states, state_codes = np.unique(steps.values, return_inverse=True)
+
+        # Each change point is a transition from the previous value for the same
+        # CPU, unless it's the first for that CPU or repeats the same state.
+        is_transition = np.ones(len(steps.times), dtype=bool)
+        is_transition[steps.offsets[:-1]] = False
+        prev_codes = np.roll(state_codes, 1)
+        is_transition &= prev_codes != state_codes
+
+        start, end = self.window
+        is_transition &= (steps.times >= start) & (steps.times <= end)
+        if cpus is not None:
+            key_cpus = np.repeat(steps.keys, np.diff(steps.offsets))
+            is_transition &= np.in1d(key_cpus, listify(cpus))
+
+        codes = (prev_codes * len(states) + state_codes)[is_transition]
+        counts = np.bincount(codes, minlength=len(states) ** 2)
+
+        index = pd.Index(states.astype(np.int64), name='from_state')
+        columns = pd.Index(states.astype(np.int64), name='to_state')
+        return pd.DataFrame(counts.reshape(len(states), len(states)),
+                            index=index, columns=columns)
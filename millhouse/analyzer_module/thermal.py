@@ -16,30 +16,103 @@
 import numpy as np
 import pandas as pd
 
-from millhouse.analyzer_module import requires_events, AnalyzerModule
+from millhouse.analyzer_module import (requires_events, depends_on,
+                                       AnalyzerModule)
+from millhouse.step_signal import StepSignal
 
 class ThermalAnalyzerModule(AnalyzerModule):
+    name = 'thermal'
     required_events = ['thermal']
+    event_columns = {
+        'thermal': [('thermal_zone', 'category'), ('temp', 'int32')],
+    }
 
     @requires_events()
-    def _dfg_signal_temperature(self):
+    def _dfg_steps_temperature(self):
         # Looking for a docstring? See the .rst file(s) in doc/ for all the _dfg
         # methods' documentation.
 
-        df = self.ftrace.thermal.data_frame
-        df = self._extrude_signal(df)
-        return self._do_pivot(df, 'thermal_zone')['temp']
+        return self._stored_steps('temperature', lambda: StepSignal.from_events(
+            self.analyzer.get_event_table('thermal'), 'thermal_zone', 'temp'))
+
+    @depends_on('thermal.steps.temperature')
+    @requires_events()
+    def _dfg_signal_temperature(self):
+        # Unlike the other signals this isn't forward-filled: inside the window
+        # each row has the temperature of the zone(s) that reported at that
+        # time, and NaN for the others. The rows at the window bounds have the
+        # reading that holds there for every zone.
+        steps = self.steps.temperature()
+        df = steps.to_frame(self.window)
+        times = df.index.values
+
+        start, end = self.window
+        codes = np.repeat(np.arange(len(steps.keys)), np.diff(steps.offsets))
+        inside = (steps.times >= start) & (steps.times <= end)
+        reported = np.zeros(df.shape, dtype=bool)
+        rows = np.searchsorted(times, steps.times[inside])
+        reported[rows, codes[inside]] = True
+        reported[[0, -1]] = True
+
+        return df.where(reported)
+
+    @depends_on('thermal.steps.temperature')
+    @requires_events()
+    def _dfg_stats_temperature_stats(self, percentiles=(50, 90, 99)):
+        steps = self.steps.temperature()
+        zones = steps.keys.tolist()
+        durations, lo_values, hi_values = steps.linear_segments(self.window)
+        codes = np.repeat(np.arange(len(zones)), np.diff(steps.offsets))
+
+        # Each zone's statistics cover the part of the window after its first
+        # reading, so zones reporting late don't affect the others.
+        total = np.bincount(codes, weights=durations, minlength=len(zones))
+        area = np.bincount(codes, minlength=len(zones),
+                           weights=durations * (lo_values + hi_values) / 2)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            avgs = np.where(total > 0, area / total, np.nan)
+
+        # Linear segments reach their extremes at their ends
+        inside = durations > 0
+        mins = np.full(len(zones), np.inf)
+        maxs = np.full(len(zones), -np.inf)
+        for values in [lo_values, hi_values]:
+            np.minimum.at(mins, codes[inside], values[inside])
+            np.maximum.at(maxs, codes[inside], values[inside])
+        mins[total == 0] = np.nan
+        maxs[total == 0] = np.nan
+
+        df = pd.DataFrame({'avg_temperature': avgs,
+                           'min_temperature': mins,
+                           'max_temperature': maxs},
+                          index=zones,
+                          columns=['avg_temperature', 'min_temperature',
+                                   'max_temperature'])
+
+        # Time-weighted percentiles, taking the mean value of each segment.
+        # Sorting by (zone, value) and offsetting each zone's normalized
+        # cumulative weights by its code finds them all with one search.
+        codes, durations = codes[inside], durations[inside]
+        means = ((lo_values + hi_values) / 2)[inside]
+        order = np.lexsort((means, codes))
+        codes, durations, means = codes[order], durations[order], means[order]
+        cum = np.cumsum(durations)
+        zone_ids = np.arange(len(zones))
+        starts = np.searchsorted(codes, zone_ids)
+        ends = np.searchsorted(codes, zone_ids + 1)
+        before = np.concatenate([[0.], cum])[starts]
+        ranks = codes + (cum - before[codes]) / total[codes]
+        for q in percentiles:
+            idx = np.searchsorted(ranks, zone_ids + q / 100.)
+            # Rounding errors could take the search into the next zone
+            idx = np.clip(idx, starts, ends - 1)
+            values = np.full(len(zones), np.nan)
+            found = ends > starts
+            values[found] = means[idx[found]]
+            df['p{}_temperature'.format(q)] = values
+
+        return df
 
+    @depends_on('thermal.stats.temperature_stats')
     def _dfg_stats_avg_temperature(self):
-        df = self._dfg_signal_temperature().dropna()
-        duration = df.index[-1] - df.index[0]
-
-        zones = df.columns.tolist()
-        avgs = []
-        for zone in zones:
-            if duration == 0:
-                avgs.append(np.nan)
-            else:
-                avgs.append(np.trapz(df[zone], df.index) / duration)
-
-        return pd.DataFrame({'avg_temperature': avgs}, index=zones)
+        return self.stats.temperature_stats(percentiles=())[['avg_temperature']]
@@ -0,0 +1,126 @@
+#    Copyright 2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from trappy import FTrace
+
+from millhouse.exception import MissingTraceEventsError
+from millhouse.getter_spec import GetterSpec
+from millhouse.trace_analyzer import TraceAnalyzer
+
+#: Getter label of the errors raised while parsing a trace or constructing its
+#: TraceAnalyzer, in BatchResult.errors
+TRACE_ERROR = '<trace>'
+
+class BatchResult(namedtuple('BatchResult', ['results', 'errors'])):
+    """
+    Results of :func:`analyze_traces`
+
+    :ivar results: DataFrame concatenating all the getter results. Its index
+                   has two extra outer levels: 'trace' (the trace path) and
+                   'getter' (the ``str()`` of the :class:`GetterSpec`).
+    :ivar errors: DataFrame indexed by 'trace' and 'getter' with a single
+                  column, 'error', holding the exceptions raised by getters
+                  that failed. Traces that couldn't be parsed or analyzed at
+                  all have a row with the getter label :data:`TRACE_ERROR`.
+    """
+    __slots__ = ()
+
+def _analyze_trace(path, specs, ftrace_kwargs, analyzer_kwargs, catch):
+    """
+    Parse a single trace and call getters on it. This runs in the worker
+    processes of :func:`analyze_traces`.
+
+    :returns: A list of ``(getter label, DataFrame)`` tuples and a list of
+              ``(getter label, exception)`` tuples.
+    """
+    try:
+        ftrace = FTrace(path, **ftrace_kwargs)
+        analyzer = TraceAnalyzer(ftrace, **analyzer_kwargs)
+    except Exception as e:
+        # e.g. an empty or truncated trace. This shouldn't lose the results
+        # of the other traces.
+        return [], [(TRACE_ERROR, e)]
+
+    results = []
+    errors = []
+    for spec in specs:
+        try:
+            results.append((str(spec), spec(analyzer)))
+        except catch as e:
+            errors.append((str(spec), e))
+    return results, errors
+
+def analyze_traces(paths, getters, max_workers=None, ftrace_kwargs=None,
+                   analyzer_kwargs=None, catch=(MissingTraceEventsError,)):
+    """
+    Run the same analyses on many traces, in parallel
+
+    Each trace is parsed and analyzed in a separate worker process.
+
+    :param paths: Paths of the trace files to analyze
+    :param getters: List of :class:`GetterSpec` (or getter names, for getters
+                    that take no arguments) to call for each trace
+    :param max_workers: Maximum number of worker processes. Defaults to the
+                        number of CPUs. If ``1``, all work is done in the
+                        calling process.
+    :param ftrace_kwargs: Keyword arguments for :class:`trappy.FTrace`.
+                          ``normalize_time`` defaults to ``False``, as the
+                          analyzers' windows are in the traces' timestamps.
+    :param analyzer_kwargs: Keyword arguments for :class:`TraceAnalyzer`
+    :param catch: Exception types that, when raised by a getter, are recorded
+                  in the result rather than aborting the batch. Any error
+                  parsing a trace or constructing its analyzer is recorded.
+
+    :returns: :class:`BatchResult`
+    """
+    specs = [GetterSpec.from_spec(g) for g in getters]
+    ftrace_kwargs = dict(dict(normalize_time=False), **(ftrace_kwargs or {}))
+    args = (specs, ftrace_kwargs, analyzer_kwargs or {}, tuple(catch))
+
+    if max_workers == 1:
+        outputs = [_analyze_trace(path, *args) for path in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(_analyze_trace, path, *args)
+                       for path in paths]
+            outputs = [f.result() for f in futures]
+
+    frames = []
+    keys = []
+    error_rows = []
+    for path, (results, errors) in zip(paths, outputs):
+        for label, df in results:
+            frames.append(df)
+            keys.append((path, label))
+        for label, error in errors:
+            error_rows.append((path, label, error))
+
+    if frames:
+        results = pd.concat(frames, keys=keys, names=['trace', 'getter'])
+    else:
+        results = pd.DataFrame()
+
+    if error_rows:
+        index = pd.MultiIndex.from_tuples([e[:2] for e in error_rows],
+                                          names=['trace', 'getter'])
+    else:
+        index = None
+    errors = pd.DataFrame({'error': [e[2] for e in error_rows]}, index=index)
+    return BatchResult(results, errors)
@@ -0,0 +1,163 @@
+#    Copyright 2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+def _freeze(obj):
+    """
+    Convert a getter argument into something hashable, so it can be used in a
+    cache key. Lists (e.g. a ``core_group``) become tuples.
+    """
+    if isinstance(obj, (list, tuple)):
+        return tuple(_freeze(o) for o in obj)
+    if isinstance(obj, (set, frozenset)):
+        return frozenset(_freeze(o) for o in obj)
+    if isinstance(obj, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in obj.items()))
+    hash(obj) # Raise TypeError early for unhashable objects
+    return obj
+
+def _size_of(obj):
+    """Best-effort estimate of the memory footprint of a getter result"""
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        size = obj.memory_usage(index=True, deep=True)
+        return int(size.sum()) if isinstance(size, pd.Series) else int(size)
+    return int(getattr(obj, 'nbytes', 0))
+
+def _copy(obj):
+    """
+    Return a copy of a cached result that the caller is free to mutate
+    """
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return obj.copy()
+    return obj
+
+class DfgCache(object):
+    """
+    LRU cache of DataFrame getter results, bounded by their size in bytes
+
+    Entries are keyed by the getter's name, its arguments and the window of
+    the module that computed it. Results are copied when they are stored and
+    again when they are read, so callers (including other getters, such as
+    ``cpuidle.signal.cpu_active``) can modify what they are given in place.
+
+    :param max_bytes: Budget for the total size of the cached results. ``None``
+                      means unlimited, ``0`` disables caching.
+
+    The cache can be used from several threads. If a result is requested while
+    another thread is computing it, the request waits for that computation
+    rather than repeating it.
+
+    :ivar hits: Number of lookups that were answered from the cache
+    :ivar misses: Number of lookups that had to call the getter
+    """
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        # Events set when the computations in progress finish, by key
+        self._pending = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def make_key(self, name, args, kwargs, window):
+        """
+        Build a cache key, or return ``None`` if the arguments can't be hashed
+        """
+        try:
+            return (name, _freeze(args), _freeze(kwargs), _freeze(window))
+        except TypeError:
+            return None
+
+    def get_or_compute(self, key, compute):
+        """
+        Return the cached result for ``key``, calling ``compute`` on a miss
+        """
+        if key is None or self.max_bytes == 0:
+            with self._lock:
+                self.misses += 1
+            return compute()
+
+        while True:
+            with self._lock:
+                if key in self._entries:
+                    self.hits += 1
+                    # Move the entry to the most-recently-used end
+                    result, size = self._entries.pop(key)
+                    self._entries[key] = (result, size)
+                    return _copy(result)
+
+                pending = self._pending.get(key)
+                if pending is None:
+                    self.misses += 1
+                    pending = self._pending[key] = threading.Event()
+                    break
+
+            # Another thread is computing this result. Once it's done, look
+            # again (the result may not have been stored if it was too large).
+            pending.wait()
+
+        try:
+            result = compute()
+            stored = _copy(result)
+            with self._lock:
+                self._store(key, stored)
+        finally:
+            with self._lock:
+                del self._pending[key]
+            pending.set()
+        return result
+
+    def _store(self, key, result):
+        size = _size_of(result)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+
+        self._entries[key] = (result, size)
+        self.nbytes += size
+
+        if self.max_bytes is not None:
+            while self.nbytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.nbytes -= evicted_size
+
+    def invalidate(self, window=None):
+        """
+        Drop cached results
+
+        :param window: If provided, only drop results that were computed for
+                       this window.
+        """
+        with self._lock:
+            self._invalidate(window)
+
+    def _invalidate(self, window):
+        if window is None:
+            self._entries.clear()
+            self.nbytes = 0
+            return
+
+        window = _freeze(window)
+        for key in [k for k in self._entries if k[3] == window]:
+            _, size = self._entries.pop(key)
+            self.nbytes -= size
@@ -16,5 +16,10 @@
 
 class MissingTraceEventsError(Exception):
     def __init__(self, events, *args, **kwargs):
+        self.events = list(events)
         super(MissingTraceEventsError, self).__init__(
-            'Missing trace events {}'.format(list(events)), *args, **kwargs)
+            'Missing trace events {}'.format(self.events), *args, **kwargs)
+
+    def __reduce__(self):
+        # Allow the exception to be passed between processes
+        return (self.__class__, (self.events,))
@@ -0,0 +1,253 @@
+#    Copyright 2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Export of DataFrame getter results to Parquet or Arrow IPC files
+
+Whatever their shape, results are written in long format, with one row per
+cell of the result DataFrame, so that all the files share the schema in
+:data:`COLUMNS`. This loses the results' types: values are converted to
+float64 (so only results with numeric or boolean columns can be exported),
+and row and column labels are converted to strings, e.g. a frequency of
+``500000`` in the index is written as ``"500000"``.
+"""
+
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from millhouse.getter_spec import GetterSpec
+
+# Name and Arrow type name of each column of the exported files
+COLUMNS = [
+    ('trace', 'string'),         # Trace ID
+    ('window_start', 'float64'), # The analyzer's window
+    ('window_end', 'float64'),
+    ('module', 'string'),        # e.g. "cpufreq"
+    ('getter', 'string'),        # e.g. "cpufreq.stats.frequency_residency"
+    ('args', 'string'),          # e.g. "[0, 1]"
+    ('index_name', 'string'),    # Name of the result's index, e.g. "frequency"
+    ('index', 'string'),         # Row label
+    ('column', 'string'),        # Column label
+    ('value', 'float64'),
+]
+
+FORMATS = {
+    'parquet': '.parquet',
+    'ipc': '.arrow',
+}
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('pyarrow is required to export results. '
+                          'Install it with "pip install millhouse[export]"')
+    return pyarrow
+
+def _label(label):
+    if isinstance(label, tuple):
+        return '|'.join(str(l) for l in label)
+    return str(label)
+
+class ResultWriter(object):
+    """
+    Write DataFrame getter results for one or many traces to a directory
+
+    The directory is partitioned by getter: the results of each getter go to
+    files in a subdirectory named after it (e.g.
+    ``cpuidle.stats.cpu_time/part-<id>.parquet``, with a different ``<id>``
+    for each writer). Results are buffered and written in batches of at least
+    ``batch_rows`` rows, each batch being a Parquet row group or an Arrow IPC
+    record batch.
+
+    Use as a context manager, or call :meth:`close` to write the remaining
+    buffered results::
+
+        with ResultWriter('results') as writer:
+            for path in paths:
+                writer.write(TraceAnalyzer.from_path(path), getters)
+
+    Requires pyarrow.
+
+    :param path: Output directory. Created if necessary. Files written by
+                 earlier writers are kept.
+    :param format: ``"parquet"`` or ``"ipc"`` (Arrow IPC file format)
+    :param batch_rows: Number of rows to buffer for a getter before writing them
+    """
+
+    def __init__(self, path, format='parquet', batch_rows=1024 * 1024):
+        if format not in FORMATS:
+            raise ValueError('Unknown format "{}", must be one of {}'.format(
+                format, sorted(FORMATS)))
+        self.pa = _import_pyarrow()
+        self.path = path
+        self.format = format
+        self.batch_rows = batch_rows
+        self.schema = self.pa.schema([(name, getattr(self.pa, type_name)())
+                                      for name, type_name in COLUMNS])
+
+        self._id = uuid.uuid4().hex[:16]
+        self._buffers = {} # getter name -> (list of batches, number of rows)
+        self._writers = {} # getter name -> (writer, sink)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, analyzer, getters, trace_id=None):
+        """
+        Call getters on an analyzer and write their results
+
+        :param analyzer: :class:`millhouse.TraceAnalyzer`
+        :param getters: List of :class:`millhouse.GetterSpec` (or getter names)
+        :param trace_id: String identifying the trace. Defaults to the path of
+                         the trace file.
+        """
+        if trace_id is None:
+            trace_id = getattr(analyzer.ftrace, 'trace_path', None) or ''
+        specs = [GetterSpec.from_spec(g) for g in getters]
+        for spec, result in zip(specs, analyzer.compute(specs)):
+            self.write_result(result, spec, trace_id, analyzer.window)
+
+    def write_result(self, result, getter, trace_id, window):
+        """
+        Write the result of a getter call
+
+        :param result: DataFrame or Series with numeric or boolean values
+        :param getter: :class:`millhouse.GetterSpec` (or getter name) that
+                       produced the result
+        :param trace_id: String identifying the trace
+        :param window: ``(start, end)`` of the analyzer's window
+        """
+        spec = GetterSpec.from_spec(getter)
+        if isinstance(result, pd.Series):
+            result = result.to_frame()
+        if not isinstance(result, pd.DataFrame):
+            raise ValueError('Cannot export the {} returned by {}'.format(
+                type(result).__name__, spec))
+        non_numeric = [c for c, dtype in result.dtypes.items()
+                       if dtype.kind not in 'biuf']
+        if non_numeric:
+            raise ValueError('Cannot export the non-numeric columns {} of the '
+                             'result of {}'.format(non_numeric, spec))
+
+        batch = self._make_batch(result, spec, trace_id, window)
+        batches, n_rows = self._buffers.get(spec.name, ([], 0))
+        batches.append(batch)
+        n_rows += batch.num_rows
+        self._buffers[spec.name] = (batches, n_rows)
+        if n_rows >= self.batch_rows:
+            self._flush(spec.name)
+
+    def _make_batch(self, df, spec, trace_id, window):
+        pa = self.pa
+        n_rows, n_cols = df.shape
+        n = n_rows * n_cols
+
+        def constant(value):
+            return pa.array([value] * n, pa.string())
+
+        def labels(values, codes):
+            strings = np.array([_label(v) for v in values], dtype=object)
+            return pa.array(strings[codes], pa.string())
+
+        # Cells are taken column by column, which for a DataFrame with a single
+        # dtype doesn't need a copy
+        values = np.asarray(df.values, dtype=np.float64).ravel(order='F')
+        index_name = ','.join(str(name) for name in df.index.names
+                              if name is not None)
+
+        arrays = [
+            constant(trace_id),
+            pa.array(np.full(n, window[0], dtype=np.float64)),
+            pa.array(np.full(n, window[1], dtype=np.float64)),
+            constant(spec.name.split('.')[0]),
+            constant(spec.name),
+            constant(spec.format_args()),
+            constant(index_name),
+            labels(df.index, np.tile(np.arange(n_rows), n_cols)),
+            labels(df.columns, np.repeat(np.arange(n_cols), n_rows)),
+            pa.array(values),
+        ]
+        return pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+
+    def _open(self, name):
+        """Open the file that a getter's results are written to"""
+        directory = os.path.join(self.path, name)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        file_path = os.path.join(directory, 'part-{}{}'.format(
+            self._id, FORMATS[self.format]))
+
+        if self.format == 'parquet':
+            writer = self.pa.parquet.ParquetWriter(file_path, self.schema)
+            sink = None
+        else:
+            sink = self.pa.OSFile(file_path, 'wb')
+            writer = self.pa.RecordBatchFileWriter(sink, self.schema)
+        self._writers[name] = (writer, sink)
+        return writer
+
+    def _flush(self, name):
+        batches, n_rows = self._buffers.pop(name, ([], 0))
+        if not n_rows:
+            return
+        writer = self._writers.get(name, (None, None))[0] or self._open(name)
+        # Each flush is a single row group or record batch
+        table = self.pa.Table.from_batches(batches, schema=self.schema)
+        if self.format == 'parquet':
+            writer.write_table(table, row_group_size=n_rows)
+        else:
+            writer.write_table(table.combine_chunks())
+
+    def close(self):
+        """Write the buffered results and close the files"""
+        for name in list(self._buffers):
+            self._flush(name)
+        for writer, sink in self._writers.values():
+            writer.close()
+            if sink is not None:
+                sink.close()
+        self._writers = {}
+
+def read_results(path):
+    """
+    Read the results written by :class:`ResultWriter` to a directory
+
+    :returns: DataFrame with the columns in :data:`COLUMNS`
+    """
+    pa = _import_pyarrow()
+    tables = []
+    for name in sorted(os.listdir(path)):
+        directory = os.path.join(path, name)
+        if not os.path.isdir(directory):
+            continue
+        for file_name in sorted(os.listdir(directory)):
+            file_path = os.path.join(directory, file_name)
+            if file_name.endswith(FORMATS['parquet']):
+                tables.append(pa.parquet.read_table(file_path))
+            elif file_name.endswith(FORMATS['ipc']):
+                with pa.OSFile(file_path) as source:
+                    tables.append(pa.ipc.open_file(source).read_all())
+    if not tables:
+        return pd.DataFrame(columns=[name for name, _ in COLUMNS])
+    return pa.concat_tables(tables).to_pandas()
@@ -0,0 +1,61 @@
+#    Copyright 2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+class GetterSpec(object):
+    """
+    Description of a DataFrame getter call to make on a :class:`TraceAnalyzer`
+
+    For example ``GetterSpec('cpufreq.stats.frequency_residency', [0, 1])``
+    describes ``analyzer.cpufreq.stats.frequency_residency([0, 1])``.
+
+    :param name: Path of the getter relative to the analyzer, of the form
+                 ``<module>.<kind>.<name>``
+    :param args: Positional arguments for the getter
+    :param kwargs: Keyword arguments for the getter
+    """
+
+    def __init__(self, name, *args, **kwargs):
+        self.name = name
+        self.args = args
+        self.kwargs = kwargs
+
+    @classmethod
+    def from_spec(cls, spec):
+        """Convert a getter name or a GetterSpec to a GetterSpec"""
+        if isinstance(spec, cls):
+            return spec
+        return cls(spec)
+
+    def resolve(self, analyzer):
+        """Return the getter method this spec describes"""
+        getter = analyzer
+        for part in self.name.split('.'):
+            getter = getattr(getter, part)
+        return getter
+
+    def __call__(self, analyzer):
+        return self.resolve(analyzer)(*self.args, **self.kwargs)
+
+    def format_args(self):
+        """Get the arguments as they would be written in the call"""
+        args = [repr(a) for a in self.args]
+        args += ['{}={!r}'.format(k, v) for k, v in sorted(self.kwargs.items())]
+        return ', '.join(args)
+
+    def __str__(self):
+        return '{}({})'.format(self.name, self.format_args())
+
+    def __repr__(self):
+        return 'GetterSpec({})'.format(str(self))
@@ -0,0 +1,159 @@
+#    Copyright 2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import threading
+from timeit import default_timer
+
+import pandas as pd
+
+from millhouse.cache import _size_of
+
+def _shape_of(obj):
+    """Get the ``(rows, columns)`` of a getter result"""
+    if isinstance(obj, pd.DataFrame):
+        return obj.shape
+    if isinstance(obj, pd.Series):
+        return (len(obj), 1)
+    # StepSignal: one row per change point, one column per key
+    keys = getattr(obj, 'keys', None)
+    times = getattr(obj, 'times', None)
+    if keys is not None and times is not None:
+        return (len(times), len(keys))
+    return (0, 0)
+
+class _Span(object):
+    """A single call to a DataFrame getter"""
+
+    def __init__(self, span_id, parent, name, args, window):
+        self.id = span_id
+        self.parent = parent
+        self.name = name
+        self.args = args
+        self.window = window
+        self.start = None
+        self.duration = None
+        self.child_duration = 0.
+        self.cache_hit = True
+        self.input_rows = 0
+        self.output_rows = 0
+        self.output_columns = 0
+        self.nbytes = 0
+
+class GetterProfiler(object):
+    """
+    Record timing and size information about DataFrame getter calls
+
+    Each getter call is recorded as a span. Calls made by a getter to other
+    getters are nested spans, so the spans show how a high-level analysis fans
+    out (e.g. ``cpufreq.stats.frequency_residency`` calls
+    ``cpuidle.signal.cluster_active``, which calls
+    ``cpuidle.signal.cpu_active``...), and which calls were answered from the
+    cache.
+
+    A span's input rows are the rows of the trace events it read (via
+    :meth:`TraceAnalyzer.get_trace_event`) plus the rows of the results of the
+    getters it called.
+    """
+
+    def __init__(self):
+        self._spans = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def start_span(self, name, args, window):
+        stack = self._stack()
+        parent = stack[-1].id if stack else None
+        with self._lock:
+            span = _Span(len(self._spans), parent, name, args, window)
+            self._spans.append(span)
+        stack.append(span)
+        span.start = default_timer()
+        return span
+
+    def end_span(self, span, result):
+        span.duration = default_timer() - span.start
+        span.output_rows, span.output_columns = _shape_of(result)
+        span.nbytes = _size_of(result)
+
+        stack = self._stack()
+        stack.pop()
+        if stack:
+            stack[-1].child_duration += span.duration
+            stack[-1].input_rows += span.output_rows
+
+    def record_input(self, n_rows):
+        """Record that the current getter read ``n_rows`` rows of trace events"""
+        stack = self._stack()
+        if stack:
+            stack[-1].input_rows += n_rows
+
+    def reset(self):
+        """Forget all the recorded spans"""
+        with self._lock:
+            self._spans = []
+
+    def spans(self):
+        """
+        Get a DataFrame with a row for each getter call, in the order the calls
+        were made
+
+        Columns are 'parent' (the index of the row for the calling getter, or
+        NaN for calls made directly by the user), 'name', 'args', 'window',
+        'start', 'duration', 'self_duration' (excluding the time spent in
+        nested getter calls), 'cache_hit', 'input_rows', 'output_rows',
+        'output_columns' and 'nbytes'. Times are in seconds.
+        """
+        columns = ['parent', 'name', 'args', 'window', 'start', 'duration',
+                   'self_duration', 'cache_hit', 'input_rows', 'output_rows',
+                   'output_columns', 'nbytes']
+        # Only report the calls that have finished
+        spans = [s for s in self._spans if s.duration is not None]
+        rows = [(s.parent, s.name, s.args, s.window, s.start, s.duration,
+                 s.duration - s.child_duration, s.cache_hit, s.input_rows,
+                 s.output_rows, s.output_columns, s.nbytes)
+                for s in spans]
+        df = pd.DataFrame(rows, columns=columns,
+                          index=pd.Index([s.id for s in spans], name='span'))
+        return df
+
+    def stats(self):
+        """
+        Get a DataFrame summarizing the calls to each getter
+
+        Indexed by getter name, with columns 'calls', 'cache_hits', 'time'
+        (total wall time), 'self_time' (excluding nested getter calls),
+        'input_rows' (total), 'output_rows' and 'output_columns' (of the
+        largest result) and 'nbytes' (footprint of the largest result).
+        """
+        spans = self.spans()
+        grouped = spans.groupby('name')
+        df = pd.DataFrame({
+            'calls': grouped.size(),
+            'cache_hits': grouped['cache_hit'].sum().astype(int),
+            'time': grouped['duration'].sum(),
+            'self_time': grouped['self_duration'].sum(),
+            'input_rows': grouped['input_rows'].sum(),
+            'output_rows': grouped['output_rows'].max(),
+            'output_columns': grouped['output_columns'].max(),
+            'nbytes': grouped['nbytes'].max(),
+        }, columns=['calls', 'cache_hits', 'time', 'self_time', 'input_rows',
+                    'output_rows', 'output_columns', 'nbytes'])
+        df.index.name = 'getter'
+        return df.sort_values('time', ascending=False)
@@ -0,0 +1,277 @@
+#    Copyright 2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Sharing the data of a :class:`millhouse.TraceAnalyzer` between processes
+
+:class:`SharedTraceData` copies the arrays that an analyzer's getters are
+computed from into a single file: the event tables (see
+:meth:`TraceAnalyzer.get_event_table`) and the signals derived from them (see
+:attr:`steps.cpu_idle_state` etc.). Analyzers attached to the file in other
+processes with :meth:`TraceAnalyzer.attach` memory-map it and use read-only
+views of these arrays. The processes share the mapped pages, so the data is in
+memory once however many processes analyze it.
+"""
+
+import mmap
+import os
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from trappy.bare_trace import BareTrace
+
+from millhouse.exception import MissingTraceEventsError
+from millhouse.step_signal import StepSignal
+
+# Arrays are aligned to cache lines within the file
+_ALIGN = 64
+
+# Files in this directory are kept in memory, rather than written back to disk
+_SHM_DIR = '/dev/shm'
+
+class SharedTraceData(object):
+    """
+    Memory-mapped file holding the data of a :class:`millhouse.TraceAnalyzer`
+
+    Pass :attr:`descriptor` to other processes (it can be pickled, provided the
+    analyzer's ``topology`` can be), which attach analyzers to the data with
+    :meth:`TraceAnalyzer.attach`::
+
+        with analyzer.share() as shared:
+            pool.map(work, [shared.descriptor] * n_jobs)
+
+        def work(descriptor):
+            analyzer = TraceAnalyzer.attach(descriptor)
+            return analyzer.cpuidle.stats.cpu_time()
+
+    The event tables are published as the analysis modules see them, e.g. with
+    devlib's frequency events already merged into the ``cpu_frequency``
+    events, and only for events that some module declares ``event_columns``
+    for. All the signals that the modules' ``steps`` getters return are
+    computed and published too, so attached analyzers don't rebuild them.
+
+    The file lasts until :meth:`unlink` is called, which the context manager
+    does on exit. Analyzers attached before that keep their mapping of it, but
+    no more analyzers can be attached.
+
+    :param analyzer: :class:`millhouse.TraceAnalyzer` to share
+    :param directory: Directory to create the file in. Defaults to
+                      ``/dev/shm`` if it exists, so that the data is never
+                      written to disk, and to the system's temporary directory
+                      otherwise.
+    :ivar path: Path of the file
+    :ivar descriptor: Dictionary describing the file's contents
+    """
+
+    def __init__(self, analyzer, directory=None):
+        if directory is None and os.path.isdir(_SHM_DIR):
+            directory = _SHM_DIR
+
+        self._arrays = []
+        # Constructing the modules sanitizes the trace events
+        modules = [getattr(analyzer, name) for name, _ in analyzer._MODULES]
+
+        tables = OrderedDict()
+        for event in analyzer.available_events:
+            if analyzer._event_columns(event):
+                tables[event] = self._add_table(analyzer.get_event_table(event))
+
+        steps = OrderedDict()
+        for module in modules:
+            for name in module.steps.getters:
+                try:
+                    signal = getattr(module.steps, name)()
+                except MissingTraceEventsError:
+                    continue
+                steps[name] = self._add_steps(signal)
+
+        layout = []
+        size = 0
+        for array in self._arrays:
+            layout.append((size, array.dtype.str, array.shape))
+            size += array.nbytes + (-array.nbytes % _ALIGN)
+
+        fd, self.path = tempfile.mkstemp(prefix='millhouse-', suffix='.shared',
+                                         dir=directory)
+        with os.fdopen(fd, 'wb') as f:
+            for (offset, _, _), array in zip(layout, self._arrays):
+                f.seek(offset)
+                array.tofile(f)
+            # Empty files can't be mapped
+            f.truncate(max(size, 1))
+        self._arrays = None
+
+        ftrace = analyzer.ftrace
+        start, end = analyzer._resolve_window((None, None))
+        self.descriptor = {
+            'path': self.path,
+            'arrays': layout,
+            'tables': tables,
+            'steps': steps,
+            'trace': {
+                'name': getattr(ftrace, 'name', ''),
+                'trace_path': getattr(ftrace, 'trace_path', None),
+                'basetime': start,
+                'duration': end - start,
+            },
+            'config': {
+                'window': analyzer._window,
+                'topology': analyzer.topology,
+                'cpufreq_domains': analyzer.cpufreq_domains,
+                'cpus': list(analyzer.cpus),
+                'defer_coherency_check': analyzer.defer_coherency_check,
+            },
+        }
+
+    def _add_array(self, array):
+        self._arrays.append(np.ascontiguousarray(array))
+        return len(self._arrays) - 1
+
+    def _add_table(self, df):
+        columns = []
+        for name in df.columns:
+            values = df[name].values
+            categories = None
+            if isinstance(values, pd.Categorical):
+                categories = values.categories.tolist()
+                values = values.codes
+            columns.append((name, self._add_array(values), categories))
+        return {'index': self._add_array(df.index.values), 'columns': columns}
+
+    def _add_steps(self, signal):
+        keys = signal.keys
+        # Object keys, such as thermal zone names, can't be put in the file
+        keys = keys.tolist() if keys.dtype.kind == 'O' else self._add_array(keys)
+        return (signal.name, keys, self._add_array(signal.times),
+                self._add_array(signal.values), self._add_array(signal.offsets))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.unlink()
+
+    def unlink(self):
+        """
+        Delete the file. Its memory is freed once every attached analyzer is
+        gone.
+        """
+        os.remove(self.path)
+
+def _make_frame(data, index):
+    """
+    Make a DataFrame from a dict of column arrays, without copying them
+
+    The DataFrame constructor consolidates the columns of each dtype into a
+    single 2-D array, which copies them in older pandas versions. Giving it a
+    block for each column avoids that.
+    """
+    try:
+        from pandas.core.internals import BlockManager, make_block
+    except ImportError:
+        return pd.DataFrame(data, index=index, columns=list(data.keys()),
+                            copy=False)
+
+    blocks = []
+    for i, values in enumerate(data.values()):
+        if isinstance(values, pd.Categorical):
+            blocks.append(make_block(values, placement=[i], ndim=2))
+        else:
+            blocks.append(make_block(values.reshape(1, -1), placement=[i]))
+    return pd.DataFrame(BlockManager(blocks, [pd.Index(list(data.keys())),
+                                              index]))
+
+class _SharedTrace(BareTrace):
+    """
+    Stand-in for the ``FTrace`` of an analyzer attached to a
+    :class:`SharedTraceData`, whose events are the shared event tables
+    """
+
+    def __init__(self, info, mapping):
+        super(_SharedTrace, self).__init__(name=info['name'])
+        self.trace_path = info['trace_path']
+        self.basetime = info['basetime']
+        self._duration = info['duration']
+        # Keeps the file mapped while the analyzer uses it
+        self.mapping = mapping
+
+    def get_duration(self):
+        return self._duration
+
+class _SharedSignalStore(object):
+    """
+    Read-only signal store returning the signals of a :class:`SharedTraceData`
+
+    Signals are looked up by the name of the ``steps`` getter they were
+    published from, which is also the name the getter stores them under.
+    """
+
+    def __init__(self, signals):
+        self.signals = signals
+
+    def load(self, name, params=None):
+        # The attached analyzer has the configuration the signals were built
+        # with, so params can be ignored
+        return self.signals.get(name)
+
+    def save(self, name, steps, params=None):
+        pass
+
+def open_shared(descriptor):
+    """
+    Map the file described by a :attr:`SharedTraceData.descriptor`
+
+    :returns: Tuple ``(ftrace, signal_store)`` for an attached analyzer, see
+              :meth:`TraceAnalyzer.attach`
+    """
+    # os.open raises OSError for a missing file on Python 2 as well
+    fd = os.open(descriptor['path'], os.O_RDONLY)
+    try:
+        mapping = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+    finally:
+        os.close(fd)
+
+    arrays = []
+    for offset, dtype, shape in descriptor['arrays']:
+        array = np.ndarray(shape, np.dtype(dtype), buffer=mapping,
+                           offset=offset)
+        array.flags.writeable = False
+        arrays.append(array)
+
+    ftrace = _SharedTrace(descriptor['trace'], mapping)
+    for event, table in descriptor['tables'].items():
+        data = OrderedDict()
+        for name, i, categories in table['columns']:
+            values = arrays[i]
+            if categories is not None:
+                values = pd.Categorical.from_codes(values, categories)
+            data[name] = values
+        index = pd.Index(arrays[table['index']], name='Time')
+        # TRAPpy names some of its event classes with unicode strings, which
+        # it can't use to create classes on Python 2
+        ftrace.add_parsed_event(str(event), _make_frame(data, index))
+
+    signals = {}
+    for name, (key_name, keys, times, values, offsets) in \
+            descriptor['steps'].items():
+        if not isinstance(keys, list):
+            keys = arrays[keys]
+        signals[name] = StepSignal(key_name, keys, arrays[times],
+                                   arrays[values], arrays[offsets])
+
+    return ftrace, _SharedSignalStore(signals)
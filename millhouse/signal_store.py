@@ -0,0 +1,171 @@
+#    Copyright 2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+from millhouse.step_signal import StepSignal
+from millhouse.version import __version__
+
+# Amount of data read from each end of a trace file to fingerprint it
+_FINGERPRINT_BYTES = 1024 * 1024
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+    except ImportError:
+        raise ImportError('pyarrow is required to use a cache_dir. '
+                          'Install it with "pip install millhouse[cache]"')
+    return pyarrow
+
+def trace_fingerprint(path):
+    """
+    Compute a string identifying the contents of a trace file
+
+    To keep this cheap for very large traces, only the size, modification time
+    and the data at the beginning and end of the file are hashed. The millhouse
+    version is included, so that upgrading millhouse invalidates old entries.
+    """
+    stat = os.stat(path)
+    sha = hashlib.sha1()
+    sha.update('{} {} {}'.format(
+        stat.st_size, stat.st_mtime, __version__).encode('utf-8'))
+    with open(path, 'rb') as f:
+        sha.update(f.read(_FINGERPRINT_BYTES))
+        if stat.st_size > _FINGERPRINT_BYTES:
+            f.seek(max(_FINGERPRINT_BYTES, stat.st_size - _FINGERPRINT_BYTES))
+            sha.update(f.read())
+    return sha.hexdigest()
+
+def parse_params(ftrace):
+    """
+    Describe how a trace was parsed: its base time, the window that was kept,
+    whether times were normalized and which events were parsed
+
+    Signals derived from different parses of the same file differ, so this is
+    part of the :class:`SignalStore` key. Not all TRAPpy releases record the
+    windows they were given, so the number of rows and the time span of each
+    parsed event are included too.
+
+    :param ftrace: :class:`trappy.FTrace` or
+                   :class:`millhouse.tracedat.TraceDat`
+    """
+    extents = []
+    for name in sorted(ftrace.class_definitions):
+        index = getattr(ftrace, name).data_frame.index
+        span = (float(index[0]), float(index[-1])) if len(index) else ()
+        extents.append((name, len(index)) + span)
+
+    return [
+        ('basetime', float(ftrace.basetime)),
+        ('normalize_time', bool(getattr(ftrace, 'normalized_time', False))),
+        ('window', tuple(getattr(ftrace, 'window', (0, None)))),
+        ('abs_window', tuple(getattr(ftrace, 'abs_window', (0, None)))),
+        ('events', extents),
+    ]
+
+class SignalStore(object):
+    """
+    Directory of :class:`StepSignal` objects persisted as Feather files
+
+    Each trace gets a subdirectory named after its
+    :func:`trace_fingerprint` and, if given, a hash of how it was parsed (see
+    :func:`parse_params`). Signals are stored in long format (one row per
+    change point, with columns ``key``, ``time`` and ``value``) as
+    uncompressed Arrow IPC files, i.e. Feather version 2, and are
+    memory-mapped when they are loaded back.
+
+    Only the signals are stored, not the trace events: the trace is still
+    parsed by every analyzer, and the store saves the time taken to derive
+    the signals from the events.
+
+    Requires pyarrow 0.16 or later.
+
+    :param cache_dir: Root directory of the store. Created if necessary.
+    :param trace_path: Path of the trace file the signals were derived from
+    :param parse: Optional description of how the trace was parsed, e.g. from
+                  :func:`parse_params`
+    """
+
+    def __init__(self, cache_dir, trace_path, parse=None):
+        self.pa = _import_pyarrow()
+        self.trace_path = trace_path
+        name = trace_fingerprint(trace_path)
+        if parse:
+            parse_hash = hashlib.sha1(repr(parse).encode('utf-8'))
+            name = '{}-{}'.format(name, parse_hash.hexdigest()[:16])
+        self.path = os.path.join(cache_dir, name)
+
+    def _signal_path(self, name, params):
+        # params describes the analyzer configuration the signal depends on,
+        # e.g. the cpufreq domains used to inject devlib events.
+        if params:
+            params_hash = hashlib.sha1(repr(params).encode('utf-8'))
+            name = '{}-{}'.format(name, params_hash.hexdigest()[:16])
+        return os.path.join(self.path, name + '.feather')
+
+    def load(self, name, params=None):
+        """
+        Load a signal, returning ``None`` if it hasn't been stored
+        """
+        path = self._signal_path(name, params)
+        if not os.path.exists(path):
+            return None
+
+        source = self.pa.memory_map(path)
+        table = self.pa.ipc.open_file(source).read_all()
+        keys = self._column(table, 'key')
+        times = self._column(table, 'time')
+        values = self._column(table, 'value')
+        key_name = table.schema.metadata[b'name'].decode('utf-8')
+
+        unique_keys, starts = np.unique(keys, return_index=True)
+        offsets = np.append(starts, len(keys))
+        return StepSignal(key_name, unique_keys, times, values, offsets)
+
+    def _column(self, table, name):
+        column = table.column(name)
+        if column.num_chunks == 1:
+            # Avoid a copy, so the array refers to the memory-mapped file
+            return column.chunk(0).to_numpy(zero_copy_only=False)
+        return column.to_numpy()
+
+    def save(self, name, steps, params=None):
+        """
+        Store a signal, replacing any previous version atomically
+        """
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+        keys = np.repeat(steps.keys, np.diff(steps.offsets))
+        table = self.pa.table({'key': keys, 'time': steps.times,
+                               'value': steps.values})
+        table = table.replace_schema_metadata(
+            {'name': steps.name, 'version': __version__})
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        os.close(fd)
+        # The IPC file writer doesn't compress, so the file can be
+        # memory-mapped without a copy. pyarrow.feather only has a compression
+        # option in 0.17 and later.
+        with self.pa.OSFile(tmp_path, 'wb') as sink:
+            writer = self.pa.RecordBatchFileWriter(sink, table.schema)
+            writer.write_table(table)
+            writer.close()
+        os.rename(tmp_path, self._signal_path(name, params))
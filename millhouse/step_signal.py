@@ -0,0 +1,299 @@
+#    Copyright 2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import numpy as np
+import pandas as pd
+
+from millhouse.utils import window_slice
+
+def narrow_dtype(values):
+    """
+    Return ``values`` converted to the smallest integer dtype that can hold
+    them, or unchanged if they aren't all integers.
+    """
+    values = np.asarray(values)
+    if values.dtype.kind not in 'iuf' or not len(values):
+        return values
+    if values.dtype.kind == 'f':
+        if not np.isfinite(values).all() or (values != np.round(values)).any():
+            return values
+
+    lo, hi = values.min(), values.max()
+    for dtype in [np.int8, np.int16, np.int32, np.int64]:
+        info = np.iinfo(dtype)
+        if info.min <= lo and hi <= info.max:
+            return values.astype(dtype)
+    return values
+
+class StepSignal(object):
+    """
+    Compact representation of a group of step functions, such as the idle
+    state of each CPU
+
+    Rather than a DataFrame with a row for every moment where *any* of the
+    signals changed, this stores for each key (e.g. each CPU) only the
+    timestamps where that key's signal was set, and the values it was set to.
+    The arrays for all the keys are concatenated, so key ``keys[i]`` owns
+    ``times[offsets[i]:offsets[i + 1]]``, which are sorted.
+
+    The arrays are read-only: a ``StepSignal`` can be shared freely.
+
+    :ivar name: Name for the keys, e.g. ``"cpu"``
+    :ivar keys: Sorted array of keys
+    :ivar times: float64 array of change-point timestamps
+    :ivar values: Array of the values set at each change point, using the
+                  narrowest integer dtype that can hold them where possible
+    :ivar offsets: int64 array of ``len(keys) + 1`` positions into ``times``
+                   and ``values``
+    """
+
+    def __init__(self, name, keys, times, values, offsets):
+        self.name = name
+        self.keys = np.asarray(keys)
+        self.times = np.asarray(times, dtype=np.float64)
+        self.values = np.asarray(values)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+        for array in [self.keys, self.times, self.values, self.offsets]:
+            array.flags.writeable = False
+
+        self._change_times = None
+
+    @classmethod
+    def from_events(cls, df, key_column, value_column):
+        """
+        Build a StepSignal from a TRAPpy event DataFrame
+
+        Where there are several events at the same time for the same key, the
+        last one (according to ``__line`` if available) wins.
+
+        :param df: DataFrame indexed by ``Time``
+        :param key_column: Column holding the keys, e.g. ``"cpu_id"``
+        :param value_column: Column holding the values, e.g. ``"state"``
+        """
+        lines = df['__line'].values if '__line' in df.columns else None
+        return cls.from_arrays(key_column, df.index.values, df[key_column].values,
+                               df[value_column].values, lines)
+
+    @classmethod
+    def from_arrays(cls, name, times, keys, values, lines=None):
+        """
+        Build a StepSignal from arrays describing a sequence of events
+
+        :param name: Name for the keys
+        :param times: Timestamps of the events
+        :param keys: Key of each event
+        :param values: Value set by each event
+        :param lines: Optional array giving the order of the events in the
+                      trace. Otherwise, the order of the arrays is used.
+        """
+        times = np.asarray(times, dtype=np.float64)
+        keys = np.asarray(keys)
+        sort_keys = (times, keys)
+        if lines is not None:
+            sort_keys = (lines,) + sort_keys
+        order = np.lexsort(sort_keys)
+
+        times = times[order]
+        keys = keys[order]
+        values = np.asarray(values)[order]
+
+        # Keep the last event for each (key, time) pair
+        last = np.ones(len(times), dtype=bool)
+        last[:-1] = (keys[1:] != keys[:-1]) | (times[1:] != times[:-1])
+        times, keys, values = times[last], keys[last], values[last]
+
+        unique_keys, starts = np.unique(keys, return_index=True)
+        offsets = np.append(starts, len(keys))
+        return cls(name, unique_keys, times, narrow_dtype(values), offsets)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in
+                   [self.keys, self.times, self.values, self.offsets])
+
+    @property
+    def change_times(self):
+        """
+        Sorted array of the times where any of the signals was set
+        """
+        # Computed on first use and kept, so that windows can be cut from the
+        # signal with a binary search
+        if self._change_times is None:
+            self._change_times = np.unique(self.times)
+            self._change_times.flags.writeable = False
+        return self._change_times
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.keys
+
+    def get(self, key):
+        """
+        Return a ``(times, values)`` tuple of arrays for a single key
+        """
+        i = np.searchsorted(self.keys, key)
+        if i == len(self.keys) or self.keys[i] != key:
+            raise KeyError(key)
+        lo, hi = self.offsets[i], self.offsets[i + 1]
+        return self.times[lo:hi], self.values[lo:hi]
+
+    def sample(self, times, keys=None):
+        """
+        Get the values of the signals at the given times
+
+        :param times: Sorted array of timestamps
+        :param keys: Keys to sample, defaults to all of :attr:`keys`.
+
+        :returns: 2-D float64 array with a row for each time and a column for
+                  each key. Values are NaN where a key's signal was not yet set.
+        """
+        keys = self.keys if keys is None else keys
+        times = np.asarray(times, dtype=np.float64)
+        out = np.full((len(times), len(keys)), np.nan)
+        for col, key in enumerate(keys):
+            if key not in self:
+                continue
+            key_times, key_values = self.get(key)
+            idx = np.searchsorted(key_times, times, side='right') - 1
+            valid = idx >= 0
+            out[valid, col] = key_values[idx[valid]]
+        return out
+
+    def durations(self, window=None):
+        """
+        Get how long each value was held within a window
+
+        Each value holds from its change point until the next change point for
+        the same key, or until the end of the window for the last one. This is
+        the same representation as :func:`millhouse.utils.integrate_square_wave`
+        uses, computed for all the keys at once.
+
+        :param window: Optional ``(start, end)`` tuple. By default the signals
+                       end at the last change point of any key.
+
+        :returns: float64 array parallel to :attr:`times` and :attr:`values`,
+                  which is zero for values held only outside the window.
+        """
+        if window is None:
+            end = self.change_times[-1] if len(self.times) else 0.
+            window = (-np.inf, end)
+        start, end = window
+
+        next_times = np.empty(len(self.times))
+        next_times[:-1] = self.times[1:]
+        next_times[self.offsets[1:] - 1] = np.inf
+
+        lo = np.maximum(self.times, start)
+        hi = np.minimum(next_times, end)
+        return np.maximum(hi - lo, 0)
+
+    def linear_segments(self, window=None, hold_last=True):
+        """
+        Describe the signals as linear interpolations between change points
+
+        This is the counterpart of :meth:`durations` for sampled quantities
+        such as temperatures: each change point starts a segment that goes in a
+        straight line to the next change point for the same key. The last
+        change point of each key holds its value until the end of the window.
+
+        :param window: Optional ``(start, end)`` tuple, as for :meth:`durations`
+        :param hold_last: If ``False``, the segments starting at the last change
+                          point of each key are left out (given a zero
+                          duration), e.g. because the next value isn't known
+                          yet.
+
+        :returns: Tuple of float64 arrays ``(durations, start_values,
+                  end_values)`` parallel to :attr:`times`, giving the part of
+                  each segment within the window and the interpolated values
+                  at its ends.
+        """
+        if window is None:
+            end = self.change_times[-1] if len(self.times) else 0.
+            window = (-np.inf, end)
+        start, end = window
+
+        values = self.values.astype(np.float64)
+        next_times = np.full(len(self.times), np.inf)
+        next_times[:-1] = self.times[1:]
+        next_values = np.empty(len(values))
+        next_values[:-1] = values[1:]
+
+        last = self.offsets[1:] - 1
+        last = last[last >= self.offsets[:-1]]
+        next_times[last] = np.inf
+        next_values[last] = values[last]
+
+        lo = np.maximum(self.times, start)
+        hi = np.minimum(next_times, end)
+        durations = np.maximum(hi - lo, 0)
+        if not hold_last:
+            durations[last] = 0
+
+        # Held values have no slope. The interpolation is computed for the
+        # others only, as their ends may be infinite.
+        start_values = values.copy()
+        end_values = values.copy()
+        ramp = np.isfinite(next_times)
+        slopes = ((next_values[ramp] - values[ramp]) /
+                  (next_times[ramp] - self.times[ramp]))
+        start_values[ramp] += slopes * (lo[ramp] - self.times[ramp])
+        end_values[ramp] += slopes * (np.maximum(hi, lo)[ramp] -
+                                      self.times[ramp])
+        return durations, start_values, end_values
+
+    def window_times(self, window=None):
+        """
+        Get the timestamps of a wide signal DataFrame for this signal
+
+        These are all the times where any of the signals was set, within the
+        window. If the window begins or ends between those times, the window
+        bounds are added, so that the result describes the signals over the
+        whole window, holding the values set before it begins.
+        """
+        if window is None:
+            return self.change_times
+
+        start, end = window
+        lo, hi, add_start, add_end = window_slice(self.change_times, window)
+        times = self.change_times[lo:hi]
+        if add_start:
+            times = np.insert(times, 0, start)
+        if add_end:
+            times = np.append(times, end)
+        return times
+
+    def to_frame(self, window=None, columns=None):
+        """
+        Convert to a wide DataFrame with a column for each key
+
+        The resulting DataFrame has a row wherever any key's signal was set
+        (within ``window``), and is NaN where a key's signal was not yet set.
+
+        :param window: Optional ``(start, end)`` tuple. See :meth:`window_times`.
+        :param columns: Keys to include as columns even if they have no
+                        events. These are filled with NaN.
+        """
+        keys = self.keys.tolist()
+        if columns is not None:
+            keys = sorted(set(keys) | set(columns))
+
+        times = self.window_times(window)
+        df = pd.DataFrame(self.sample(times, keys), columns=keys,
+                          index=pd.Index(times, name='Time'))
+        df.columns.name = self.name
+        return df
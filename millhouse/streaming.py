@@ -0,0 +1,362 @@
+#    Copyright 2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import io
+import os
+import shutil
+import tempfile
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from trappy import FTrace
+from trappy.utils import listify
+
+from millhouse.step_signal import StepSignal
+from millhouse.trace_analyzer import _SPECIAL_FIELDS_RE, _unique_words
+
+# The events used by StreamingTraceAnalyzer
+EVENTS = ['cpu_idle', 'cpu_frequency', 'thermal']
+
+def read_chunks(path, chunk_lines=1000000):
+    """
+    Read a text trace in chunks, for :meth:`StreamingTraceAnalyzer.update`
+
+    The file is read line by line, and each batch of ``chunk_lines`` lines of
+    the events in :data:`EVENTS` is parsed by TRAPpy on its own, so that only
+    one batch is in memory at a time. Batches are extended past
+    ``chunk_lines`` until the timestamp changes, so that events at the same
+    time are in the same chunk. The ``__line`` columns count the lines of the
+    batch.
+
+    :param path: Path to a text trace, as for :class:`trappy.FTrace`
+    :param chunk_lines: Number of event lines to parse at once
+
+    :returns: Iterator of dicts mapping event names to DataFrames, as TRAPpy
+              would produce with ``normalize_time=False``
+    """
+    words = _unique_words(EVENTS)
+    batch = []
+    last_time = None
+    with io.open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not any(word in line for word in words):
+                continue
+            match = _SPECIAL_FIELDS_RE.match(line)
+            if match is None:
+                continue
+            time = match.group('timestamp')
+            if len(batch) >= chunk_lines and time != last_time:
+                yield _parse_lines(batch)
+                batch = []
+            batch.append(line)
+            last_time = time
+    if batch:
+        yield _parse_lines(batch)
+
+def _parse_lines(lines):
+    """Parse a batch of trace lines with TRAPpy"""
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        tmp_path = os.path.join(tmp_dir, 'chunk.txt')
+        with io.open(tmp_path, 'w', encoding='utf-8') as f:
+            f.writelines(lines)
+        ftrace = FTrace(tmp_path, scope='custom', events=EVENTS,
+                        normalize_time=False)
+    finally:
+        shutil.rmtree(tmp_dir)
+    return {event: getattr(ftrace, event).data_frame for event in EVENTS}
+
+class _Carry(object):
+    """
+    The last value set for each key of a step signal, carried from one chunk of
+    events to the next
+    """
+
+    def __init__(self, name, key_column, value_column):
+        self.name = name
+        self.key_column = key_column
+        self.value_column = value_column
+        self.keys = None
+        self.times = None
+        self.values = None
+
+    def extend(self, df):
+        """
+        Return a StepSignal made of the carried values followed by the events in
+        ``df``, and carry forward the last value of each key
+        """
+        arrays = []
+        if self.keys is not None:
+            arrays.append((self.times, self.keys, self.values))
+        if df is not None and len(df):
+            arrays.append((df.index.values, df[self.key_column].values,
+                           df[self.value_column].values))
+        if not arrays:
+            return StepSignal.from_arrays(self.name, [], [], [])
+
+        times, keys, values = [np.concatenate(a) for a in zip(*arrays)]
+
+        # Array order puts the carried values first, so that chunk events at
+        # the same time as a carried value replace it.
+        steps = StepSignal.from_arrays(self.name, times, keys, values)
+
+        last = steps.offsets[1:] - 1
+        self.keys = steps.keys
+        self.times = steps.times[last]
+        self.values = steps.values[last]
+        return steps
+
+class StreamingTraceAnalyzer(object):
+    """
+    Analyze a trace delivered as a sequence of time-ordered chunks of events
+
+    This computes a subset of the statistics provided by :class:`TraceAnalyzer`
+    (with the same results) for traces that are too large to load at once.
+    Only the state needed to continue the analysis (such as the current state
+    of each CPU and running integrals) is kept between chunks, so memory usage
+    is bounded by the size of the chunks.
+
+    Feed chunks of events to :meth:`update` (for example, those returned by
+    :func:`read_chunks`), or use :meth:`from_path`, then read the results with
+    :meth:`cpu_time`, :meth:`frequency_residency` and :meth:`avg_temperature`.
+
+    devlib's injected cpu_frequency_devlib events are not supported.
+
+    :param window: Tuple of ``(start_time, end_time)`` as for
+                   :class:`TraceAnalyzer`. ``None`` values mean the time of the
+                   first/last event delivered.
+    :param cpus: Optional list of CPU IDs. By default, this is derived from the
+                 CPUs that appear in the events, as for :class:`TraceAnalyzer`.
+    :param core_groups: List of CPU IDs, or of lists of CPU IDs, for which to
+                        compute :meth:`frequency_residency`. As the residency is
+                        computed incrementally, the groups must be known in
+                        advance.
+    """
+
+    @classmethod
+    def from_path(cls, path, chunk_lines=1000000, **kwargs):
+        """
+        Analyze a text trace file, reading it in chunks with :func:`read_chunks`
+
+        Memory usage is bounded by ``chunk_lines``, whatever the size of the
+        trace.
+
+        :param path: Path to a text trace
+        :param chunk_lines: Passed to :func:`read_chunks`
+        :param kwargs: Passed to the :class:`StreamingTraceAnalyzer` constructor
+        """
+        analyzer = cls(**kwargs)
+        for chunk in read_chunks(path, chunk_lines):
+            analyzer.update(chunk)
+        analyzer.finish()
+        return analyzer
+
+    def __init__(self, window=(None, None), cpus=None, core_groups=None):
+        self._window = window
+        self._cpus = cpus
+        self._max_cpu = -1
+        self.core_groups = [tuple(listify(g)) for g in (core_groups or [])]
+
+        self._first_time = None
+        self._boundary = None
+
+        self._idle = _Carry('cpu_id', 'cpu_id', 'state')
+        self._freq = _Carry('cpu', 'cpu', 'frequency')
+        self._thermal = _Carry('thermal_zone', 'thermal_zone', 'temp')
+
+        self._active_time = defaultdict(float)
+        self._residency = [defaultdict(lambda: [0., 0.]) for _ in self.core_groups]
+        self._group_freqs = [set() for _ in self.core_groups]
+
+        # Integral of the temperature and time covered, for each zone
+        self._temp_area = defaultdict(float)
+        self._temp_time = defaultdict(float)
+        self._finished = False
+
+    @property
+    def cpus(self):
+        if self._cpus is not None:
+            return self._cpus
+        return range(self._max_cpu + 1)
+
+    def _bounds(self):
+        """
+        Get the window, using the first event seen as the start if it was not
+        provided. An open end is ``inf`` until :meth:`finish` is called.
+        """
+        start, end = self._window
+        if start is None:
+            start = self._first_time
+        if end is None:
+            end = self._boundary if self._finished else np.inf
+        return start, end
+
+    def update(self, events):
+        """
+        Process the next chunk of events
+
+        :param events: Dict mapping event names (``"cpu_idle"``,
+                       ``"cpu_frequency"`` and ``"thermal"``) to DataFrames in
+                       the format produced by TRAPpy. Events must not be earlier
+                       than any event in a previous chunk, and events with the
+                       same timestamp must be delivered in the same chunk.
+        """
+        if self._finished:
+            raise RuntimeError('Cannot update a finished StreamingTraceAnalyzer')
+
+        dfs = [df for df in events.values() if df is not None and len(df)]
+        if not dfs:
+            return
+
+        chunk_start = min(df.index.min() for df in dfs)
+        chunk_end = max(df.index.max() for df in dfs)
+        if self._boundary is not None and chunk_start < self._boundary:
+            raise ValueError('Chunk starts at {} which is before the end of the '
+                             'previous chunk ({})'.format(chunk_start,
+                                                           self._boundary))
+        if self._first_time is None:
+            self._first_time = chunk_start
+            self._boundary = chunk_start
+
+        for df in dfs:
+            cpus = df['__cpu'] if '__cpu' in df.columns else []
+            if len(cpus):
+                self._max_cpu = max(self._max_cpu, cpus.max())
+
+        idle = self._idle.extend(events.get('cpu_idle'))
+        freq = self._freq.extend(events.get('cpu_frequency'))
+        self._integrate_steps(idle, freq, self._boundary, chunk_end)
+        self._boundary = chunk_end
+
+        for i, group in enumerate(self.core_groups):
+            if group[0] in freq:
+                self._group_freqs[i].update(freq.get(group[0])[1].tolist())
+
+        # The segment after the last reading of each zone is only known once
+        # the next reading (or the end of the trace) arrives.
+        temp = self._thermal.extend(events.get('thermal'))
+        self._integrate_temp(temp, hold_last=False)
+
+    def _integrate_steps(self, idle, freq, lo, hi):
+        """
+        Accumulate the CPU active time and frequency residency between two
+        timestamps
+        """
+        start, end = self._bounds()
+        lo, hi = max(lo, start), min(hi, end)
+        if not lo < hi:
+            return
+
+        # Each interval between these timestamps has constant CPU states
+        times = np.concatenate([idle.times, freq.times])
+        times = np.unique(times[(times > lo) & (times < hi)])
+        times = np.concatenate([[lo], times, [hi]])
+        durations = np.diff(times)
+
+        cpus = list(self.cpus)
+        states = idle.sample(times[:-1], cpus)
+        known = ~np.isnan(states)
+        active = (states == -1) & known
+        for col, cpu in enumerate(cpus):
+            self._active_time[cpu] += durations[active[:, col]].sum()
+
+        for i, group in enumerate(self.core_groups):
+            cols = [cpus.index(c) for c in group if c in cpus]
+            group_known = known[:, cols].any(axis=1)
+            group_active = active[:, cols].any(axis=1)
+
+            freqs = freq.sample(times[:-1], [group[0]])[:, 0]
+            freq_known = ~np.isnan(freqs)
+            uniques, codes = np.unique(freqs[freq_known], return_inverse=True)
+            total = np.bincount(codes, weights=durations[freq_known],
+                                minlength=len(uniques))
+            nonidle = np.bincount(
+                codes, minlength=len(uniques),
+                weights=(durations * (group_known & group_active))[freq_known])
+            for f, t, a in zip(uniques, total, nonidle):
+                self._residency[i][f][0] += t
+                self._residency[i][f][1] += a
+
+    def _integrate_temp(self, temp, hold_last):
+        """
+        Accumulate the integral of the linearly interpolated temperature of
+        each zone
+        """
+        durations, lo_values, hi_values = temp.linear_segments(
+            self._bounds(), hold_last=hold_last)
+        codes = np.repeat(np.arange(len(temp.keys)), np.diff(temp.offsets))
+        time = np.bincount(codes, weights=durations, minlength=len(temp.keys))
+        area = np.bincount(codes, minlength=len(temp.keys),
+                           weights=durations * (lo_values + hi_values) / 2)
+        for zone, t, a in zip(temp.keys.tolist(), time, area):
+            self._temp_time[zone] += t
+            self._temp_area[zone] += a
+
+    def finish(self):
+        """
+        Signal that there are no more events
+
+        This extends the signals up to the end of the window. It is called
+        automatically when results are read.
+        """
+        if self._finished:
+            return
+        self._finished = True
+        if self._first_time is None:
+            return
+
+        idle = self._idle.extend(None)
+        freq = self._freq.extend(None)
+        start, end = self._bounds()
+        self._integrate_steps(idle, freq, self._boundary, end)
+
+        self._integrate_temp(self._thermal.extend(None), hold_last=True)
+
+    def cpu_time(self):
+        """
+        Equivalent of :attr:`TraceAnalyzer.cpuidle.stats.cpu_time`
+        """
+        self.finish()
+        return pd.DataFrame({'active_time': [self._active_time[cpu]
+                                             for cpu in self.cpus]})
+
+    def frequency_residency(self, core_group):
+        """
+        Equivalent of :attr:`TraceAnalyzer.cpufreq.stats.frequency_residency`
+
+        :param core_group: One of the ``core_groups`` passed to the constructor
+        """
+        self.finish()
+        i = self.core_groups.index(tuple(listify(core_group)))
+
+        freqs = sorted(self._group_freqs[i])
+        residency = self._residency[i]
+        df = pd.DataFrame({'total': [residency[f][0] for f in freqs],
+                           'active': [residency[f][1] for f in freqs]},
+                          index=np.array(freqs, dtype=np.int64))
+        df.index.name = 'frequency'
+        return df
+
+    def avg_temperature(self):
+        """
+        Equivalent of :attr:`TraceAnalyzer.thermal.stats.avg_temperature`
+        """
+        self.finish()
+        zones = sorted(self._temp_time)
+        avgs = [self._temp_area[z] / self._temp_time[z]
+                if self._temp_time[z] > 0 else np.nan for z in zones]
+        return pd.DataFrame({'avg_temperature': avgs}, index=zones)
@@ -13,10 +13,40 @@
 # limitations under the License.
 #
 
+import copy
+import io
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from trappy import FTrace
+
+from millhouse.cache import DfgCache
+from millhouse.export import ResultWriter
+from millhouse.getter_spec import GetterSpec
+from millhouse.profiling import GetterProfiler
+from millhouse.shared import SharedTraceData, open_shared
+from millhouse.signal_store import SignalStore, parse_params
+from millhouse.step_signal import narrow_dtype
+from millhouse.tracedat import MAGIC, TraceDat
 from millhouse.analyzer_module.cpuidle import IdleAnalyzerModule
 from millhouse.analyzer_module.cpufreq import CpufreqAnalyzerModule
 from millhouse.analyzer_module.thermal import ThermalAnalyzerModule
 
+# The prefix of the event lines of a text trace. This is the pattern TRAPpy
+# parses them with, which it doesn't export in all its releases.
+_SPECIAL_FIELDS_RE = re.compile(
+    r"^\s*(?P<comm>.*)-(?P<pid>\d+)(?:\s+\(.*\))?\s+\[(?P<cpu>\d+)\]"
+    r"(?:\s+....)?\s+(?P<timestamp>[0-9]+(?P<us>\.[0-9]+)?): (\w+:\s+)+"
+    r"(?P<data>.+)")
+
 class TraceAnalyzer(object):
     """
     The main entry-point class for using this library
@@ -36,6 +66,16 @@ class TraceAnalyzer(object):
 
     :ivar available_events: List of trace events that are available
 
+    :ivar cpus: List of CPU IDs in the target
+
+    :ivar cache: :class:`millhouse.cache.DfgCache` holding the results of
+                 DataFrame getters. Its ``hits`` and ``misses`` attributes count
+                 how often getters were answered without recomputation.
+
+    :ivar profiler: :class:`millhouse.profiling.GetterProfiler` recording the
+                    DataFrame getter calls, or ``None`` if the ``profile``
+                    parameter was ``False``. See also :meth:`profile`.
+
     :param ftrace: :class:`trappy.FTrace` object to base analysis on
 
     :param window: Tuple of ``(start_time, end_time)`` representing region of
@@ -62,6 +102,33 @@ class TraceAnalyzer(object):
 
     :param cpufreq_domains: Optional list of lists of CPU IDs whose CPU frequencies are
                             tied together.
+
+    :param cache_size: Maximum size in bytes of the results of DataFrame getters
+            to keep in memory for re-use. ``None`` means unlimited, ``0``
+            disables the cache.
+
+    :param defer_coherency_check: If ``True``, don't check that
+            ``cpufreq_domains`` are frequency coherent when the analyzer is
+            constructed, but only when an analysis needs to know.
+
+    :param cpus: Optional list of the CPU IDs in the target. If not provided,
+            they are derived from ``topology`` if that is provided, otherwise
+            from the CPUs that appear in the trace.
+
+    :param lazy: If ``True``, defer all work until it is needed: the analysis
+            modules are constructed when they are first accessed, and the trace
+            is only inspected to find :attr:`available_events` and
+            :attr:`cpus` when they are first used. Otherwise an error is raised
+            immediately if the trace is empty.
+
+    :param cache_dir: Optional directory in which to persist the signals derived
+            from the trace (see :attr:`steps.cpu_idle_state` etc.). Later
+            analyzers for the same trace file, parsed the same way and with the
+            same ``cache_dir``, load them from there rather than recomputing
+            them. The trace still has to be parsed. Requires pyarrow.
+
+    :param profile: If ``True``, record the time taken by each DataFrame getter
+            call, and the size of its inputs and outputs, in :attr:`profiler`.
     """
     def get_trace_event(self, event):
         """
@@ -70,37 +137,519 @@ class TraceAnalyzer(object):
         :param event: Name of the event - e.g. ``"cpu_frequency"``
         """
         # TODO raise proper error if event missing (and test it)
+        df = self._raw_event(event)
+        if self.profiler is not None:
+            self.profiler.record_input(len(df))
+        return df
+
+    def get_event_table(self, event):
+        """
+        Get the columns of a trace event that the analysis modules use
+
+        Rather than the full DataFrame parsed by TRAPpy (see
+        :meth:`get_trace_event`), this has only the columns declared in the
+        modules' ``event_columns``, converted to compact dtypes, plus the
+        ``__line`` column. It is built on first use and shared by all the
+        modules.
+
+        :param event: Name of the event - e.g. ``"cpu_frequency"``
+        """
+        raw = self._raw_event(event)
+        # The raw DataFrame can be replaced, e.g. to inject devlib's events
+        built_from, table = self._event_tables.get(event, (None, None))
+        if built_from is not raw:
+            table = self._build_event_table(raw, self._event_columns(event))
+            self._event_tables[event] = (raw, table)
+
+        if self.profiler is not None:
+            self.profiler.record_input(len(table))
+        return table
+
+    def replace_trace_event(self, event, df):
+        """
+        Replace the DataFrame of a trace event, for this analyzer only
+
+        The ``FTrace`` isn't modified, so it can be shared with other
+        analyzers. This is used e.g. to merge devlib's frequency events into the
+        cpu_frequency events.
+
+        :param event: Name of the event - e.g. ``"cpu_frequency"``
+        :param df: DataFrame in the format of TRAPpy's
+        """
+        self._event_frames[event] = df
+
+    def _raw_event(self, event):
+        if event in self._event_frames:
+            return self._event_frames[event]
         return getattr(self.ftrace, event).data_frame
 
-    def __init__(self, ftrace, window=(None, None), topology=None, cpufreq_domains=None):
+    def _event_columns(self, event):
+        """Get the columns of an event declared by all the analysis modules"""
+        columns = OrderedDict()
+        for _, module_cls in self._MODULES:
+            for column, dtype in module_cls.event_columns.get(event, []):
+                if columns.get(column, dtype) != dtype:
+                    raise ValueError(
+                        'Conflicting dtypes declared for column {} of {}: '
+                        '{} and {}'.format(column, event, columns[column], dtype))
+                columns[column] = dtype
+        return columns
+
+    def _build_event_table(self, raw, columns):
+        data = OrderedDict()
+        for column, dtype in columns.items():
+            if len(raw) == 0 and column not in raw.columns:
+                # TRAPpy's DataFrames for missing events have no columns
+                data[column] = pd.Series([], dtype=dtype).values
+            else:
+                data[column] = raw[column].astype(dtype).values
+        if '__line' in raw.columns:
+            data['__line'] = narrow_dtype(raw['__line'].values)
+
+        return pd.DataFrame(data, index=raw.index, columns=list(data.keys()))
+
+    def __init__(self, ftrace, window=(None, None), topology=None, cpufreq_domains=None,
+                 cache_size=256 * 1024 * 1024, defer_coherency_check=False,
+                 cpus=None, lazy=False, cache_dir=None, profile=False):
         self.ftrace = ftrace
         self.topology = topology
         self.cpufreq_domains = cpufreq_domains
+        self.cache = DfgCache(cache_size)
+        self.defer_coherency_check = defer_coherency_check
+        self.profiler = GetterProfiler() if profile else None
+
+        self._window = window
+        self._resolved_window = None
+        self._cpus = cpus
+        self._available_events = None
+        self._modules = {}
+        self._cache_dir = cache_dir
+        self._signal_store = None
+        self._event_tables = {}
+        # Event DataFrames replacing those of the ftrace
+        self._event_frames = {}
+        # The analyzer this is a view of, for other windows of the same trace
+        self._view_of = None
+
+        if not lazy:
+            self._load()
+
+    def _load(self):
+        """Inspect the trace and construct the analysis modules"""
+        self.available_events
+        self.cpus
+        for name, _ in self._MODULES:
+            self._get_module(name)
+
+    _MODULES = [
+        ('cpuidle', IdleAnalyzerModule),
+        ('cpufreq', CpufreqAnalyzerModule),
+        ('thermal', ThermalAnalyzerModule),
+    ]
+
+    @classmethod
+    def from_path(cls, path, getters=None, ftrace_kwargs=None, prefilter=True,
+                  **kwargs):
+        """
+        Parse a trace file and construct an analyzer for it
+
+        Only the events that the analysis modules use are parsed (see
+        :meth:`required_events`), which is faster than parsing a trace with
+        all the events TRAPpy knows about.
+
+        :param path: Path to a text trace (as for :class:`trappy.FTrace`), or
+                a trace-cmd ``trace.dat`` file, which is read with
+                :class:`millhouse.tracedat.TraceDat`
+        :param getters: Optional list of the :class:`millhouse.GetterSpec` (or
+                getter names) that will be called, in case they need events that
+                their module doesn't declare
+        :param ftrace_kwargs: Keyword arguments for :class:`trappy.FTrace`,
+                which override the ``scope`` and ``events`` worked out here,
+                and ``normalize_time``, which is ``False`` by default (the
+                analyzer's window is in the trace's timestamps). For
+                ``trace.dat`` files, only ``events``, ``scope``,
+                ``normalize_time``, ``window`` and ``abs_window`` are
+                supported, with the same meaning.
+        :param prefilter: If ``True``, lines of a text trace that don't contain
+                the name of one of the events are dropped, by a plain substring
+                search, before TRAPpy parses the trace. The ``__line`` columns
+                of the events then count only the lines that were kept.
+        :param kwargs: Passed to the :class:`TraceAnalyzer` constructor
+        """
+        ftrace_kwargs = dict(dict(scope='custom', normalize_time=False,
+                                  events=cls.required_events(getters)),
+                             **(ftrace_kwargs or {}))
+
+        with open(path, 'rb') as f:
+            is_dat = f.read(len(MAGIC)) == MAGIC
+        if is_dat:
+            dat_kwargs = dict(ftrace_kwargs)
+            scope = dat_kwargs.pop('scope')
+            if scope != 'custom':
+                # All the events that TraceDat can read
+                dat_kwargs['events'] = None
+            unsupported = sorted(set(dat_kwargs) - set(
+                ['events', 'normalize_time', 'window', 'abs_window']))
+            if unsupported:
+                raise ValueError('ftrace_kwargs {} are not supported for '
+                                 'trace.dat files'.format(unsupported))
+            return cls(TraceDat(path, **dat_kwargs), **kwargs)
+
+        if not prefilter:
+            return cls(FTrace(path, **ftrace_kwargs), **kwargs)
+
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            filtered_path = os.path.join(tmp_dir, os.path.basename(path))
+            _filter_trace(path, filtered_path,
+                          _unique_words(ftrace_kwargs['events']))
+            ftrace = FTrace(filtered_path, **ftrace_kwargs)
+        finally:
+            shutil.rmtree(tmp_dir)
+        # The analyzer's signal_store identifies the trace by its file
+        ftrace.trace_path = path
+        return cls(ftrace, **kwargs)
+
+    @classmethod
+    def attach(cls, descriptor, lazy=False, **kwargs):
+        """
+        Construct a read-only analyzer for data shared by another process
+
+        The analyzer's event tables and signals are views of the memory-mapped
+        file published with :meth:`share`, so nothing is parsed or copied.
+        It has the configuration (``window``, ``cpufreq_domains`` etc.) of the
+        analyzer that was shared.
+
+        :param descriptor: :attr:`millhouse.shared.SharedTraceData.descriptor`
+        :param lazy: As for the :class:`TraceAnalyzer` constructor
+        :param kwargs: Other arguments for the :class:`TraceAnalyzer`
+                constructor, except those describing the configuration, which
+                can't be changed.
+        """
+        config = descriptor['config']
+        fixed = sorted(set(config) & set(kwargs))
+        if fixed:
+            raise ValueError('Cannot change {} of a shared analyzer'.format(
+                ', '.join(fixed)))
+        kwargs.update(config)
+
+        ftrace, signal_store = open_shared(descriptor)
+        analyzer = cls(ftrace, lazy=True, **kwargs)
+        # The events of the shared trace are already event tables
+        for event in ftrace.get_filters(''):
+            df = getattr(ftrace, event).data_frame
+            analyzer._event_tables[event] = (df, df)
+        analyzer._signal_store = signal_store
+        if not lazy:
+            analyzer._load()
+        return analyzer
+
+    @classmethod
+    def required_events(cls, getters=None):
+        """
+        Get the names of the trace events that the analysis modules use
+
+        These are the ``required_events`` and ``optional_events`` of all the
+        analysis modules, plus the events listed in the
+        :func:`millhouse.analyzer_module.requires_events` decorators of the
+        given getters and the getters they depend on.
+
+        :param getters: Optional list of :class:`millhouse.GetterSpec` (or
+                getter names)
+        """
+        events = []
+        for _, module_cls in cls._MODULES:
+            events += module_cls.required_events + module_cls.optional_events
+
+        modules = dict(cls._MODULES)
+        seen = set()
+        todo = [GetterSpec.from_spec(g).name for g in (getters or [])]
+        while todo:
+            name = todo.pop()
+            if name in seen:
+                continue
+            seen.add(name)
+            module_name, kind, getter_name = name.split('.')
+            method = getattr(modules[module_name],
+                             '_dfg_{}_{}'.format(kind, getter_name))
+            events += getattr(method, '_dfg_required_events', None) or []
+            todo += getattr(method, '_dfg_depends_on', ())
+
+        return sorted(set(events))
+
+    def _get_module(self, name):
+        """Get an analyzer module, constructing it on first use"""
+        if name not in self._modules:
+            if self._view_of is not None:
+                module = self._view_of._get_module(name)._for_analyzer(self)
+            else:
+                module = dict(self._MODULES)[name](self, self.window)
+            self._modules[name] = module
+        return self._modules[name]
+
+    def compute(self, getters, max_workers=None):
+        """
+        Call several DataFrame getters, running independent ones in parallel
 
-        # TODO: This is copied from LISA. This should really be solved in TRAPpy
-        # and removed from both here and LISA.
-        self.available_events = []
-        for val in self.ftrace.get_filters(''):
-            obj = getattr(self.ftrace, val)
-            if len(obj.data_frame):
-                self.available_events.append(val)
+        The getters' dependencies (declared with
+        :func:`millhouse.analyzer_module.depends_on`) are added to a dependency
+        graph, so that results shared by several getters (such as
+        ``cpuidle.signal.cpu_active``) are computed once, before the getters
+        that need them. Getters whose dependencies have been computed are run
+        on a pool of threads.
 
-        if not self.available_events:
-            raise ValueError('No events found in trace')
+        Shared results are passed between getters through :attr:`cache`, so
+        ``cache_size`` shouldn't be ``0``.
 
-        # TODO: Have TRAPpy expose this 'publicly'
-        # TODO: Test this works?
-        max_cpu = max(self.get_trace_event(e)['__cpu'].max()
-                      for e in self.available_events)
-        self.cpus = range(max_cpu + 1)
+        :param getters: List of :class:`millhouse.GetterSpec` (or getter names,
+                for getters that take no arguments) to call
+        :param max_workers: Maximum number of threads. Defaults to the number of
+                CPUs. If ``1``, the getters are called in the calling thread.
 
+        :returns: List of the getters' results, in the order of ``getters``
+        """
+        # Do the lazy work that is shared by all getters up front
+        self.available_events
+        self.cpus
+        self.window
+
+        specs = OrderedDict()
+        deps = {}
+        order = []
+        def add(spec):
+            label = str(spec)
+            if label not in specs:
+                specs[label] = spec
+                # Resolving the getter constructs its module, which is also
+                # best done before starting the threads
+                deps[label] = [add(GetterSpec.from_spec(dep))
+                               for dep in spec.resolve(self).depends_on]
+                # Dependencies come first
+                order.append(label)
+            return label
+
+        labels = [add(GetterSpec.from_spec(g)) for g in getters]
+
+        if max_workers == 1:
+            results = {label: specs[label](self) for label in order}
+            return [results[label] for label in labels]
+
+        def run(label):
+            for dep in deps[label]:
+                futures[dep].result()
+            return specs[label](self)
+
+        # Tasks are submitted after their dependencies, and the executor starts
+        # them in order, so waiting for the dependencies can't deadlock.
+        futures = {}
+        max_workers = max_workers or multiprocessing.cpu_count()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for label in order:
+                futures[label] = executor.submit(run, label)
+            return [futures[label].result() for label in labels]
+
+    def export(self, path, getters, trace_id=None, **kwargs):
+        """
+        Write the results of DataFrame getters to Parquet or Arrow IPC files
+
+        See :class:`millhouse.export.ResultWriter`, which can also be used
+        directly to export the results of many traces. Requires pyarrow.
+
+        :param path: Output directory
+        :param getters: List of :class:`millhouse.GetterSpec` (or getter names)
+        :param trace_id: String identifying the trace. Defaults to the path of
+                the trace file.
+        :param kwargs: Passed to :class:`millhouse.export.ResultWriter`
+        """
+        with ResultWriter(path, **kwargs) as writer:
+            writer.write(self, getters, trace_id)
+
+    def share(self, directory=None):
+        """
+        Copy the data that the analysis is based on to a file that other
+        processes can memory-map
+
+        Other processes can then use it with :meth:`attach`. See
+        :class:`millhouse.shared.SharedTraceData`, which should be unlinked
+        when it is no longer needed.
+
+        :param directory: Directory to create the file in, see
+                :class:`millhouse.shared.SharedTraceData`
+        """
+        return SharedTraceData(self, directory)
+
+    def profile(self):
+        """
+        Get a DataFrame summarizing the time spent in each DataFrame getter
+
+        See :meth:`millhouse.profiling.GetterProfiler.stats`. The analyzer must
+        have been constructed with ``profile=True``.
+        """
+        if self.profiler is None:
+            raise ValueError('Profiling is not enabled. '
+                             'Construct the TraceAnalyzer with profile=True')
+        return self.profiler.stats()
+
+    @property
+    def cpuidle(self):
+        return self._get_module('cpuidle')
+
+    @property
+    def cpufreq(self):
+        return self._get_module('cpufreq')
+
+    @property
+    def thermal(self):
+        return self._get_module('thermal')
+
+    @property
+    def available_events(self):
+        if self._available_events is None:
+            # TODO: This is copied from LISA. This should really be solved in
+            # TRAPpy and removed from both here and LISA.
+            available_events = []
+            for val in self.ftrace.get_filters(''):
+                obj = getattr(self.ftrace, val)
+                if len(obj.data_frame):
+                    available_events.append(val)
+
+            if not available_events:
+                raise ValueError('No events found in trace')
+            self._available_events = available_events
+
+        return self._available_events
+
+    @property
+    def cpus(self):
+        if self._cpus is None:
+            if self.topology is not None:
+                max_cpu = max(self.topology.flatten())
+            else:
+                # TODO: Have TRAPpy expose this 'publicly'
+                # TODO: Test this works?
+                max_cpu = max(self.get_trace_event(e)['__cpu'].max()
+                              for e in self.available_events)
+            self._cpus = range(max_cpu + 1)
+
+        return self._cpus
+
+    @property
+    def signal_store(self):
+        """
+        :class:`millhouse.signal_store.SignalStore` used to persist signals, or
+        ``None`` if no ``cache_dir`` was provided.
+        """
+        if self._signal_store is None and self._cache_dir is not None:
+            trace_path = getattr(self.ftrace, 'trace_path', None)
+            if trace_path is not None:
+                self._signal_store = SignalStore(self._cache_dir, trace_path,
+                                                 parse_params(self.ftrace))
+        return self._signal_store
+
+    @property
+    def window(self):
+        """
+        ``(start, end)`` tuple of the region of the trace to analyze, with
+        ``None`` values replaced by the beginning/end of the trace
+        """
+        if self._resolved_window is None:
+            self._resolved_window = self._resolve_window(self._window)
+
+        return self._resolved_window
+
+    def _resolve_window(self, window):
         start, end = window
         if start is None:
             start = self.ftrace.basetime
         if end is None:
             end = self.ftrace.basetime + self.ftrace.get_duration()
-        window = (start, end)
+        return (start, end)
+
+    def _window_view(self, window):
+        """
+        Get an analyzer for another window of the same trace
+
+        The view shares this analyzer's cache and its analysis modules' state,
+        so the signals derived from the trace (see :attr:`steps.cpu_idle_state`
+        etc.) are built once for all the windows.
+        """
+        view = copy.copy(self)
+        view._window = window
+        view._resolved_window = self._resolve_window(window)
+        view._modules = {}
+        view._view_of = self
+        return view
+
+    def over_windows(self, getter, windows=None, bucket=None):
+        """
+        Call a DataFrame getter for each of a sequence of windows
+
+        For example, to get the frequency residency of CPUs 0 and 1 for each
+        second of the trace::
 
-        self.cpuidle = IdleAnalyzerModule(self, window)
-        self.cpufreq = CpufreqAnalyzerModule(self, window)
-        self.thermal = ThermalAnalyzerModule(self, window)
+            analyzer.over_windows(
+                GetterSpec('cpufreq.stats.frequency_residency', [0, 1]),
+                bucket=1.0)
+
+        The signals that the getters are based on are derived from the trace
+        once, then each window is cut from them with a binary search, so this is
+        much faster than constructing an analyzer for each window. For that to
+        work the analyzer's ``cache_size`` must not be ``0``.
+
+        :param getter: :class:`millhouse.GetterSpec` describing the getter to
+                call, or a getter name (for getters that take no arguments).
+        :param windows: List of ``(start, end)`` tuples, as for the ``window``
+                parameter of :class:`TraceAnalyzer`.
+        :param bucket: Instead of ``windows``, split the analyzer's
+                :attr:`window` into consecutive windows of this duration. The
+                last one is shorter if the duration doesn't divide the window.
+
+        :returns: DataFrame concatenating the getter's results, with two extra
+                  outer index levels, 'window_start' and 'window_end'.
+        """
+        if (windows is None) == (bucket is None):
+            raise ValueError('Exactly one of windows and bucket must be given')
+
+        spec = GetterSpec.from_spec(getter)
+        if bucket is not None:
+            start, end = self.window
+            starts = np.arange(start, end, bucket)
+            windows = zip(starts, np.append(starts[1:], end))
+
+        keys = []
+        frames = []
+        for window in windows:
+            view = self._window_view(window)
+            keys.append(view.window)
+            frames.append(spec(view))
+
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, keys=keys, names=['window_start', 'window_end'])
+
+def _unique_words(events):
+    """
+    Get the strings that identify the lines of the given events in a text trace
+    """
+    known = {}
+    for classes in [FTrace.thermal_classes, FTrace.sched_classes,
+                    FTrace.dynamic_classes]:
+        for trace_cls in classes.values():
+            known[trace_cls.name] = trace_cls.unique_word
+    return [known.get(event, event + ':') for event in events]
+
+def _filter_trace(path, out_path, words):
+    """
+    Copy the lines of a text trace that contain any of ``words``
+
+    The lines before the first event are kept, as is the first event (which
+    TRAPpy uses as the beginning of the trace).
+    """
+    with io.open(path, 'r', encoding='utf-8') as fin, \
+         io.open(out_path, 'w', encoding='utf-8') as fout:
+        for line in fin:
+            fout.write(line)
+            if _SPECIAL_FIELDS_RE.match(line):
+                break
+        fout.writelines(line for line in fin
+                        if any(word in line for word in words))
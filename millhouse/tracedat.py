@@ -0,0 +1,509 @@
+#    Copyright 2017 ARM Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Reader for the binary ``trace.dat`` files recorded by trace-cmd
+
+Parsing the text output of ``trace-cmd report`` is by far the slowest part of
+loading a trace. :class:`TraceDat` instead walks the ring buffer pages in the
+``trace.dat`` file and only decodes the events that millhouse's analyses use,
+straight into NumPy arrays. All the other events are skipped by looking at
+their type ID.
+
+Only the version 6 file format, with ``flyrecord`` data, is supported.
+"""
+
+import mmap
+import re
+import struct
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from trappy import BareTrace
+
+MAGIC = b'\x17\x08\x44tracing'
+
+# Ring buffer event types (the ``type_len`` of the event header)
+_TYPE_PADDING = 29
+_TYPE_TIME_EXTEND = 30
+_TYPE_TIME_STAMP = 31
+_TS_SHIFT = 27
+_DELTA_MASK = (1 << _TS_SHIFT) - 1
+
+# The page commit field has flags in its top bits
+_COMMIT_MASK = (1 << 30) - 1
+
+_UINT32_MAX = (2 ** 32) - 1
+
+class _EventFormat(object):
+    """
+    The layout of a trace event's records, from the format description
+    (``/sys/kernel/debug/tracing/events/<system>/<event>/format``)
+
+    :ivar fields: Dict mapping field names to ``(offset, size, signed,
+                  data_loc)`` tuples
+    """
+
+    _FIELD_RE = re.compile(r'field:(?P<decl>[^;]*);\s*offset:(?P<offset>\d+);'
+                           r'\s*size:(?P<size>\d+);(?:\s*signed:(?P<signed>\d+);)?')
+
+    def __init__(self, system, name, event_id, fields):
+        self.system = system
+        self.name = name
+        self.id = event_id
+        self.fields = fields
+
+    @classmethod
+    def parse(cls, system, text):
+        name = re.search(r'^name:\s*(\S+)', text, re.MULTILINE)
+        event_id = re.search(r'^ID:\s*(\d+)', text, re.MULTILINE)
+        if name is None or event_id is None:
+            raise ValueError('Invalid event format: {}'.format(text[:80]))
+        return cls(system, name.group(1), int(event_id.group(1)),
+                   parse_fields(text))
+
+def parse_fields(text):
+    """
+    Parse the ``field:`` lines of a format description
+
+    :returns: Dict mapping field names to ``(offset, size, signed, data_loc)``
+    """
+    fields = {}
+    for match in _EventFormat._FIELD_RE.finditer(text):
+        decl = match.group('decl').strip()
+        field_name = re.search(r'(\w+)\s*(\[[^\]]*\])?$', decl).group(1)
+        fields[field_name] = (int(match.group('offset')),
+                              int(match.group('size')),
+                              match.group('signed') == '1',
+                              decl.startswith('__data_loc'))
+    return fields
+
+def _cpu_idle_state(df):
+    # The trace contains 4294967295 instead of -1 when exiting an idle state,
+    # which TRAPpy replaces
+    return df.replace(_UINT32_MAX, -1)
+
+def _cpu_frequency_columns(df):
+    # As TRAPpy's cpu_frequency parser
+    return df.rename(columns={'cpu_id': 'cpu', 'state': 'frequency'})
+
+# For each TRAPpy event name: the (system, name) of the kernel event, the
+# fields to decode, and a function to give the DataFrame the same form as
+# TRAPpy's.
+EVENTS = {
+    'cpu_idle': (('power', 'cpu_idle'), ['state', 'cpu_id'], _cpu_idle_state),
+    'cpu_frequency': (('power', 'cpu_frequency'), ['state', 'cpu_id'],
+                      _cpu_frequency_columns),
+    'thermal': (('thermal', 'thermal_temperature'),
+                ['thermal_zone', 'id', 'temp_prev', 'temp'], None),
+}
+
+# Events that devlib writes to trace_marker, which are recorded as ftrace print
+# events. Maps TRAPpy event names to their fields.
+PRINT_EVENTS = {
+    'cpu_frequency_devlib': ['state', 'cpu_id'],
+}
+
+_PRINT_FIELD_RE = re.compile(r'(\w+)=(\S+)')
+
+class TraceDat(BareTrace):
+    """
+    A trace read from a trace-cmd ``trace.dat`` file
+
+    This can be used in place of a :class:`trappy.FTrace` for a
+    :class:`millhouse.TraceAnalyzer`. Each event is an attribute with a
+    ``data_frame`` in the same form as TRAPpy's, indexed by time in seconds
+    (which isn't normalized, as with ``FTrace(normalize_time=False)``), with
+    ``__comm``, ``__pid``, ``__cpu`` and ``__line`` columns and a column for
+    each of the event's fields. ``__line`` is the position of the event in the
+    output of ``trace-cmd report``, counting only the decoded events.
+
+    :param path: Path to the ``trace.dat`` file
+    :param events: TRAPpy names of the events to read. Defaults to all the
+                   events used by millhouse's analyses: ``cpu_idle``,
+                   ``cpu_frequency``, ``cpu_frequency_devlib`` and ``thermal``.
+                   The DataFrames for events that aren't in the trace are empty.
+    :param normalize_time: As for :class:`trappy.FTrace`, but ``False`` by
+                   default
+    :param window: As for :class:`trappy.FTrace`: ``(start, end)`` relative to
+                   the first event of the trace
+    :param abs_window: As for :class:`trappy.FTrace`: ``(start, end)`` in the
+                   trace's timestamps
+    """
+
+    def __init__(self, path, events=None, normalize_time=False,
+                 window=(0, None), abs_window=(0, None)):
+        super(TraceDat, self).__init__(name=path)
+        self.trace_path = path
+
+        events = list(events or sorted(list(EVENTS) + list(PRINT_EVENTS)))
+        unknown = [e for e in events if e not in EVENTS and e not in PRINT_EVENTS]
+        if unknown:
+            raise ValueError('Cannot read events {} from trace.dat files'.format(
+                unknown))
+
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                reader = _Reader(mm)
+                dfs = reader.read(events)
+            finally:
+                mm.close()
+
+        # As for TRAPpy, the trace starts with its first event of any type
+        if reader.start_time is not None:
+            self.basetime = reader.start_time / 1e9
+        times = [df.index.values[-1] for df in dfs.values() if len(df)]
+        if times:
+            self.endtime = max(times)
+
+        self.window = window
+        self.abs_window = abs_window
+        start, end = self._max_window(window, abs_window)
+        for name in events:
+            df = dfs[name]
+            # Inclusive at both ends, as TRAPpy's windows are
+            times = df.index.values
+            keep = times >= start
+            if end is not None:
+                keep &= times <= end
+            if not keep.all():
+                df = df[keep]
+            if normalize_time and self.basetime and len(df):
+                df.index = pd.Index(df.index.values - self.basetime,
+                                    name='Time')
+            self.add_parsed_event(name, df)
+        self.normalized_time = normalize_time
+
+    def _max_window(self, window, abs_window):
+        """
+        Combine ``window`` and ``abs_window`` as TRAPpy does, giving absolute
+        ``(start, end)`` times
+        """
+        start = max(window[0] + self.basetime, abs_window[0])
+        if window[1] is not None and abs_window[1] is not None:
+            end = max(window[1] + self.basetime, abs_window[1])
+        elif window[1] is not None:
+            end = window[1] + self.basetime
+        else:
+            end = abs_window[1]
+        return start, end
+
+class _Reader(object):
+    """
+    Parser for the contents of a ``trace.dat`` file
+
+    :param buf: The file's contents, e.g. as an ``mmap``
+    """
+
+    def __init__(self, buf):
+        self.buf = buf
+        self.pos = 0
+        self.formats = {}
+        self.comms = {}
+        # Timestamp of the first event of any type, in nanoseconds
+        self.start_time = None
+
+        if self._read(len(MAGIC)) != MAGIC:
+            raise ValueError('Not a trace.dat file')
+        version = self._read_cstring()
+        if version != '6':
+            raise ValueError('Unsupported trace.dat version {}'.format(version))
+
+        endian, self.long_size = struct.unpack('<BB', self._read(2))
+        self.endian = '>' if endian else '<'
+        self.page_size = self._unpack('I')
+
+        self._expect('header_page')
+        page_fields = parse_fields(self._read_section('Q'))
+        self.page_header = (page_fields['timestamp'], page_fields['commit'],
+                            page_fields['data'][0])
+        self._expect('header_event')
+        self._read_section('Q')
+
+        for _ in range(self._unpack('I')):
+            self._add_format('ftrace', self._read_section('Q'))
+        for _ in range(self._unpack('I')):
+            system = self._read_cstring()
+            for _ in range(self._unpack('I')):
+                self._add_format(system, self._read_section('Q'))
+
+        self._read_section('I') # kallsyms
+        self._read_section('I') # printk formats
+        for line in self._read_section('Q').splitlines():
+            pid, _, comm = line.strip().partition(' ')
+            if pid.isdigit():
+                self.comms[int(pid)] = comm
+
+        self.n_cpus = self._unpack('I')
+        section = self._read(10)
+        if section == b'options  \x00':
+            while True:
+                option_id = self._unpack('H')
+                if option_id == 0:
+                    break
+                self._read(self._unpack('I'))
+            section = self._read(10)
+        if section != b'flyrecord\x00':
+            raise ValueError('Unsupported trace.dat data section {!r}'.format(
+                section))
+
+        self.cpu_data = [(self._unpack('Q'), self._unpack('Q'))
+                         for _ in range(self.n_cpus)]
+
+    def _read(self, size):
+        data = self.buf[self.pos:self.pos + size]
+        if len(data) != size:
+            raise ValueError('Truncated trace.dat file')
+        self.pos += size
+        return data
+
+    def _unpack(self, fmt):
+        fmt = self.endian + fmt
+        return struct.unpack(fmt, self._read(struct.calcsize(fmt)))[0]
+
+    def _read_cstring(self):
+        end = self.buf.find(b'\x00', self.pos)
+        if end < 0:
+            raise ValueError('Truncated trace.dat file')
+        s = self.buf[self.pos:end].decode('utf-8')
+        self.pos = end + 1
+        return s
+
+    def _read_section(self, size_fmt):
+        return self._read(self._unpack(size_fmt)).decode('utf-8', 'replace')
+
+    def _expect(self, name):
+        if self._read_cstring() != name:
+            raise ValueError('Invalid trace.dat file: expected {}'.format(name))
+
+    def _add_format(self, system, text):
+        fmt = _EventFormat.parse(system, text)
+        self.formats[(system, fmt.name)] = fmt
+
+    def _find_records(self, type_ids):
+        """
+        Walk the ring buffer pages of all CPUs, and find the records of the
+        events with the given type IDs
+
+        :returns: Dict mapping type IDs to a tuple of arrays ``(offsets,
+                  lengths, timestamps, cpus, seqs)``, where the offsets locate
+                  the records in the file and ``seqs`` gives their order in the
+                  CPU's buffer.
+        """
+        (ts_offset, ts_size, _, _), (commit_offset, commit_size, _, _), \
+            data_offset = self.page_header
+        ts_fmt = self.endian + 'Q'
+        commit_fmt = self.endian + ('Q' if commit_size == 8 else 'I')
+        words_dtype = np.dtype(self.endian + 'u4')
+        # The type ID is the first (16-bit) field of a record
+        little = self.endian == '<'
+        # The event header is the bitfield {u32 type_len:5, time_delta:27},
+        # which compilers lay out from the least significant bit on
+        # little-endian machines and from the most significant on big-endian
+        # ones
+        type_shift, delta_shift = (0, 5) if little else (27, 0)
+
+        found = defaultdict(lambda: ([], [], [], [], []))
+        for cpu, (cpu_offset, cpu_size) in enumerate(self.cpu_data):
+            seq = 0
+            for page in range(cpu_offset, cpu_offset + cpu_size, self.page_size):
+                timestamp = struct.unpack_from(ts_fmt, self.buf,
+                                               page + ts_offset)[0]
+                commit = struct.unpack_from(commit_fmt, self.buf,
+                                            page + commit_offset)[0]
+                commit &= _COMMIT_MASK
+                start = page + data_offset
+                # Events are 4-byte aligned, so the page is read as 32-bit words
+                words = np.frombuffer(self.buf, dtype=words_dtype,
+                                      count=commit // 4, offset=start).tolist()
+
+                i = 0
+                while i < len(words):
+                    header = words[i]
+                    type_len = (header >> type_shift) & 0x1f
+                    delta = (header >> delta_shift) & _DELTA_MASK
+                    i += 1
+                    if type_len == _TYPE_PADDING:
+                        i += words[i] // 4 if i < len(words) else 0
+                        continue
+                    elif type_len == _TYPE_TIME_EXTEND:
+                        timestamp += (words[i] << _TS_SHIFT) + delta
+                        i += 1
+                        continue
+                    elif type_len == _TYPE_TIME_STAMP:
+                        timestamp = (words[i] << _TS_SHIFT) + delta
+                        i += 1
+                        continue
+
+                    timestamp += delta
+                    if type_len == 0:
+                        n_words = (words[i] - 4 + 3) // 4
+                        i += 1
+                    else:
+                        n_words = type_len
+
+                    if seq == 0 and (self.start_time is None or
+                                     timestamp < self.start_time):
+                        self.start_time = timestamp
+
+                    word = words[i]
+                    type_id = word & 0xffff if little else word >> 16
+                    if type_id in type_ids:
+                        records = found[type_id]
+                        records[0].append(start + i * 4)
+                        records[1].append(n_words * 4)
+                        records[2].append(timestamp)
+                        records[3].append(cpu)
+                        records[4].append(seq)
+                    seq += 1
+                    i += n_words
+
+        return {type_id: tuple(np.array(a, dtype=np.int64) for a in records)
+                for type_id, records in found.items()}
+
+    def _decode_field(self, buf, offsets, field):
+        """Decode a field of all the records at ``offsets``"""
+        offset, size, signed, data_loc = field
+        if data_loc:
+            # Strings are stored after the fixed fields, located by a 32-bit
+            # "(length << 16) | offset"
+            locs = self._decode_field(buf, offsets, (offset, 4, False, False))
+            return np.array([
+                self.buf[rec + (loc & 0xffff):rec + (loc & 0xffff) + (loc >> 16)]
+                .split(b'\x00', 1)[0].decode('utf-8', 'replace')
+                for rec, loc in zip(offsets.tolist(), locs.tolist())],
+                dtype=object)
+
+        dtype = np.dtype('{}{}{}'.format(self.endian, 'i' if signed else 'u',
+                                         size))
+        if not len(offsets):
+            return np.array([], dtype=np.int64)
+        raw = buf[offsets[:, None] + offset + np.arange(size)]
+        return raw.view(dtype).ravel().astype(np.int64)
+
+    def read(self, events):
+        """
+        Decode events
+
+        :param events: TRAPpy names of the events to decode
+        :returns: Dict mapping event names to DataFrames
+        """
+        wanted = {}
+        for name in events:
+            if name in EVENTS:
+                fmt = self.formats.get(EVENTS[name][0])
+            else:
+                fmt = self.formats.get(('ftrace', 'print'))
+            if fmt is not None:
+                wanted[fmt.id] = fmt
+
+        records = self._find_records(wanted)
+        empty = tuple(np.array([], dtype=np.int64) for _ in range(5))
+
+        # Number the events in the order trace-cmd reports them: by timestamp,
+        # then CPU, then order in the CPU's buffer
+        all_records = list(records.values())
+        if all_records:
+            ts, cpus, seqs = [np.concatenate([r[i] for r in all_records])
+                              for i in [2, 3, 4]]
+            lines = np.empty(len(ts), dtype=np.int64)
+            lines[np.lexsort((seqs, cpus, ts))] = np.arange(len(ts))
+            bounds = np.cumsum([0] + [len(r[0]) for r in all_records])
+            line_of = {type_id: lines[lo:hi] for type_id, lo, hi in
+                       zip(records.keys(), bounds[:-1], bounds[1:])}
+
+        buf = np.frombuffer(self.buf, dtype=np.uint8)
+        try:
+            dfs = {}
+            for name in events:
+                if name in EVENTS:
+                    (system, event), fields, finalize = EVENTS[name]
+                else:
+                    system, event = 'ftrace', 'print'
+                    fields = PRINT_EVENTS[name]
+                    finalize = None
+                fmt = self.formats.get((system, event))
+
+                if fmt is None or fmt.id not in records:
+                    offsets, lengths, ts, cpus, _ = empty
+                    lines = np.array([], dtype=np.int64)
+                else:
+                    offsets, lengths, ts, cpus, _ = records[fmt.id]
+                    lines = line_of[fmt.id]
+
+                if name in EVENTS:
+                    data = {f: self._decode_field(buf, offsets, fmt.fields[f])
+                            if fmt is not None else np.array([], dtype=np.int64)
+                            for f in fields}
+                    keep = slice(None)
+                else:
+                    data, keep = self._decode_prints(buf, name, fields, fmt,
+                                                     offsets, lengths)
+
+                df = self._make_frame(fmt, buf, offsets[keep], ts[keep],
+                                      cpus[keep], lines[keep], data, fields)
+                dfs[name] = finalize(df) if finalize else df
+        finally:
+            # The mmap can't be closed while arrays are still using it. The
+            # name is rebound rather than deleted, as the field comprehension
+            # above refers to it.
+            buf = None
+        return dfs
+
+    def _decode_prints(self, buf, name, fields, fmt, offsets, lengths):
+        """
+        Decode events written to trace_marker, from ftrace print records whose
+        text starts with ``name:``
+
+        :returns: Tuple of a dict of the fields' arrays and the mask of the
+                  records that are ``name`` events
+        """
+        prefix = (name + ':').encode('utf-8')
+        keep = np.zeros(len(offsets), dtype=bool)
+        values = {f: [] for f in fields}
+        if fmt is not None and len(offsets):
+            text_offset = fmt.fields['buf'][0]
+            for i, (rec, length) in enumerate(zip(offsets.tolist(),
+                                                  lengths.tolist())):
+                if self.buf[rec + text_offset:rec + text_offset + len(prefix)] \
+                   != prefix:
+                    continue
+                text = self.buf[rec + text_offset + len(prefix):rec + length]
+                text = text.split(b'\x00', 1)[0].decode('utf-8', 'replace')
+                parsed = dict(_PRINT_FIELD_RE.findall(text))
+                keep[i] = True
+                for f in fields:
+                    values[f].append(int(parsed[f]))
+        return ({f: np.array(v, dtype=np.int64) for f, v in values.items()},
+                keep)
+
+    def _make_frame(self, fmt, buf, offsets, ts, cpus, lines, data, fields):
+        if fmt is not None and len(offsets):
+            pids = self._decode_field(buf, offsets, fmt.fields['common_pid'])
+        else:
+            pids = np.array([], dtype=np.int64)
+        comms = np.array([self.comms.get(pid, '<...>') for pid in pids.tolist()],
+                         dtype=object)
+
+        columns = ['__comm', '__cpu', '__line', '__pid'] + fields
+        df = pd.DataFrame(dict(data, __comm=comms, __cpu=cpus, __line=lines,
+                               __pid=pids),
+                          index=pd.Index(ts / 1e9, name='Time'),
+                          columns=columns)
+        # Lines are numbered in time order
+        return df.sort_values('__line')
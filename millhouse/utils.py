@@ -14,6 +14,7 @@
 #
 
 import numpy as np
+import pandas as pd
 
 def drop_consecutive_duplicates(df):
     """
@@ -21,9 +22,108 @@ def drop_consecutive_duplicates(df):
     """
     return df[df.shift() != df]
 
+def window_slice(times, window):
+    """
+    Find the part of a signal that is inside a window, with a binary search
+
+    :param times: Sorted array of the signal's timestamps
+    :param window: ``(start, end)`` tuple
+
+    :returns: A tuple ``(lo, hi, add_start, add_end)``. ``times[lo:hi]`` are the
+              timestamps inside the window. ``add_start`` and ``add_end`` say
+              whether the window begins before the first of them, or ends
+              after the last of them, so that a row has to be added at that
+              window bound to describe the signal over the whole window.
+    """
+    start, end = window
+    lo = np.searchsorted(times, start, side='left')
+    hi = np.searchsorted(times, end, side='right')
+    if lo == hi:
+        return lo, hi, True, True
+    return lo, hi, start < times[lo], end > times[hi - 1]
+
 def integrate_square_wave(series):
     """
     Return the integral of a pandas Series consisting of just 0 and 1 values
+
+    See :func:`integrate_step_signal` for a more general version.
+    """
+    return float(integrate_step_signal(series.values, series.index.values)[0])
+
+def integrate_step_signal(signal, times=None, window=None, by=None,
+                          linear=False):
     """
-    values = series.values[:-1]
-    return float((values * np.diff(series.index)).sum())
+    Integrate each column of a signal over time
+
+    Each value of the signal holds from its timestamp until the next timestamp
+    (or, if ``linear`` is ``True``, the signal is interpolated linearly between
+    them). Intervals where the signal is NaN are left out of the integral, so
+    that a column with a NaN prefix gives the same result as integrating it
+    after ``dropna()``.
+
+    :param signal: DataFrame indexed by time, with a column for each signal
+                   (e.g. the result of a ``signal`` getter). Alternatively a 1-D
+                   or 2-D array with a row for each element of ``times``.
+    :param times: Sorted array of timestamps, if ``signal`` is an array
+    :param window: Optional ``(start, end)`` tuple. Only the parts of the
+                   intervals that are inside the window are integrated.
+    :param by: Optional array (or DataFrame) of the same shape as ``signal``.
+               If provided, the integral is split according to the value of
+               ``by`` at the start of each interval, ignoring intervals where
+               it's NaN. For example with a signal of ones and ``by`` a CPU
+               frequency signal, this gives the time spent at each frequency.
+    :param linear: Interpolate linearly between values rather than treating
+                   the signal as a step function.
+
+    :returns: If ``by`` is ``None``, a Series with the integral of each column.
+              Otherwise a DataFrame indexed by the distinct values of ``by``,
+              with the integral at each value for each column.
+    """
+    if isinstance(signal, pd.DataFrame):
+        times = signal.index.values
+        columns = signal.columns
+        values = signal.values.astype(np.float64)
+    else:
+        values = np.asarray(signal, dtype=np.float64)
+        if values.ndim == 1:
+            values = values[:, np.newaxis]
+        columns = pd.RangeIndex(values.shape[1])
+    times = np.asarray(times, dtype=np.float64)
+
+    # Each row of these arrays is the interval between a timestamp and the next
+    starts = times[:-1]
+    lo, hi = starts, times[1:]
+    if window is not None:
+        lo = np.clip(lo, *window)
+        hi = np.clip(hi, *window)
+    durations = (hi - lo)[:, np.newaxis]
+
+    left = values[:-1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if linear:
+            spans = (times[1:] - starts)[:, np.newaxis]
+            slopes = np.where(spans > 0, (values[1:] - left) / spans, 0)
+            lo_values = left + slopes * (lo - starts)[:, np.newaxis]
+            hi_values = left + slopes * (hi - starts)[:, np.newaxis]
+            areas = durations * (lo_values + hi_values) / 2
+        else:
+            areas = durations * left
+    areas[np.isnan(areas)] = 0
+
+    if by is None:
+        return pd.Series(areas.sum(axis=0), index=columns)
+
+    by = np.asarray(by, dtype=np.float64)
+    if by.ndim == 1:
+        by = by[:, np.newaxis]
+    by = by[:-1]
+    known = ~np.isnan(by)
+    by_values, codes = np.unique(by[known], return_inverse=True)
+
+    # Sum the areas for each (value, column) pair in a single bincount
+    cols = np.broadcast_to(np.arange(by.shape[1]), by.shape)[known]
+    n_cols = len(columns)
+    sums = np.bincount(codes * n_cols + cols, weights=areas[known],
+                       minlength=len(by_values) * n_cols)
+    return pd.DataFrame(sums.reshape(len(by_values), n_cols),
+                        index=by_values, columns=columns)
@@ -13,17 +13,24 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+import os
+
 from setuptools import setup, find_packages
 
+version = {}
+with open(os.path.join(os.path.dirname(__file__), 'millhouse', 'version.py')) as f:
+    exec(f.read(), version)
+
 REQUIRES = [
     'trappy', # TODO version?
-    'wrapt'
+    'wrapt',
+    'futures; python_version < "3"',
 ]
 
 LONG_DESCRIPTION = "todo"
 
 setup(name='millhouse',
-      version='0.0.1',
+      version=version['__version__'],
       description='todo',
       long_description=LONG_DESCRIPTION,
       author='ARM-MILLHOUSE',
@@ -37,4 +44,10 @@ setup(name='millhouse',
           # As we depend on trace data from the Linux Kernel/FTrace
           "Topic :: System :: Operating System Kernels :: Linux",
       ],
-      install_requires=REQUIRES)
+      install_requires=REQUIRES,
+      extras_require={
+          # For TraceAnalyzer's cache_dir
+          'cache': ['pyarrow>=0.16'],
+          # For exporting results with millhouse.export
+          'export': ['pyarrow>=0.16'],
+      })
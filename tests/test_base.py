@@ -22,6 +22,11 @@ from unittest import TestCase
 
 from trappy import FTrace
 
+FTRACE_KWARGS = dict(scope='custom',
+                     events=['cpu_idle', 'cpu_frequency', 'cpu_frequency_devlib',
+                             'thermal_temperature'],
+                     normalize_time=False)
+
 class MillhouseTestBase(TestCase):
     def setUp(self):
         self.test_dir = mkdtemp()
@@ -29,14 +34,13 @@ class MillhouseTestBase(TestCase):
     def tearDown(self):
         rmtree(self.test_dir)
 
-    def make_ftrace(self, in_data):
-        filename = 'trace_{}.txt'.format(self.id())
+    def make_trace_file(self, in_data, name=None):
+        filename = 'trace_{}.txt'.format(name or self.id())
         path = os.path.join(self.test_dir, filename)
         with open(path, 'w') as f:
             f.write(in_data)
+        return path
 
-        return FTrace(path, scope='custom',
-                      events=['cpu_idle', 'cpu_frequency', 'cpu_frequency_devlib',
-                              'thermal_temperature'],
-                      normalize_time=False)
+    def make_ftrace(self, in_data):
+        return FTrace(self.make_trace_file(in_data), **FTRACE_KWARGS)
 
@@ -0,0 +1,84 @@
+# SPDX-License-Identifier: Apache-2.0
+#
+# Copyright (C) 2017, ARM Limited and contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from test_base import MillhouseTestBase, FTRACE_KWARGS
+
+from millhouse import analyze_traces, GetterSpec, MissingTraceEventsError
+from millhouse.batch import TRACE_ERROR
+
+IDLE_DATA = """
+          <idle>-0     [000]   100.000000: cpu_idle:             state=4294967295 cpu_id=0
+          <idle>-0     [001]   100.000000: cpu_idle:             state=4294967295 cpu_id=1
+          <idle>-0     [000]   200.000000: cpu_idle:             state=0 cpu_id=0
+          <idle>-0     [001]   300.000000: cpu_idle:             state=0 cpu_id=1
+"""
+
+THERMAL_DATA = """
+kworker/5:1-28858 [000]  100.000000: thermal_temperature:  thermal_zone=cls0 id=0 temp_prev=10000 temp=20000
+kworker/5:1-28858 [000]  300.000000: thermal_temperature:  thermal_zone=cls0 id=0 temp_prev=20000 temp=30000
+"""
+
+class TestBatch(MillhouseTestBase):
+    def _run(self, max_workers):
+        paths = [self.make_trace_file(IDLE_DATA, 'idle'),
+                 self.make_trace_file(THERMAL_DATA, 'thermal')]
+        getters = ['cpuidle.stats.cpu_time',
+                   GetterSpec('thermal.stats.avg_temperature')]
+        return paths, analyze_traces(paths, getters, max_workers=max_workers,
+                                     ftrace_kwargs=FTRACE_KWARGS)
+
+    def _check(self, paths, batch):
+        idle_path, thermal_path = paths
+
+        cpu_time = batch.results.loc[(idle_path, 'cpuidle.stats.cpu_time()')]
+        self.assertEqual(cpu_time['active_time'].tolist(), [100, 200])
+
+        avg_temp = batch.results.loc[
+            (thermal_path, 'thermal.stats.avg_temperature()')]
+        self.assertEqual(avg_temp['avg_temperature']['cls0'], 25000)
+
+        self.assertEqual(batch.errors.index.tolist(),
+                         [(idle_path, 'thermal.stats.avg_temperature()'),
+                          (thermal_path, 'cpuidle.stats.cpu_time()')])
+        for error in batch.errors['error']:
+            self.assertIsInstance(error, MissingTraceEventsError)
+
+    def test_in_process(self):
+        """Test a batch run in the calling process"""
+        self._check(*self._run(max_workers=1))
+
+    def test_process_pool(self):
+        """Test a batch run across worker processes"""
+        self._check(*self._run(max_workers=2))
+
+    def test_trace_errors(self):
+        """Test that a trace that can't be analyzed doesn't fail the batch"""
+        paths = [self.make_trace_file(IDLE_DATA, 'idle'),
+                 self.make_trace_file('', 'empty')]
+        # Times aren't normalized by default
+        batch = analyze_traces(paths, ['cpuidle.stats.cpu_time'],
+                               max_workers=1)
+
+        cpu_time = batch.results.loc[(paths[0], 'cpuidle.stats.cpu_time()')]
+        self.assertEqual(cpu_time['active_time'].tolist(), [100, 200])
+        self.assertEqual(batch.errors.index.tolist(), [(paths[1], TRACE_ERROR)])
+        self.assertIsInstance(batch.errors['error'].iloc[0], ValueError)
+
+    def test_getter_spec_str(self):
+        spec = GetterSpec('cpufreq.stats.frequency_residency', [0, 1])
+        self.assertEqual(str(spec),
+                         'cpufreq.stats.frequency_residency([0, 1])')
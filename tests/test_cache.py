@@ -0,0 +1,87 @@
+# SPDX-License-Identifier: Apache-2.0
+#
+# Copyright (C) 2017, ARM Limited and contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import pandas as pd
+
+from test_base import MillhouseTestBase
+
+from millhouse.cache import DfgCache
+from millhouse.trace_analyzer import TraceAnalyzer
+
+TEST_DATA = """
+          <idle>-0     [000]   100.000000: cpu_idle:             state=4294967295 cpu_id=0
+          <idle>-0     [001]   100.000000: cpu_idle:             state=4294967295 cpu_id=1
+          <idle>-0     [000]   200.000000: cpu_idle:             state=0 cpu_id=0
+          <idle>-0     [001]   300.000000: cpu_idle:             state=0 cpu_id=1
+"""
+
+class TestCache(MillhouseTestBase):
+    def test_hits(self):
+        """Test that repeated getter calls are served from the cache"""
+        analyzer = TraceAnalyzer(self.make_ftrace(TEST_DATA))
+
+        analyzer.cpuidle.signal.cluster_active([0, 1])
+        misses = analyzer.cache.misses
+        self.assertEqual(analyzer.cache.hits, 0)
+
+        analyzer.cpuidle.signal.cluster_active([0, 1])
+        analyzer.cpuidle.signal.cluster_active([0])
+        self.assertEqual(analyzer.cache.hits, 2)
+        # cluster_active([0]) and the clusters_active([[0]]) it's based on
+        self.assertEqual(analyzer.cache.misses, misses + 2)
+
+    def test_copy_on_read(self):
+        """Test that mutating a getter's result doesn't affect the cache"""
+        analyzer = TraceAnalyzer(self.make_ftrace(TEST_DATA))
+
+        df = analyzer.cpuidle.signal.cpu_idle_state()
+        df[0] = 42
+        df = analyzer.cpuidle.signal.cpu_idle_state()
+        self.assertNotIn(42, df[0].tolist())
+
+    def test_disabled(self):
+        """Test that a cache_size of 0 disables the cache"""
+        analyzer = TraceAnalyzer(self.make_ftrace(TEST_DATA), cache_size=0)
+
+        analyzer.cpuidle.stats.cpu_time()
+        analyzer.cpuidle.stats.cpu_time()
+        self.assertEqual(analyzer.cache.hits, 0)
+        self.assertEqual(len(analyzer.cache), 0)
+
+    def test_lru_budget(self):
+        """Test that the least recently used results are evicted first"""
+        df = pd.DataFrame({'a': range(100)})
+        size = int(df.memory_usage(index=True, deep=True).sum())
+        cache = DfgCache(max_bytes=size * 2)
+
+        for name in ['x', 'y', 'x', 'z']:
+            cache.get_or_compute(cache.make_key(name, (), {}, (0, 1)),
+                                 lambda: df)
+
+        self.assertEqual(len(cache), 2)
+        self.assertIsNotNone(cache._entries.get(('x', (), (), (0, 1))))
+        self.assertIsNone(cache._entries.get(('y', (), (), (0, 1))))
+        self.assertLessEqual(cache.nbytes, cache.max_bytes)
+
+    def test_invalidate_window(self):
+        """Test dropping only the results computed for one window"""
+        cache = DfgCache()
+        for window in [(0, 1), (1, 2)]:
+            cache.get_or_compute(cache.make_key('x', (), {}, window),
+                                 lambda: pd.DataFrame({'a': [1]}))
+        cache.invalidate(window=(0, 1))
+        self.assertEqual(len(cache), 1)
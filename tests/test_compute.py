@@ -0,0 +1,71 @@
+# SPDX-License-Identifier: Apache-2.0
+#
+# Copyright (C) 2017, ARM Limited and contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from test_base import MillhouseTestBase
+
+from millhouse import GetterSpec, MissingTraceEventsError
+from millhouse.trace_analyzer import TraceAnalyzer
+
+TEST_DATA = """
+          <idle>-0     [000]   100.000000: cpu_idle:             state=4294967295 cpu_id=0
+          <idle>-0     [001]   100.000000: cpu_frequency:        state=1000 cpu_id=0
+          <idle>-0     [001]   100.000000: cpu_frequency:        state=1000 cpu_id=1
+          <idle>-0     [001]   120.000000: cpu_idle:             state=4294967295 cpu_id=1
+kworker/5:1-28858 [000]  150.000000: thermal_temperature:  thermal_zone=cls0 id=0 temp_prev=10000 temp=20000
+          <idle>-0     [000]   200.000000: cpu_idle:             state=0 cpu_id=0
+          <idle>-0     [001]   250.000000: cpu_frequency:        state=2000 cpu_id=0
+          <idle>-0     [001]   250.000000: cpu_frequency:        state=2000 cpu_id=1
+          <idle>-0     [001]   300.000000: cpu_idle:             state=1 cpu_id=1
+kworker/5:1-28858 [000]  320.000000: thermal_temperature:  thermal_zone=cls0 id=0 temp_prev=20000 temp=30000
+"""
+
+GETTERS = [GetterSpec('cpufreq.stats.frequency_residency', [0, 1]),
+           'cpuidle.stats.cpu_time',
+           GetterSpec('cpuidle.signal.cluster_active', [0, 1]),
+           'thermal.stats.avg_temperature']
+
+class TestCompute(MillhouseTestBase):
+    def _analyzer(self, **kwargs):
+        return TraceAnalyzer(self.make_ftrace(TEST_DATA), cpufreq_domains=[[0, 1]],
+                             **kwargs)
+
+    def test_compute(self):
+        """Test that compute gives the same results as calling the getters"""
+        exp = [GetterSpec.from_spec(g)(self._analyzer()) for g in GETTERS]
+        for max_workers in [1, 4]:
+            results = self._analyzer().compute(GETTERS, max_workers=max_workers)
+            self.assertEqual(len(results), len(exp))
+            for df, exp_df in zip(results, exp):
+                self.assertTrue(df.equals(exp_df))
+
+    def test_shared_results(self):
+        """Test that results shared by several getters are computed once"""
+        analyzer = self._analyzer(profile=True)
+        analyzer.profiler.reset()
+        analyzer.compute(GETTERS, max_workers=4)
+
+        df = analyzer.profile()
+        self.assertEqual(df.loc['cpuidle.signal.cpu_active', 'calls'] -
+                         df.loc['cpuidle.signal.cpu_active', 'cache_hits'], 1)
+        self.assertEqual(df.loc['cpuidle.steps.cpu_idle_state', 'calls'] -
+                         df.loc['cpuidle.steps.cpu_idle_state', 'cache_hits'], 1)
+
+    def test_error(self):
+        """Test that errors raised by getters are propagated"""
+        analyzer = TraceAnalyzer(self.make_ftrace(TEST_DATA.replace('cpu_idle', 'x')))
+        with self.assertRaises(MissingTraceEventsError):
+            analyzer.compute(['cpuidle.stats.cpu_time'], max_workers=2)
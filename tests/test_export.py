@@ -0,0 +1,128 @@
+# SPDX-License-Identifier: Apache-2.0
+#
+# Copyright (C) 2017, ARM Limited and contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+from unittest import skipIf
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+import pandas as pd
+
+from test_base import MillhouseTestBase
+
+from millhouse import GetterSpec
+from millhouse.export import COLUMNS, ResultWriter, read_results
+from millhouse.trace_analyzer import TraceAnalyzer
+
+TEST_DATA = """
+          <idle>-0     [000]   100.000000: cpu_idle:             state=4294967295 cpu_id=0
+          <idle>-0     [001]   100.000000: cpu_frequency:        state=1000 cpu_id=0
+          <idle>-0     [001]   100.000000: cpu_frequency:        state=1000 cpu_id=1
+          <idle>-0     [000]   200.000000: cpu_idle:             state=0 cpu_id=0
+kworker/5:1-28858 [000]  200.000000: thermal_temperature:  thermal_zone=cls0 id=0 temp_prev=10000 temp=20000
+          <idle>-0     [001]   300.000000: cpu_frequency:        state=2000 cpu_id=0
+          <idle>-0     [001]   300.000000: cpu_frequency:        state=2000 cpu_id=1
+kworker/5:1-28858 [000]  400.000000: thermal_temperature:  thermal_zone=cls0 id=0 temp_prev=20000 temp=30000
+"""
+
+GETTERS = ['cpuidle.stats.cpu_time', 'thermal.stats.avg_temperature',
+           GetterSpec('cpufreq.stats.frequency_residency', [0, 1])]
+
+@skipIf(pyarrow is None, 'pyarrow not installed')
+class TestExport(MillhouseTestBase):
+    def _check_export(self, **kwargs):
+        out_dir = os.path.join(self.test_dir, 'results')
+        analyzer = TraceAnalyzer(self.make_ftrace(TEST_DATA),
+                                 cpufreq_domains=[[0, 1]])
+        analyzer.export(out_dir, GETTERS, trace_id='t0', **kwargs)
+
+        self.assertEqual(sorted(os.listdir(out_dir)),
+                         ['cpufreq.stats.frequency_residency',
+                          'cpuidle.stats.cpu_time',
+                          'thermal.stats.avg_temperature'])
+
+        df = read_results(out_dir)
+        self.assertEqual(df.columns.tolist(), [name for name, _ in COLUMNS])
+        self.assertEqual(df['trace'].unique().tolist(), ['t0'])
+        self.assertEqual(df['window_start'].unique().tolist(), [100])
+        self.assertEqual(df['window_end'].unique().tolist(), [400])
+
+        cpu_time = df[df['getter'] == 'cpuidle.stats.cpu_time']
+        self.assertEqual(cpu_time['module'].unique().tolist(), ['cpuidle'])
+        self.assertEqual(cpu_time['args'].unique().tolist(), [''])
+        exp = analyzer.cpuidle.stats.cpu_time()
+        self.assertEqual(cpu_time['index'].tolist(),
+                         [str(i) for i in exp.index])
+        self.assertEqual(cpu_time['column'].unique().tolist(), ['active_time'])
+        self.assertEqual(cpu_time['value'].tolist(),
+                         exp['active_time'].tolist())
+
+        residency = df[df['getter'] == 'cpufreq.stats.frequency_residency']
+        self.assertEqual(residency['args'].unique().tolist(), ['[0, 1]'])
+        self.assertEqual(residency['index_name'].unique().tolist(),
+                         ['frequency'])
+        exp = analyzer.cpufreq.stats.frequency_residency([0, 1])
+        self.assertEqual(len(residency), exp.size)
+        total = residency[residency['column'] == 'total']
+        self.assertEqual(total['value'].tolist(), exp['total'].tolist())
+
+    def test_parquet(self):
+        """Test exporting results to Parquet files"""
+        self._check_export()
+
+    def test_ipc(self):
+        """Test exporting results to Arrow IPC files"""
+        self._check_export(format='ipc')
+
+    def test_many_traces(self):
+        """Test exporting the results for several traces in batches"""
+        out_dir = os.path.join(self.test_dir, 'results')
+        paths = [self.make_trace_file(TEST_DATA, name=str(i)) for i in range(3)]
+        with ResultWriter(out_dir, batch_rows=2) as writer:
+            for path in paths:
+                analyzer = TraceAnalyzer.from_path(
+                    path, ftrace_kwargs={'normalize_time': False})
+                writer.write(analyzer, ['cpuidle.stats.cpu_time'])
+
+        part_dir = os.path.join(out_dir, 'cpuidle.stats.cpu_time')
+        self.assertEqual(len(os.listdir(part_dir)), 1)
+        part_path = os.path.join(part_dir, os.listdir(part_dir)[0])
+        self.assertEqual(pyarrow.parquet.ParquetFile(part_path).num_row_groups,
+                         3)
+
+        df = read_results(out_dir)
+        self.assertEqual(df['trace'].unique().tolist(), paths)
+
+    def test_non_numeric(self):
+        """Test that results that can't be exported are rejected"""
+        out_dir = os.path.join(self.test_dir, 'results')
+        with ResultWriter(out_dir) as writer:
+            with self.assertRaises(ValueError):
+                writer.write_result(pd.DataFrame({'a': ['x', 'y']}),
+                                    'cpuidle.stats.cpu_time', 't0', (0, 1))
+
+    def test_stray_files(self):
+        """Test that files next to the getter directories are ignored"""
+        out_dir = os.path.join(self.test_dir, 'results')
+        analyzer = TraceAnalyzer(self.make_ftrace(TEST_DATA))
+        analyzer.export(out_dir, ['cpuidle.stats.cpu_time'])
+        with open(os.path.join(out_dir, 'README'), 'w') as f:
+            f.write('results')
+        self.assertEqual(len(read_results(out_dir)), 2)
@@ -59,7 +59,34 @@ class TestCpufreq(MillhouseTestBase):
         df = analyzer.cpufreq.signal.cpu_frequency()
         self.assertEqual(df.columns.tolist(), analyzer.cpus)
 
-    # TODO test cluster coherency check
+    def test_coherency_check(self):
+        ftrace = self.make_ftrace(TEST_TRACE_DATA)
+        analyzer = TraceAnalyzer(ftrace, cpufreq_domains=[[0, 1], [2, 3]])
+        self.assertTrue(analyzer.cpufreq.frequencies_coherent)
+        self.assertTrue(analyzer.cpufreq.event.frequency_incoherency().empty)
+
+    def test_coherency_check_broken(self):
+        ftrace = self.make_ftrace(TEST_TRACE_DATA)
+        analyzer = TraceAnalyzer(ftrace, cpufreq_domains=[[0, 1, 2, 3]])
+        self.assertFalse(analyzer.cpufreq.frequencies_coherent)
+
+        df = analyzer.cpufreq.event.frequency_incoherency()
+        self.assertEqual(df.index.tolist(), [500, 500, 550, 550, 650, 650,
+                                             700, 700, 900, 900])
+        self.assertEqual(df['cpu'].tolist(), [2, 3] * 5)
+        self.assertEqual(df['frequency'].tolist()[2:4], [210000, 210000])
+        self.assertEqual(df['expected_frequency'].tolist()[2:4],
+                         [200000, 200000])
+
+        with self.assertRaises(ValueError):
+            analyzer.cpufreq.stats.frequency_residency([0, 1])
+
+    def test_coherency_check_deferred(self):
+        ftrace = self.make_ftrace(TEST_TRACE_DATA)
+        analyzer = TraceAnalyzer(ftrace, cpufreq_domains=[[0, 1, 2, 3]],
+                                 defer_coherency_check=True)
+        self.assertEqual(analyzer.cache.misses, 0)
+        self.assertFalse(analyzer.cpufreq.frequencies_coherent)
 
     def test_freq_residency(self):
         ftrace = self.make_ftrace(TEST_TRACE_DATA)
@@ -93,3 +120,58 @@ class TestCpufreq(MillhouseTestBase):
         self.assertEqual(df1[ 'total'][400000], 50)
         self.assertEqual(df2['active'][410000], 50)
         self.assertEqual(df2[ 'total'][410000], 50)
+
+    def test_freq_residency_many_groups(self):
+        ftrace = self.make_ftrace(TEST_TRACE_DATA)
+        analyzer = TraceAnalyzer(ftrace,
+                                 cpufreq_domains=[[0, 1], [2, 3]])
+
+        df = analyzer.cpufreq.stats.frequency_residency([[0, 1], [2, 3]])
+        df1 = analyzer.cpufreq.stats.frequency_residency([0, 1])
+        df2 = analyzer.cpufreq.stats.frequency_residency([2, 3])
+
+        self.assertEqual(df.index.names, ['core_group', 'frequency'])
+        self.assertTrue(df.loc[0].equals(df1))
+        self.assertTrue(df.loc[1].equals(df2))
+
+    def test_devlib_injection(self):
+        """Test that devlib's events are only merged where they don't overlap"""
+        ftrace = self.make_ftrace("""
+          <idle>-0     [000]   100.000000: cpu_idle:             state=0 cpu_id=0
+          <idle>-0     [003]   400.000000: cpu_frequency:             state=310000 cpu_id=2
+          <idle>-0     [003]   400.000000: cpu_frequency:             state=310000 cpu_id=3
+          <idle>-0     [003]   500.000000: cpu_frequency_devlib:      state=100000 cpu_id=0
+          <idle>-0     [003]   500.000000: cpu_frequency_devlib:      state=100000 cpu_id=1
+          <idle>-0     [001]   500.000000: cpu_frequency_devlib:      state=110000 cpu_id=2
+          <idle>-0     [002]   500.000000: cpu_frequency_devlib:      state=110000 cpu_id=3
+          <idle>-0     [001]   550.000000: cpu_frequency:             state=200000 cpu_id=0
+          <idle>-0     [002]   550.000000: cpu_frequency:             state=200000 cpu_id=1
+          <idle>-0     [003]   580.000000: cpu_frequency_devlib:      state=120000 cpu_id=0
+          <idle>-0     [003]   580.000000: cpu_frequency_devlib:      state=120000 cpu_id=1
+          <idle>-0     [001]   580.000000: cpu_frequency_devlib:      state=130000 cpu_id=2
+          <idle>-0     [002]   580.000000: cpu_frequency_devlib:      state=130000 cpu_id=3
+          <idle>-0     [003]   600.000000: cpu_frequency:             state=410000 cpu_id=2
+          <idle>-0     [003]   600.000000: cpu_frequency:             state=410000 cpu_id=3
+""")
+        os_freq = ftrace.cpu_frequency.data_frame
+        devlib_columns = ftrace.cpu_frequency_devlib.data_frame.columns.tolist()
+
+        for _ in range(2):
+            analyzer = TraceAnalyzer(ftrace, cpufreq_domains=[[0, 1], [2, 3]])
+            df = analyzer.get_trace_event('cpu_frequency')
+
+            # Domain [0, 1] gets both the initial and final devlib events, as
+            # its only OS events are in between. Domain [2, 3] gets neither.
+            self.assertEqual(df.index.tolist(),
+                             [400, 400, 500, 500, 550, 550, 580, 580, 600, 600])
+            self.assertEqual(df['cpu'].tolist(),
+                             [2, 3, 0, 1, 0, 1, 0, 1, 2, 3])
+            self.assertEqual(df['frequency'].tolist()[4:8],
+                             [200000, 200000, 120000, 120000])
+
+            # The FTrace is left alone, so it can be analyzed again
+            self.assertIs(ftrace.cpu_frequency.data_frame, os_freq)
+            self.assertEqual(len(os_freq), 6)
+            self.assertEqual(
+                ftrace.cpu_frequency_devlib.data_frame.columns.tolist(),
+                devlib_columns)
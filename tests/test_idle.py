@@ -19,6 +19,8 @@ import numpy as np
 
 from test_base import MillhouseTestBase
 
+from trappy.stats.Topology import Topology
+
 from millhouse.trace_analyzer import TraceAnalyzer
 from millhouse.utils import drop_consecutive_duplicates as drop_dupes
 
@@ -45,6 +47,31 @@ class TestIdle(MillhouseTestBase):
         self.assertListEqual(df.index.tolist(), exp_index)
         self.assertListEqual(df['cpu'].tolist(), exp_cpus)
 
+        self.assertTrue(df['idle_state'].drop(519.022641).isnull().all())
+        self.assertEqual(df.loc[519.022641, 'idle_state'], 0)
+        self.assertAlmostEqual(df.loc[519.022641, 'idle_duration'], 0.000494)
+
+    def test_cpu_wakeups_idle_duration(self):
+        ftrace = self.make_ftrace("""
+          <idle>-0     [000]   100.000000: cpu_idle:             state=0 cpu_id=0
+          <idle>-0     [001]   100.000000: cpu_idle:             state=4294967295 cpu_id=1
+          <idle>-0     [000]   110.000000: cpu_idle:             state=2 cpu_id=0
+          <idle>-0     [000]   130.000000: cpu_idle:             state=4294967295 cpu_id=0
+          <idle>-0     [001]   140.000000: cpu_idle:             state=1 cpu_id=1
+          <idle>-0     [001]   150.000000: cpu_idle:             state=4294967295 cpu_id=1
+          <idle>-0     [001]   150.000000: cpu_idle:             state=4294967295 cpu_id=1
+          <idle>-0     [000]   200.000000: cpu_idle:             state=1 cpu_id=0
+          <idle>-0     [000]   205.000000: cpu_idle:             state=4294967295 cpu_id=0
+        """)
+
+        analyzer = TraceAnalyzer(ftrace, window=(120, 300))
+        df = analyzer.cpuidle.event.cpu_wakeup()
+
+        self.assertListEqual(df.index.tolist(), [130, 150, 205])
+        self.assertListEqual(df['cpu'].tolist(), [0, 1, 0])
+        self.assertListEqual(df['idle_state'].tolist(), [2, 1, 1])
+        self.assertListEqual(df['idle_duration'].tolist(), [30, 10, 5])
+
     def test_cluster_active(self):
         ftrace = self.make_ftrace("""
           <idle>-0     [000]   519.021928: cpu_idle:             state=4294967295 cpu_id=0
@@ -114,3 +141,79 @@ class TestIdle(MillhouseTestBase):
         self.assertEqual(df['active_time'][2], 500)
         self.assertEqual(df['active_time'][3], 500)
         self.assertEqual(df['active_time'][4], 500)
+
+    def test_idle_state_residency(self):
+        ftrace = self.make_ftrace("""
+          <idle>-0     [000]   100.000000: cpu_idle:             state=0 cpu_id=0
+          <idle>-0     [001]   100.000000: cpu_idle:             state=4294967295 cpu_id=1
+          <idle>-0     [000]   110.000000: cpu_idle:             state=2 cpu_id=0
+          <idle>-0     [000]   130.000000: cpu_idle:             state=4294967295 cpu_id=0
+          <idle>-0     [001]   140.000000: cpu_idle:             state=1 cpu_id=1
+          <idle>-0     [001]   150.000000: cpu_idle:             state=4294967295 cpu_id=1
+          <idle>-0     [000]   200.000000: cpu_idle:             state=1 cpu_id=0
+        """)
+
+        analyzer = TraceAnalyzer(ftrace, window=(105, 200), cpus=[0, 1, 2])
+        df = analyzer.cpuidle.stats.idle_state_residency()
+
+        self.assertListEqual(df.index.tolist(), [0, 1, 2])
+        self.assertListEqual(df.columns.tolist(), [-1, 0, 1, 2])
+        self.assertListEqual(df.loc[0].tolist(), [70, 5, 0, 20])
+        self.assertListEqual(df.loc[1].tolist(), [85, 0, 10, 0])
+        self.assertListEqual(df.loc[2].tolist(), [0, 0, 0, 0])
+
+    def test_idle_state_transitions(self):
+        ftrace = self.make_ftrace("""
+          <idle>-0     [000]   100.000000: cpu_idle:             state=0 cpu_id=0
+          <idle>-0     [001]   100.000000: cpu_idle:             state=4294967295 cpu_id=1
+          <idle>-0     [000]   110.000000: cpu_idle:             state=2 cpu_id=0
+          <idle>-0     [000]   130.000000: cpu_idle:             state=4294967295 cpu_id=0
+          <idle>-0     [001]   140.000000: cpu_idle:             state=1 cpu_id=1
+          <idle>-0     [001]   150.000000: cpu_idle:             state=4294967295 cpu_id=1
+          <idle>-0     [001]   160.000000: cpu_idle:             state=4294967295 cpu_id=1
+          <idle>-0     [000]   200.000000: cpu_idle:             state=1 cpu_id=0
+        """)
+
+        analyzer = TraceAnalyzer(ftrace, window=(105, 200))
+        df = analyzer.cpuidle.stats.idle_state_transitions()
+        self.assertListEqual(df.index.tolist(), [-1, 0, 1, 2])
+        self.assertListEqual(df.columns.tolist(), [-1, 0, 1, 2])
+        self.assertListEqual(df.values.tolist(), [[0, 0, 2, 0],
+                                                  [0, 0, 0, 1],
+                                                  [1, 0, 0, 0],
+                                                  [1, 0, 0, 0]])
+
+        df = analyzer.cpuidle.stats.idle_state_transitions(cpus=[1])
+        self.assertEqual(df.values.sum(), 2)
+        self.assertEqual(df.loc[-1, 1], 1)
+        self.assertEqual(df.loc[1, -1], 1)
+
+    def test_clusters_active(self):
+        ftrace = self.make_ftrace("""
+          <idle>-0     [000]   100.000000: cpu_idle:             state=4294967295 cpu_id=0
+          <idle>-0     [002]   110.000000: cpu_idle:             state=0 cpu_id=2
+          <idle>-0     [001]   120.000000: cpu_idle:             state=4294967295 cpu_id=1
+          <idle>-0     [000]   130.000000: cpu_idle:             state=0 cpu_id=0
+          <idle>-0     [003]   140.000000: cpu_idle:             state=4294967295 cpu_id=3
+          <idle>-0     [001]   150.000000: cpu_idle:             state=0 cpu_id=1
+        """)
+
+        topology = Topology(clusters=[[0, 1], [2, 3]])
+        analyzer = TraceAnalyzer(ftrace, topology=topology,
+                                 cpufreq_domains=[[0, 1], [0, 1, 2, 3]])
+        self.assertEqual(analyzer.cpuidle.clusters,
+                         [[0, 1], [2, 3], [0, 1, 2, 3]])
+
+        df = analyzer.cpuidle.signal.clusters_active()
+        self.assertListEqual(df.columns.tolist(), [0, 1, 2])
+        self.assertListEqual(df.index.tolist(),
+                             [100, 110, 120, 130, 140, 150])
+        self.assertListEqual(df[0].tolist(), [1, 1, 1, 1, 1, 0])
+        self.assertTrue(np.isnan(df[1].iloc[0]))
+        self.assertListEqual(df[1].tolist()[1:], [0, 0, 0, 1, 1])
+        self.assertListEqual(df[2].tolist(), [1, 1, 1, 1, 1, 1])
+
+        for i, cluster in enumerate(analyzer.cpuidle.clusters):
+            exp = analyzer.cpuidle.signal.cluster_active(cluster)['active']
+            self.assertListEqual(df[i].fillna(-1).tolist(),
+                                 exp.fillna(-1).tolist())
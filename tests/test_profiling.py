@@ -0,0 +1,82 @@
+# SPDX-License-Identifier: Apache-2.0
+#
+# Copyright (C) 2017, ARM Limited and contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from test_base import MillhouseTestBase
+
+from millhouse.trace_analyzer import TraceAnalyzer
+
+TEST_DATA = """
+          <idle>-0     [000]   100.000000: cpu_idle:             state=4294967295 cpu_id=0
+          <idle>-0     [001]   100.000000: cpu_frequency:        state=1000 cpu_id=0
+          <idle>-0     [001]   100.000000: cpu_frequency:        state=1000 cpu_id=1
+          <idle>-0     [001]   120.000000: cpu_idle:             state=4294967295 cpu_id=1
+          <idle>-0     [000]   200.000000: cpu_idle:             state=0 cpu_id=0
+          <idle>-0     [001]   250.000000: cpu_frequency:        state=2000 cpu_id=0
+          <idle>-0     [001]   250.000000: cpu_frequency:        state=2000 cpu_id=1
+          <idle>-0     [001]   300.000000: cpu_idle:             state=1 cpu_id=1
+"""
+
+class TestProfiling(MillhouseTestBase):
+    def test_spans(self):
+        """Test that nested getter calls are recorded as nested spans"""
+        analyzer = TraceAnalyzer(self.make_ftrace(TEST_DATA), profile=True,
+                                 cpufreq_domains=[[0, 1]])
+        analyzer.profiler.reset()
+        analyzer.cpuidle.signal.cluster_active([0, 1])
+
+        spans = analyzer.profiler.spans()
+        self.assertEqual(spans['name'].tolist(), [
+            'cpuidle.signal.cluster_active',
+            'cpuidle.signal.clusters_active',
+            'cpuidle.signal.cpu_active',
+            'cpuidle.signal.cpu_idle_state',
+            'cpuidle.steps.cpu_idle_state',
+        ])
+        self.assertEqual(spans['parent'].tolist()[1:], spans.index.tolist()[:-1])
+        self.assertFalse(spans['cache_hit'].any())
+        self.assertEqual(spans['args'].iloc[0], ([0, 1],))
+
+        # The steps are built from the 4 cpu_idle events, and converted to a
+        # signal with a column for each of the 2 CPUs
+        steps = spans.iloc[-1]
+        self.assertEqual(steps['input_rows'], 4)
+        self.assertEqual(steps['output_rows'], 4)
+        self.assertEqual(steps['output_columns'], 2)
+        self.assertGreater(steps['nbytes'], 0)
+        self.assertEqual(spans.iloc[-2]['input_rows'], 4)
+        self.assertEqual(spans.iloc[-2]['output_columns'], 2)
+
+        self.assertTrue((spans['duration'] >= spans['self_duration']).all())
+
+    def test_stats(self):
+        """Test the summary of the getter calls"""
+        analyzer = TraceAnalyzer(self.make_ftrace(TEST_DATA), profile=True,
+                                 cpufreq_domains=[[0, 1]])
+        analyzer.cpuidle.signal.cpu_active()
+        analyzer.cpuidle.signal.cpu_active()
+
+        df = analyzer.profile()
+        self.assertEqual(df.loc['cpuidle.signal.cpu_active', 'calls'], 2)
+        self.assertEqual(df.loc['cpuidle.signal.cpu_active', 'cache_hits'], 1)
+        self.assertEqual(df.loc['cpuidle.steps.cpu_idle_state', 'calls'], 1)
+
+    def test_disabled(self):
+        """Test that profiling is off by default"""
+        analyzer = TraceAnalyzer(self.make_ftrace(TEST_DATA))
+        self.assertIsNone(analyzer.profiler)
+        with self.assertRaises(ValueError):
+            analyzer.profile()
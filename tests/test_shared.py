@@ -0,0 +1,114 @@
+# SPDX-License-Identifier: Apache-2.0
+#
+# Copyright (C) 2017, ARM Limited and contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import multiprocessing
+import os
+
+import pandas as pd
+
+from test_base import MillhouseTestBase
+
+from millhouse.trace_analyzer import TraceAnalyzer
+
+TEST_DATA = """
+          <idle>-0     [000]   100.000000: cpu_idle:             state=4294967295 cpu_id=0
+          <idle>-0     [001]   100.000000: cpu_frequency:        state=1000 cpu_id=0
+          <idle>-0     [001]   100.000000: cpu_frequency:        state=1000 cpu_id=1
+          <idle>-0     [000]   200.000000: cpu_idle:             state=0 cpu_id=0
+kworker/5:1-28858 [000]  200.000000: thermal_temperature:  thermal_zone=cls0 id=0 temp_prev=10000 temp=20000
+          <idle>-0     [001]   300.000000: cpu_frequency:        state=2000 cpu_id=0
+          <idle>-0     [001]   300.000000: cpu_frequency:        state=2000 cpu_id=1
+kworker/5:1-28858 [000]  400.000000: thermal_temperature:  thermal_zone=cls0 id=0 temp_prev=20000 temp=30000
+          <idle>-0     [001]   450.000000: cpu_idle:             state=4294967295 cpu_id=1
+          <idle>-0     [003]   500.000000: cpu_frequency_devlib:      state=3000 cpu_id=0
+          <idle>-0     [003]   500.000000: cpu_frequency_devlib:      state=3000 cpu_id=1
+"""
+
+def compute_results(analyzer):
+    return [analyzer.cpuidle.stats.cpu_time(),
+            analyzer.cpufreq.stats.frequency_residency([0, 1]),
+            analyzer.thermal.stats.temperature_stats()]
+
+def attach_and_compute(descriptor):
+    return compute_results(TraceAnalyzer.attach(descriptor))
+
+class TestShared(MillhouseTestBase):
+    def setUp(self):
+        super(TestShared, self).setUp()
+        self.analyzer = TraceAnalyzer(self.make_ftrace(TEST_DATA),
+                                      cpufreq_domains=[[0, 1]])
+
+    def _check_results(self, results):
+        for df, exp in zip(results, compute_results(self.analyzer)):
+            pd.testing.assert_frame_equal(df, exp)
+
+    def test_attach(self):
+        """Test that an attached analyzer gives the same results"""
+        with self.analyzer.share() as shared:
+            analyzer = TraceAnalyzer.attach(shared.descriptor)
+            self.assertEqual(analyzer.window, self.analyzer.window)
+            self.assertEqual(analyzer.cpus, list(self.analyzer.cpus))
+            self._check_results(compute_results(analyzer))
+
+            # devlib's events were merged before the tables were shared
+            self.assertEqual(sorted(analyzer.available_events),
+                             ['cpu_frequency', 'cpu_idle', 'thermal'])
+            pd.testing.assert_frame_equal(
+                analyzer.get_event_table('cpu_frequency'),
+                self.analyzer.get_event_table('cpu_frequency'))
+
+            table = analyzer.get_event_table('cpu_idle')
+            self.assertFalse(table['state'].values.flags.writeable)
+            steps = analyzer.cpuidle.steps.cpu_idle_state()
+            self.assertFalse(steps.times.flags.writeable)
+
+            view = analyzer._window_view((150, 350))
+            exp = self.analyzer._window_view((150, 350))
+            pd.testing.assert_frame_equal(view.cpuidle.stats.cpu_time(),
+                                          exp.cpuidle.stats.cpu_time())
+
+    def test_processes(self):
+        """Test attaching analyzers in other processes"""
+        with self.analyzer.share() as shared:
+            pool = multiprocessing.Pool(2)
+            try:
+                all_results = pool.map(attach_and_compute,
+                                       [shared.descriptor] * 2)
+            finally:
+                pool.close()
+                pool.join()
+
+        for results in all_results:
+            self._check_results(results)
+
+    def test_fixed_config(self):
+        with self.analyzer.share() as shared:
+            with self.assertRaises(ValueError):
+                TraceAnalyzer.attach(shared.descriptor,
+                                     cpufreq_domains=[[0], [1]])
+
+    def test_unlink(self):
+        """Test that unlink deletes the file, but not attached analyzers' data"""
+        shared = self.analyzer.share(directory=self.test_dir)
+        analyzer = TraceAnalyzer.attach(shared.descriptor)
+        self.assertEqual(os.path.dirname(shared.path), self.test_dir)
+
+        shared.unlink()
+        self.assertFalse(os.path.exists(shared.path))
+        with self.assertRaises(OSError):
+            TraceAnalyzer.attach(shared.descriptor)
+        self._check_results(compute_results(analyzer))
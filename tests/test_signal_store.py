@@ -0,0 +1,91 @@
+# SPDX-License-Identifier: Apache-2.0
+#
+# Copyright (C) 2017, ARM Limited and contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+from unittest import skipIf
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+from trappy import FTrace
+
+from test_base import FTRACE_KWARGS, MillhouseTestBase
+
+from millhouse.trace_analyzer import TraceAnalyzer
+
+TEST_DATA = """
+          <idle>-0     [000]   100.000000: cpu_idle:             state=4294967295 cpu_id=0
+          <idle>-0     [001]   100.000000: cpu_frequency:        state=1000 cpu_id=0
+          <idle>-0     [000]   200.000000: cpu_idle:             state=0 cpu_id=0
+kworker/5:1-28858 [000]  200.000000: thermal_temperature:  thermal_zone=cls0 id=0 temp_prev=10000 temp=20000
+          <idle>-0     [001]   300.000000: cpu_frequency:        state=2000 cpu_id=0
+kworker/5:1-28858 [000]  300.000000: thermal_temperature:  thermal_zone=cls0 id=0 temp_prev=20000 temp=30000
+"""
+
+@skipIf(pyarrow is None, 'pyarrow not installed')
+class TestSignalStore(MillhouseTestBase):
+    def test_round_trip(self):
+        """Test signals are loaded from the cache_dir by later analyzers"""
+        cache_dir = os.path.join(self.test_dir, 'cache')
+        ftrace = self.make_ftrace(TEST_DATA)
+
+        analyzer = TraceAnalyzer(ftrace, cache_dir=cache_dir)
+        exp_idle = analyzer.cpuidle.signal.cpu_idle_state()
+        exp_freq = analyzer.cpufreq.signal.cpu_frequency()
+        exp_temp = analyzer.thermal.signal.temperature()
+        analyzer.thermal.steps.temperature()
+
+        store = analyzer.signal_store
+        self.assertEqual(len(os.listdir(store.path)), 3)
+
+        analyzer = TraceAnalyzer(ftrace, cache_dir=cache_dir)
+        self.assertTrue(analyzer.cpuidle.signal.cpu_idle_state().equals(exp_idle))
+        self.assertTrue(analyzer.cpufreq.signal.cpu_frequency().equals(exp_freq))
+        self.assertTrue(analyzer.thermal.signal.temperature().equals(exp_temp))
+
+        steps = store.load('temperature')
+        self.assertEqual(steps.keys.tolist(), ['cls0'])
+        self.assertEqual(steps.values.tolist(), [20000, 30000])
+
+    def test_params(self):
+        """Test signals stored for different analyzer parameters are distinct"""
+        cache_dir = os.path.join(self.test_dir, 'cache')
+        ftrace = self.make_ftrace(TEST_DATA)
+
+        TraceAnalyzer(ftrace, cache_dir=cache_dir).cpufreq.steps.cpu_frequency()
+        analyzer = TraceAnalyzer(ftrace, cache_dir=cache_dir,
+                                 cpufreq_domains=[[0]])
+        self.assertIsNone(analyzer.signal_store.load('cpu_frequency', [[0]]))
+        analyzer.cpufreq.steps.cpu_frequency()
+        self.assertIsNotNone(analyzer.signal_store.load('cpu_frequency', [[0]]))
+
+    def test_parse(self):
+        """Test signals from different parses of a trace are distinct"""
+        cache_dir = os.path.join(self.test_dir, 'cache')
+        path = self.make_trace_file(TEST_DATA)
+
+        analyzer = TraceAnalyzer(FTrace(path, **FTRACE_KWARGS),
+                                 cache_dir=cache_dir)
+        self.assertEqual(len(analyzer.cpuidle.steps.cpu_idle_state().times), 2)
+
+        ftrace = FTrace(path, abs_window=(150, None), **FTRACE_KWARGS)
+        analyzer = TraceAnalyzer(ftrace, cache_dir=cache_dir)
+        self.assertIsNone(analyzer.signal_store.load('cpu_idle_state'))
+        self.assertEqual(len(analyzer.cpuidle.steps.cpu_idle_state().times), 1)
+        self.assertEqual(len(os.listdir(cache_dir)), 2)
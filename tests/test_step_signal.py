@@ -0,0 +1,106 @@
+# SPDX-License-Identifier: Apache-2.0
+#
+# Copyright (C) 2017, ARM Limited and contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import numpy as np
+import pandas as pd
+
+from test_base import MillhouseTestBase
+
+from millhouse.step_signal import StepSignal
+from millhouse.trace_analyzer import TraceAnalyzer
+
+TEST_DATA = """
+          <idle>-0     [000]   100.000000: cpu_idle:             state=4294967295 cpu_id=0
+          <idle>-0     [002]   150.000000: cpu_idle:             state=4294967295 cpu_id=2
+          <idle>-0     [000]   200.000000: cpu_idle:             state=1 cpu_id=0
+          <idle>-0     [002]   200.000000: cpu_idle:             state=0 cpu_id=2
+          <idle>-0     [002]   200.000000: cpu_idle:             state=2 cpu_id=2
+          <idle>-0     [000]   300.000000: cpu_idle:             state=4294967295 cpu_id=0
+"""
+
+class TestStepSignal(MillhouseTestBase):
+    def test_from_events(self):
+        """Test building a StepSignal from TRAPpy events"""
+        analyzer = TraceAnalyzer(self.make_ftrace(TEST_DATA))
+        steps = analyzer.cpuidle.steps.cpu_idle_state()
+
+        self.assertEqual(steps.keys.tolist(), [0, 2])
+        self.assertEqual(steps.values.dtype, np.int8)
+
+        times, values = steps.get(0)
+        self.assertEqual(times.tolist(), [100, 200, 300])
+        self.assertEqual(values.tolist(), [-1, 1, -1])
+
+        # Of the two events at the same time, the later one wins
+        times, values = steps.get(2)
+        self.assertEqual(times.tolist(), [150, 200])
+        self.assertEqual(values.tolist(), [-1, 2])
+
+    def test_line_order(self):
+        """Test that __line, rather than row order, decides which event wins"""
+        steps = StepSignal.from_events(
+            pd.DataFrame({'__line': [1, 0], 'cpu': [0, 0], 'frequency': [10, 20]},
+                         index=pd.Index([1., 1.], name='Time')),
+            'cpu', 'frequency')
+        self.assertEqual(steps.get(0)[1].tolist(), [10])
+
+    def test_to_frame(self):
+        """Test conversion to a wide signal DataFrame"""
+        analyzer = TraceAnalyzer(self.make_ftrace(TEST_DATA))
+        steps = analyzer.cpuidle.steps.cpu_idle_state()
+
+        df = steps.to_frame(window=(120, 250), columns=[0, 1, 2])
+        self.assertEqual(df.columns.tolist(), [0, 1, 2])
+        self.assertEqual(df.index.tolist(), [120, 150, 200, 250])
+        self.assertEqual(df[0].tolist(), [-1, -1, 1, 1])
+        self.assertTrue(df[1].isnull().all())
+        self.assertTrue(np.isnan(df[2].iloc[0]))
+        self.assertEqual(df[2].tolist()[1:], [-1, 2, 2])
+
+    def test_empty_window(self):
+        """Test a window containing no events"""
+        steps = StepSignal.from_events(
+            pd.DataFrame({'cpu': [0], 'frequency': [1000]},
+                         index=pd.Index([10.], name='Time')),
+            'cpu', 'frequency')
+
+        df = steps.to_frame(window=(20, 30))
+        self.assertEqual(df.index.tolist(), [20, 30])
+        self.assertEqual(df[0].tolist(), [1000, 1000])
+
+    def test_durations(self):
+        """Test getting how long each value was held"""
+        analyzer = TraceAnalyzer(self.make_ftrace(TEST_DATA))
+        steps = analyzer.cpuidle.steps.cpu_idle_state()
+
+        # CPU 0 at 100, 200, 300 then CPU 2 at 150, 200
+        self.assertEqual(steps.durations().tolist(), [100, 100, 0, 50, 100])
+        self.assertEqual(steps.durations((120, 250)).tolist(),
+                         [80, 50, 0, 50, 50])
+
+    def test_linear_segments(self):
+        """Test interpolating linearly between change points"""
+        steps = StepSignal.from_arrays('zone', [0, 10, 20, 5],
+                                       ['a', 'a', 'a', 'b'], [0, 100, 50, 7])
+
+        durations, lo, hi = steps.linear_segments((5, 30))
+        self.assertEqual(durations.tolist(), [5, 10, 10, 25])
+        self.assertEqual(lo.tolist(), [50, 100, 50, 7])
+        self.assertEqual(hi.tolist(), [100, 50, 50, 7])
+
+        durations, lo, hi = steps.linear_segments((5, 30), hold_last=False)
+        self.assertEqual(durations.tolist(), [5, 10, 0, 0])
@@ -0,0 +1,115 @@
+# SPDX-License-Identifier: Apache-2.0
+#
+# Copyright (C) 2017, ARM Limited and contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import numpy as np
+
+from test_base import MillhouseTestBase
+
+from millhouse.streaming import StreamingTraceAnalyzer, read_chunks
+from millhouse.trace_analyzer import TraceAnalyzer
+
+TEST_DATA = """
+          <idle>-0     [000]   100.000000: cpu_idle:             state=4294967295 cpu_id=0
+          <idle>-0     [001]   100.000000: cpu_frequency:        state=1000 cpu_id=0
+          <idle>-0     [001]   100.000000: cpu_frequency:        state=1000 cpu_id=1
+          <idle>-0     [001]   120.000000: cpu_idle:             state=4294967295 cpu_id=1
+kworker/5:1-28858 [000]  150.000000: thermal_temperature:  thermal_zone=cls0 id=0 temp_prev=10000 temp=20000
+          <idle>-0     [000]   200.000000: cpu_idle:             state=0 cpu_id=0
+          <idle>-0     [001]   250.000000: cpu_frequency:        state=2000 cpu_id=0
+          <idle>-0     [001]   250.000000: cpu_frequency:        state=2000 cpu_id=1
+kworker/5:1-28858 [000]  260.000000: thermal_temperature:  thermal_zone=cls1 id=0 temp_prev=10000 temp=40000
+          <idle>-0     [001]   300.000000: cpu_idle:             state=1 cpu_id=1
+kworker/5:1-28858 [000]  320.000000: thermal_temperature:  thermal_zone=cls0 id=0 temp_prev=20000 temp=30000
+          <idle>-0     [000]   400.000000: cpu_idle:             state=4294967295 cpu_id=0
+          <idle>-0     [001]   450.000000: cpu_frequency:        state=3000 cpu_id=0
+          <idle>-0     [001]   450.000000: cpu_frequency:        state=3000 cpu_id=1
+kworker/5:1-28858 [000]  480.000000: thermal_temperature:  thermal_zone=cls1 id=0 temp_prev=40000 temp=50000
+          <idle>-0     [001]   500.000000: cpu_idle:             state=4294967295 cpu_id=1
+"""
+
+EVENTS = ['cpu_idle', 'cpu_frequency', 'thermal']
+
+class TestStreaming(MillhouseTestBase):
+    def _stream(self, ftrace, boundaries, **kwargs):
+        """Feed the events in ftrace in chunks split at the given times"""
+        streaming = StreamingTraceAnalyzer(**kwargs)
+        bounds = [-np.inf] + boundaries + [np.inf]
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            chunk = {}
+            for event in EVENTS:
+                df = getattr(ftrace, event).data_frame
+                chunk[event] = df[(df.index >= lo) & (df.index < hi)]
+            streaming.update(chunk)
+        return streaming
+
+    def _check(self, window, boundaries, streaming=None):
+        ftrace = self.make_ftrace(TEST_DATA)
+        analyzer = TraceAnalyzer(ftrace, window=window,
+                                 cpufreq_domains=[[0, 1]])
+        if streaming is None:
+            streaming = self._stream(ftrace, boundaries, window=window,
+                                     core_groups=[[0, 1]])
+
+        exp = analyzer.cpuidle.stats.cpu_time()
+        self.assertEqual(streaming.cpu_time()['active_time'].tolist(),
+                         exp['active_time'].tolist())
+
+        exp = analyzer.cpufreq.stats.frequency_residency([0, 1])
+        df = streaming.frequency_residency([0, 1])
+        self.assertEqual(df.index.tolist(), exp.index.tolist())
+        self.assertEqual(df['total'].tolist(), exp['total'].tolist())
+        self.assertEqual(df['active'].tolist(), exp['active'].tolist())
+
+        exp = analyzer.thermal.stats.avg_temperature()
+        df = streaming.avg_temperature()
+        self.assertEqual(df.index.tolist(), exp.index.tolist())
+        np.testing.assert_allclose(df['avg_temperature'].values,
+                                   exp['avg_temperature'].values)
+
+    def test_single_chunk(self):
+        """Test streaming the whole trace at once"""
+        self._check((None, None), [])
+
+    def test_chunks(self):
+        """Test streaming the trace in chunks"""
+        self._check((None, None), [150, 210, 260, 400, 480])
+
+    def test_window(self):
+        """Test streaming with a window"""
+        self._check((130, 420), [120, 200, 300, 310])
+        self._check((270, 700), [120, 200, 300, 310])
+
+    def test_out_of_order(self):
+        """Test that chunks must be delivered in time order"""
+        ftrace = self.make_ftrace(TEST_DATA)
+        streaming = self._stream(ftrace, [300])
+        with self.assertRaises(ValueError):
+            streaming.update({'cpu_idle': ftrace.cpu_idle.data_frame})
+
+    def test_read_chunks(self):
+        """Test reading a trace file in chunks"""
+        path = self.make_trace_file(TEST_DATA)
+        chunks = list(read_chunks(path, chunk_lines=3))
+        self.assertEqual(len(chunks), 6)
+        # Events at the same time are in the same chunk
+        self.assertEqual(chunks[0]['cpu_frequency']['cpu'].tolist(), [0, 1])
+        self.assertEqual(sum(len(c['cpu_idle']) for c in chunks), 6)
+
+        for window in [(None, None), (130, 420)]:
+            streaming = StreamingTraceAnalyzer.from_path(
+                path, chunk_lines=3, window=window, core_groups=[[0, 1]])
+            self._check(window, None, streaming)
@@ -25,6 +25,15 @@ kworker/5:1-28858 [005]  200.000000: thermal_temperature:  thermal_zone=cls0 id=
 kworker/5:1-28858 [005]  300.000000: thermal_temperature:  thermal_zone=cls0 id=0 temp_prev=30000 temp=10000
 """
 
+# cls0 as in TEST_DATA, and cls1 reporting from 200
+TEST_DATA_ZONES="""
+kworker/5:1-28858 [005]  100.000000: thermal_temperature:  thermal_zone=cls0 id=0 temp_prev=10000 temp=20000
+kworker/5:1-28858 [005]  200.000000: thermal_temperature:  thermal_zone=cls0 id=0 temp_prev=20000 temp=30000
+kworker/5:1-28858 [005]  200.000000: thermal_temperature:  thermal_zone=cls1 id=1 temp_prev=30000 temp=40000
+kworker/5:1-28858 [005]  250.000000: thermal_temperature:  thermal_zone=cls1 id=1 temp_prev=40000 temp=50000
+kworker/5:1-28858 [005]  300.000000: thermal_temperature:  thermal_zone=cls0 id=0 temp_prev=30000 temp=10000
+"""
+
 class TestThermal(MillhouseTestBase):
     def test_temp_signal(self):
         ftrace = self.make_ftrace(TEST_DATA)
@@ -35,6 +44,18 @@ class TestThermal(MillhouseTestBase):
         self.assertEqual(df['cls0'].tolist(),
                          [20000, 30000, 10000])
 
+    def test_temp_signal_zones(self):
+        """Test that the signal is only filled at the window bounds"""
+        ftrace = self.make_ftrace(TEST_DATA_ZONES)
+
+        analyzer = TraceAnalyzer(ftrace, window=(150, 275))
+        df = analyzer.thermal.signal.temperature()
+
+        self.assertEqual(df.index.tolist(), [150, 200, 250, 275])
+        self.assertEqual(df['cls0'].fillna(-1).tolist(),
+                         [20000, 30000, -1, 30000])
+        self.assertEqual(df['cls1'].fillna(-1).tolist(),
+                         [-1, 40000, 50000, 50000])
 
     def test_avg_temp(self):
         ftrace = self.make_ftrace(TEST_DATA)
@@ -48,3 +69,41 @@ class TestThermal(MillhouseTestBase):
         df = analyzer.thermal.stats.avg_temperature()
 
         self.assertEqual(df['avg_temperature']['cls0'], exp_avg)
+
+    def test_avg_temp_zones(self):
+        """Test that each zone is averaged from its own first reading"""
+        ftrace = self.make_ftrace(TEST_DATA_ZONES)
+
+        analyzer = TraceAnalyzer(ftrace)
+        df = analyzer.thermal.stats.avg_temperature()
+
+        # cls0 isn't affected by cls1 starting late
+        self.assertEqual(df['avg_temperature']['cls0'], 22500)
+        exp_avg = (50 * 45000. + 50 * 50000) / 100
+        self.assertEqual(df['avg_temperature']['cls1'], exp_avg)
+
+    def test_temp_stats(self):
+        ftrace = self.make_ftrace(TEST_DATA_ZONES)
+
+        analyzer = TraceAnalyzer(ftrace)
+        df = analyzer.thermal.stats.temperature_stats(percentiles=(50, 99))
+
+        self.assertEqual(df.columns.tolist(),
+                         ['avg_temperature', 'min_temperature',
+                          'max_temperature', 'p50_temperature',
+                          'p99_temperature'])
+        self.assertEqual(df.loc['cls0'].tolist(),
+                         [22500, 10000, 30000, 20000, 25000])
+        self.assertEqual(df.loc['cls1'].tolist(),
+                         [47500, 40000, 50000, 45000, 50000])
+
+    def test_temp_stats_window(self):
+        """Test that temperatures are interpolated at the window start"""
+        ftrace = self.make_ftrace(TEST_DATA_ZONES)
+
+        analyzer = TraceAnalyzer(ftrace, window=(250, 300))
+        df = analyzer.thermal.stats.temperature_stats()
+
+        self.assertEqual(df['avg_temperature'].tolist(), [15000, 50000])
+        self.assertEqual(df['min_temperature'].tolist(), [10000, 50000])
+        self.assertEqual(df['max_temperature'].tolist(), [20000, 50000])
@@ -0,0 +1,119 @@
+# SPDX-License-Identifier: Apache-2.0
+#
+# Copyright (C) 2017, ARM Limited and contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import numpy as np
+
+from test_base import MillhouseTestBase
+
+from millhouse.trace_analyzer import TraceAnalyzer
+
+TEST_DATA = """
+          <idle>-0     [000]   100.000000: cpu_idle:             state=4294967295 cpu_id=0
+          <idle>-0     [003]   200.000000: cpu_idle:             state=0 cpu_id=3
+kworker/5:1-28858 [005]  100.000000: thermal_temperature:  thermal_zone=cls0 id=0 temp_prev=10000 temp=20000
+kworker/5:1-28858 [005]  300.000000: thermal_temperature:  thermal_zone=cls0 id=0 temp_prev=20000 temp=30000
+"""
+
+class TestTraceAnalyzer(MillhouseTestBase):
+    def test_cpus(self):
+        """Test CPUs are found from the trace events"""
+        analyzer = TraceAnalyzer(self.make_ftrace(TEST_DATA))
+        self.assertEqual(list(analyzer.cpus), [0, 1, 2, 3, 4, 5])
+
+    def test_explicit_cpus(self):
+        """Test CPUs can be provided by the user"""
+        analyzer = TraceAnalyzer(self.make_ftrace(TEST_DATA), cpus=[0, 1])
+        self.assertEqual(list(analyzer.cpus), [0, 1])
+
+    def test_no_events(self):
+        """Test an error is raised for an empty trace"""
+        ftrace = self.make_ftrace('')
+        with self.assertRaises(ValueError):
+            TraceAnalyzer(ftrace)
+
+        analyzer = TraceAnalyzer(ftrace, lazy=True)
+        with self.assertRaises(ValueError):
+            analyzer.available_events
+
+    def test_lazy(self):
+        """Test that lazy analyzers only construct modules that are used"""
+        analyzer = TraceAnalyzer(self.make_ftrace(TEST_DATA), lazy=True)
+        self.assertEqual(analyzer._modules, {})
+        self.assertIsNone(analyzer._cpus)
+
+        df = analyzer.thermal.stats.avg_temperature()
+        self.assertEqual(df['avg_temperature']['cls0'], 25000)
+        self.assertEqual(list(analyzer._modules), ['thermal'])
+        self.assertIsNone(analyzer._cpus)
+
+    def test_event_table(self):
+        """Test that event tables only have the columns the modules use"""
+        analyzer = TraceAnalyzer(self.make_ftrace(TEST_DATA))
+        df = analyzer.get_event_table('cpu_idle')
+
+        self.assertEqual(df.columns.tolist(), ['cpu_id', 'state', '__line'])
+        self.assertEqual(df['cpu_id'].dtype, np.int16)
+        self.assertEqual(df['state'].dtype, np.int8)
+        self.assertEqual(df['state'].tolist(), [-1, 0])
+        self.assertEqual(df.index.tolist(), [100, 200])
+
+        # The table is built once and shared
+        self.assertIs(analyzer.get_event_table('cpu_idle'), df)
+        raw = analyzer.get_trace_event('cpu_idle')
+        self.assertLess(df.memory_usage(deep=True).sum(),
+                        raw.memory_usage(deep=True).sum() / 2)
+
+        df = analyzer.get_event_table('thermal')
+        self.assertEqual(df.columns.tolist(), ['thermal_zone', 'temp', '__line'])
+        self.assertEqual(df['thermal_zone'].dtype.name, 'category')
+
+    def test_event_table_missing(self):
+        """Test the event table of an event that isn't in the trace"""
+        analyzer = TraceAnalyzer(self.make_ftrace(TEST_DATA))
+        df = analyzer.get_event_table('cpu_frequency')
+        self.assertEqual(len(df), 0)
+        self.assertEqual(df['frequency'].dtype, np.uint32)
+
+    def test_required_events(self):
+        """Test finding the events the analysis modules use"""
+        self.assertEqual(TraceAnalyzer.required_events(),
+                         ['cpu_frequency', 'cpu_frequency_devlib', 'cpu_idle',
+                          'thermal'])
+        self.assertEqual(
+            TraceAnalyzer.required_events(['cpufreq.stats.frequency_residency']),
+            TraceAnalyzer.required_events())
+
+    def test_from_path(self):
+        """Test parsing only the events used by the analyses"""
+        data = """
+          <idle>-0     [002]    50.000000: sched_wakeup:         comm=foo pid=1 prio=120 target_cpu=002
+""" + TEST_DATA + """
+          <idle>-0     [002]   250.000000: sched_wakeup:         comm=foo pid=1 prio=120 target_cpu=002
+"""
+        path = self.make_trace_file(data)
+        analyzer = TraceAnalyzer.from_path(path)
+        exp = TraceAnalyzer(self.make_ftrace(data))
+
+        self.assertFalse(hasattr(analyzer.ftrace, 'sched_wakeup'))
+        self.assertEqual(analyzer.ftrace.trace_path, path)
+        self.assertEqual(analyzer.window, exp.window)
+        self.assertEqual(analyzer.window[0], 50)
+        self.assertEqual(sorted(analyzer.available_events),
+                         sorted(exp.available_events))
+        self.assertEqual(
+            analyzer.cpuidle.stats.cpu_time()['active_time'].tolist(),
+            exp.cpuidle.stats.cpu_time()['active_time'].tolist())
@@ -0,0 +1,339 @@
+# SPDX-License-Identifier: Apache-2.0
+#
+# Copyright (C) 2017, ARM Limited and contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import os
+import struct
+
+import numpy as np
+import pandas as pd
+
+from trappy import FTrace
+
+from test_base import FTRACE_KWARGS, MillhouseTestBase
+
+from millhouse.trace_analyzer import TraceAnalyzer
+from millhouse.tracedat import TraceDat
+
+PAGE_SIZE = 4096
+
+COMMON_FIELDS = """
+	field:unsigned short common_type;	offset:0;	size:2;	signed:0;
+	field:unsigned char common_flags;	offset:2;	size:1;	signed:0;
+	field:unsigned char common_preempt_count;	offset:3;	size:1;	signed:0;
+	field:int common_pid;	offset:4;	size:4;	signed:1;
+"""
+
+# (system, name, ID, fields)
+FORMATS = [
+    ('ftrace', 'print', 5, """
+	field:unsigned long ip;	offset:8;	size:8;	signed:0;
+	field:char buf[];	offset:16;	size:0;	signed:0;
+"""),
+    ('power', 'cpu_idle', 10, """
+	field:u32 state;	offset:8;	size:4;	signed:0;
+	field:u32 cpu_id;	offset:12;	size:4;	signed:0;
+"""),
+    ('power', 'cpu_frequency', 11, """
+	field:u32 state;	offset:8;	size:4;	signed:0;
+	field:u32 cpu_id;	offset:12;	size:4;	signed:0;
+"""),
+    ('thermal', 'thermal_temperature', 12, """
+	field:__data_loc char[] thermal_zone;	offset:8;	size:4;	signed:0;
+	field:int id;	offset:12;	size:4;	signed:1;
+	field:int temp_prev;	offset:16;	size:4;	signed:1;
+	field:int temp;	offset:20;	size:4;	signed:1;
+"""),
+    ('sched', 'sched_wakeup', 13, """
+	field:int pid;	offset:8;	size:4;	signed:1;
+	field:int target_cpu;	offset:12;	size:4;	signed:1;
+"""),
+]
+
+HEADER_PAGE = """
+	field: u64 timestamp;	offset:0;	size:8;	signed:0;
+	field: local_t commit;	offset:8;	size:8;	signed:1;
+	field: int overwrite;	offset:8;	size:1;	signed:1;
+	field: char data;	offset:16;	size:4080;	signed:1;
+"""
+
+def format_text(name, event_id, fields):
+    return 'name: {}\nID: {}\nformat:{}\n{}\nprint fmt: ""\n'.format(
+        name, event_id, COMMON_FIELDS, fields)
+
+def make_record(event, pid, fields, endian='<'):
+    """Encode the body of a ring buffer event"""
+    ids = {name: event_id for _, name, event_id, _ in FORMATS}
+    if event == 'cpu_frequency_devlib':
+        text = 'cpu_frequency_devlib: state={} cpu_id={}\n'.format(*fields)
+        body = struct.pack(endian + 'Q', 0) + text.encode('ascii') + b'\x00'
+        event = 'print'
+    elif event == 'thermal_temperature':
+        zone = fields[0].encode('ascii') + b'\x00'
+        body = struct.pack(endian + 'Iiii', (len(zone) << 16) | 24, *fields[1:]) + zone
+    else:
+        body = struct.pack(endian + 'II', *fields)
+    return struct.pack(endian + 'HBBi', ids[event], 0, 0, pid) + body
+
+def write_trace_dat(path, events, n_cpus, endian='<'):
+    """
+    Write a minimal trace-cmd version 6 trace.dat file
+
+    :param events: List of ``(time_ns, cpu, pid, comm, event, fields)``
+    :param endian: ``"<"`` or ``">"``
+    """
+    def pack(fmt, *values):
+        return struct.pack(endian + fmt, *values)
+
+    def section(data, size_fmt='Q'):
+        return pack(size_fmt, len(data)) + data
+
+    out = [b'\x17\x08\x44tracing6\x00',
+           struct.pack('<BB', endian == '>', 8), pack('I', PAGE_SIZE),
+           b'header_page\x00', section(HEADER_PAGE.encode('ascii')),
+           b'header_event\x00', section(b'')]
+
+    systems = []
+    for system, name, event_id, fields in FORMATS:
+        text = format_text(name, event_id, fields).encode('ascii')
+        if system == 'ftrace':
+            out += [pack('I', 1), section(text)]
+        else:
+            systems.append((system, text))
+    out.append(pack('I', len(systems)))
+    for system, text in systems:
+        out += [system.encode('ascii') + b'\x00', pack('I', 1),
+                section(text)]
+
+    comms = sorted(set((pid, comm) for _, _, pid, comm, _, _ in events))
+    cmdlines = ''.join('{} {}\n'.format(pid, comm) for pid, comm in comms)
+    out += [section(b'', 'I'), section(b'', 'I'),
+            section(cmdlines.encode('ascii')), pack('I', n_cpus),
+            b'options  \x00', pack('HI', 3, 4), b'\x00' * 4,
+            pack('H', 0), b'flyrecord\x00']
+
+    pages = [write_pages([e for e in events if e[1] == cpu], endian)
+             for cpu in range(n_cpus)]
+    header = b''.join(out)
+    offset = len(header) + 16 * n_cpus
+    offset += -offset % PAGE_SIZE
+    cpu_table = []
+    for data in pages:
+        cpu_table.append(pack('QQ', offset, len(data)))
+        offset += len(data)
+
+    data = header + b''.join(cpu_table)
+    data += b'\x00' * (-len(data) % PAGE_SIZE) + b''.join(pages)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def write_pages(events, endian='<'):
+    def pack(fmt, *values):
+        return struct.pack(endian + fmt, *values)
+
+    def event_header(type_len, delta):
+        # The {type_len:5, time_delta:27} bitfield
+        if endian == '<':
+            return type_len | (delta << 5)
+        return (type_len << 27) | delta
+
+    pages = []
+    page = None
+    for time, _, pid, _, event, fields in events:
+        record = make_record(event, pid, fields, endian)
+        record += b'\x00' * (-len(record) % 4)
+        # Also use the long form for print events, to test reading it
+        if len(record) <= 28 * 4 and event != 'cpu_frequency_devlib':
+            type_len, length = len(record) // 4, b''
+        else:
+            type_len, length = 0, pack('I', len(record) + 4)
+
+        if page is None or page[2] + 4 + len(length) + len(record) + 8 \
+           > PAGE_SIZE - 16:
+            page = [time, [], 0, time]
+            pages.append(page)
+
+        delta = time - page[3]
+        if delta >= 1 << 27:
+            # Time extend event
+            extend = pack('II', event_header(30, delta & ((1 << 27) - 1)),
+                          delta >> 27)
+            page[1].append(extend)
+            page[2] += len(extend)
+            delta = 0
+        for chunk in [pack('I', event_header(type_len, delta)), length,
+                      record]:
+            page[1].append(chunk)
+            page[2] += len(chunk)
+        page[3] = time
+
+    out = []
+    for timestamp, chunks, size, _ in pages:
+        data = pack('QQ', timestamp, size) + b''.join(chunks)
+        out.append(data + b'\x00' * (PAGE_SIZE - len(data)))
+    return b''.join(out)
+
+def text_line(time, cpu, pid, comm, event, fields):
+    if event == 'thermal_temperature':
+        desc = 'thermal_zone={} id={} temp_prev={} temp={}'.format(*fields)
+    elif event == 'sched_wakeup':
+        desc = 'comm=foo pid={} prio=120 target_cpu={:03d}'.format(*fields)
+    else:
+        desc = 'state={} cpu_id={}'.format(*fields)
+    return '{}-{} [{:03d}] {}.{:06d}: {}: {}\n'.format(
+        comm, pid, cpu, time // 10 ** 9, time % 10 ** 9 // 1000, event, desc)
+
+def random_events(n_events, n_cpus, seed=0):
+    rng = np.random.RandomState(seed)
+    times = 100 * 10 ** 9 + np.cumsum(rng.randint(1, 5000, n_events)) * 1000
+    # A gap that needs a time extend event
+    times[n_events // 2:] += 10 ** 9
+
+    events = []
+    for time in times.tolist():
+        cpu = int(rng.randint(n_cpus))
+        kind = rng.randint(6)
+        if kind == 0:
+            event = ('cpu_idle', (int(rng.choice([0, 1, 4294967295])), cpu))
+        elif kind == 1:
+            event = ('cpu_frequency', (int(rng.choice([1000, 2000])), cpu))
+        elif kind == 2:
+            event = ('thermal_temperature', ('cls{}'.format(rng.randint(2)), 0,
+                                             int(rng.randint(30000, 40000)),
+                                             int(rng.randint(30000, 40000))))
+        elif kind == 3:
+            event = ('cpu_frequency_devlib', (int(rng.choice([1000, 2000])),
+                                              cpu))
+        else:
+            event = ('sched_wakeup', (1000 + cpu, cpu))
+        events.append((time, cpu, 1000 + cpu, 'task{}'.format(cpu)) + event)
+    return events
+
+class TestTraceDat(MillhouseTestBase):
+    def _make_traces(self, events, n_cpus):
+        dat_path = os.path.join(self.test_dir, 'trace.dat')
+        write_trace_dat(dat_path, events, n_cpus)
+        text = ''.join(text_line(*e) for e in events)
+        return TraceDat(dat_path), self.make_ftrace(text)
+
+    def test_same_as_text(self):
+        """Test that trace.dat files give the same DataFrames as TRAPpy"""
+        events = random_events(2000, n_cpus=4)
+        tracedat, ftrace = self._make_traces(events, n_cpus=4)
+
+        self.assertEqual(tracedat.basetime, ftrace.basetime)
+        for name in ['cpu_idle', 'cpu_frequency', 'cpu_frequency_devlib',
+                     'thermal']:
+            df = getattr(tracedat, name).data_frame
+            exp = getattr(ftrace, name).data_frame
+            self.assertGreater(len(df), 0)
+
+            columns = [c for c in exp.columns if c != '__line']
+            pd.testing.assert_frame_equal(df[columns], exp[columns],
+                                          check_dtype=False)
+            # Only the relative order of the lines is the same
+            self.assertEqual(df['__line'].rank().tolist(),
+                             exp['__line'].rank().tolist())
+
+    def test_windows(self):
+        """Test that windows and normalize_time work as with TRAPpy"""
+        events = random_events(500, n_cpus=2)
+        dat_path = os.path.join(self.test_dir, 'trace.dat')
+        write_trace_dat(dat_path, events, n_cpus=2)
+        text_path = self.make_trace_file(''.join(text_line(*e) for e in events))
+
+        for kwargs in [dict(window=(0.2, 0.5)),
+                       dict(abs_window=(100.1, None), normalize_time=True),
+                       dict(window=(0.3, None), abs_window=(100.2, 100.6))]:
+            tracedat = TraceDat(dat_path, **kwargs)
+            ftrace = FTrace(text_path, **dict(FTRACE_KWARGS, **kwargs))
+            self.assertEqual(tracedat.basetime, ftrace.basetime)
+            for name in ['cpu_idle', 'thermal']:
+                df = getattr(tracedat, name).data_frame
+                exp = getattr(ftrace, name).data_frame
+                self.assertGreater(len(df), 0)
+                np.testing.assert_allclose(df.index.values, exp.index.values)
+
+    def test_analyzer(self):
+        """Test analyzing a trace.dat file"""
+        events = random_events(500, n_cpus=2, seed=1)
+        tracedat, ftrace = self._make_traces(events, n_cpus=2)
+
+        analyzer = TraceAnalyzer(tracedat, cpufreq_domains=[[0, 1]])
+        exp_analyzer = TraceAnalyzer(ftrace, cpufreq_domains=[[0, 1]])
+        self.assertEqual(analyzer.window, exp_analyzer.window)
+        self.assertEqual(analyzer.cpus, exp_analyzer.cpus)
+
+        pd.testing.assert_frame_equal(analyzer.cpuidle.stats.cpu_time(),
+                                      exp_analyzer.cpuidle.stats.cpu_time())
+        pd.testing.assert_frame_equal(
+            analyzer.thermal.stats.avg_temperature(),
+            exp_analyzer.thermal.stats.avg_temperature())
+
+    def test_big_endian(self):
+        """Test reading a trace.dat file recorded on a big-endian target"""
+        events = random_events(500, n_cpus=2, seed=2)
+        dat_path = os.path.join(self.test_dir, 'trace_be.dat')
+        write_trace_dat(dat_path, events, n_cpus=2, endian='>')
+        tracedat, _ = self._make_traces(events, n_cpus=2)
+        tracedat_be = TraceDat(dat_path)
+
+        self.assertEqual(tracedat_be.basetime, tracedat.basetime)
+        for name in ['cpu_idle', 'cpu_frequency', 'cpu_frequency_devlib',
+                     'thermal']:
+            df = getattr(tracedat_be, name).data_frame
+            self.assertGreater(len(df), 0)
+            pd.testing.assert_frame_equal(
+                df, getattr(tracedat, name).data_frame)
+
+    def test_missing_events(self):
+        """Test that events absent from the trace give empty DataFrames"""
+        events = [e for e in random_events(100, n_cpus=2)
+                  if e[4] == 'cpu_idle']
+        tracedat, _ = self._make_traces(events, n_cpus=2)
+
+        self.assertEqual(len(tracedat.thermal.data_frame), 0)
+        self.assertEqual(len(tracedat.cpu_idle.data_frame), len(events))
+
+        analyzer = TraceAnalyzer(tracedat)
+        self.assertEqual(analyzer.available_events, ['cpu_idle'])
+
+    def test_not_trace_dat(self):
+        path = self.make_trace_file('not a trace.dat file')
+        with self.assertRaises(ValueError):
+            TraceDat(path)
+
+    def test_from_path(self):
+        """Test that TraceAnalyzer.from_path reads trace.dat files"""
+        events = random_events(100, n_cpus=2)
+        path = os.path.join(self.test_dir, 'trace.dat')
+        write_trace_dat(path, events, n_cpus=2)
+
+        analyzer = TraceAnalyzer.from_path(path)
+        exp = TraceAnalyzer(TraceDat(path))
+        self.assertEqual(analyzer.window, exp.window)
+        self.assertIsInstance(analyzer.ftrace, TraceDat)
+        self.assertEqual(sorted(analyzer.available_events),
+                         ['cpu_frequency', 'cpu_frequency_devlib', 'cpu_idle',
+                          'thermal'])
+
+        analyzer = TraceAnalyzer.from_path(
+            path, ftrace_kwargs={'abs_window': (100.1, None)})
+        self.assertGreaterEqual(
+            analyzer.get_trace_event('cpu_idle').index[0], 100.1)
+
+        with self.assertRaises(ValueError):
+            TraceAnalyzer.from_path(path, ftrace_kwargs={'name': 'foo'})
@@ -0,0 +1,58 @@
+# SPDX-License-Identifier: Apache-2.0
+#
+# Copyright (C) 2017, ARM Limited and contributors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+from unittest import TestCase
+
+import numpy as np
+import pandas as pd
+
+from millhouse.utils import integrate_square_wave, integrate_step_signal
+
+class TestIntegrateStepSignal(TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({'a': [np.nan, 1., 3., 3.],
+                                'b': [2., 2., 0., 1.]},
+                               index=pd.Index([0., 1., 3., 4.], name='Time'),
+                               columns=['a', 'b'])
+
+    def test_step(self):
+        """Test integrating a step function, ignoring NaN"""
+        integral = integrate_step_signal(self.df)
+        self.assertEqual(integral.to_dict(), {'a': 5., 'b': 6.})
+        self.assertEqual(integral['a'],
+                         integrate_square_wave(self.df['a'].dropna() / 3) * 3)
+
+    def test_window(self):
+        """Test integrating part of a step function"""
+        integral = integrate_step_signal(self.df, window=(0.5, 3.5))
+        self.assertEqual(integral.to_dict(), {'a': 3.5, 'b': 5.})
+
+    def test_linear(self):
+        """Test integrating a linearly-interpolated signal"""
+        integral = integrate_step_signal(self.df, linear=True)
+        self.assertEqual(integral.to_dict(), {'a': 7., 'b': 4.5})
+
+        integral = integrate_step_signal(self.df, linear=True, window=(2, 3.5))
+        self.assertEqual(integral.to_dict(), {'a': 4., 'b': 0.625})
+
+    def test_by(self):
+        """Test splitting an integral by the values of another signal"""
+        ones = np.ones(self.df.shape)
+        df = integrate_step_signal(ones, self.df.index.values, by=self.df)
+        self.assertEqual(df.index.tolist(), [0, 1, 2, 3])
+        self.assertEqual(df[0].tolist(), [0, 2, 0, 1])
+        self.assertEqual(df[1].tolist(), [1, 0, 3, 0])
@@ -15,9 +15,12 @@
 # limitations under the License.
 #
 
-import pandas as pd
+import numpy as np
 
+from millhouse import GetterSpec
+from millhouse.step_signal import StepSignal
 from millhouse.trace_analyzer import TraceAnalyzer
+from millhouse.utils import window_slice
 
 from test_base import MillhouseTestBase
 
@@ -92,3 +95,63 @@ class TestAnalyzerWindow(MillhouseTestBase):
         self.assertEqual(signal.iloc[2].tolist(), [3000, 3000, 3000, 3000])
         self.assertEqual(signal.index[3], 350.0)
         self.assertEqual(signal.iloc[3].tolist(), [3000, 3000, 3000, 3000])
+
+    def test_over_windows(self):
+        """Test calling a getter for several windows"""
+        ftrace = self.make_ftrace(TEST_DATA)
+        analyzer = TraceAnalyzer(ftrace)
+        windows = [(150, 350), (400, 500)]
+        df = analyzer.over_windows('cpufreq.signal.cpu_frequency', windows)
+
+        self.assertEqual(df.index.names, ['window_start', 'window_end', 'Time'])
+        for window in windows:
+            exp = TraceAnalyzer(ftrace, window=window).cpufreq.signal.cpu_frequency()
+            self.assertEqual(df.loc[window].values.tolist(), exp.values.tolist())
+            self.assertEqual(df.loc[window].index.tolist(), exp.index.tolist())
+
+        # The trace events were only converted to a signal once
+        self.assertEqual(analyzer.cache.misses, len(windows) + 1)
+
+    def test_over_windows_bucket(self):
+        """Test calling a getter for fixed-size windows"""
+        ftrace = self.make_ftrace(TEST_DATA)
+        analyzer = TraceAnalyzer(ftrace, window=(100, 300))
+        df = analyzer.over_windows(
+            GetterSpec('cpufreq.signal.cpu_frequency'), bucket=80)
+
+        self.assertEqual(df.index.tolist(), [
+            (100, 180, 100), (100, 180, 180),
+            (180, 260, 180), (180, 260, 200), (180, 260, 260),
+            (260, 300, 260), (260, 300, 300)])
+        self.assertEqual(df[2].tolist(),
+                         [1000, 1000, 1000, 2000, 2000, 2000, 3000])
+
+    def test_window_times(self):
+        """Test extending a signal to the window bounds"""
+        steps = StepSignal.from_arrays('key', [100., 200., 300.] * 2,
+                                       ['a'] * 3 + ['b'] * 3, [1, 2, 3, 4, 5, 6])
+        cases = [
+            ((100, 300), [100, 200, 300], [1, 2, 3]),
+            ((150, 250), [150, 200, 250], [1, 2, 2]),
+            ((200, 400), [200, 300, 400], [2, 3, 3]),
+            ((210, 220), [210, 220], [2, 2]),
+            ((400, 500), [400, 500], [3, 3]),
+        ]
+        for window, exp_index, exp_a in cases:
+            df = steps.to_frame(window)
+            self.assertEqual(df.index.tolist(), exp_index)
+            self.assertEqual(df['a'].tolist(), exp_a)
+            self.assertEqual(df.index.name, 'Time')
+
+        df = steps.to_frame((50, 150))
+        self.assertEqual(df.index.tolist(), [50, 100, 150])
+        self.assertTrue(df.iloc[0].isnull().all())
+        self.assertEqual(df['b'].tolist()[1:], [4, 4])
+
+    def test_window_slice(self):
+        times = np.array([100., 200., 300.])
+        self.assertEqual(window_slice(times, (100, 300)), (0, 3, False, False))
+        self.assertEqual(window_slice(times, (150, 250)), (1, 2, True, True))
+        self.assertEqual(window_slice(times, (200, 400)), (1, 3, False, True))
+        self.assertEqual(window_slice(times, (210, 220)), (2, 2, True, True))
+        self.assertEqual(window_slice(times, (50, 100)), (0, 1, True, False))